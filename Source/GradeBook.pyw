@@ -20,12 +20,11 @@ import sys
 import threading
 import time
 from typing import List
-import pyaudio  # Look at https://stackoverflow.com/questions/52283840/i-cant-install-pyaudio-on-windows-how-to-solve-error-microsoft-visual-c-14
+import importlib
 import pywintypes
 import win32com.client
 import win32event
 import win32api
-from six.moves import queue
 import platform
 import getsettings as settings
 import subprocess
@@ -36,20 +35,21 @@ import time
 import psutil
 import pywintypes
 import win32file
-from google.cloud import speech
-from google.cloud import texttospeech  # pip install google-cloud-texttospeech
-import google.api_core
 import winsound
 from typing import List
-from google.cloud import speech
-import google.api_core
 from winerror import ERROR_ALREADY_EXISTS
 from pathlib import Path
 import getsettings
-import audioengine
+import audiocache
+import macrodispatcher
+import metrics
 import speechtotext
+import recognizer
 import pipeclient
+import startup
 import texttospeech
+# audioengine (PyAudio and NumPy), channelpool (gRPC) and the Google client libraries take long to import. They are
+# imported by the startup steps, which run while the settings are read from the workbook
 
 # Important for PyInstaller
 # Create hook-grpc.py in the hooks folder (\Lib\site - packages\PyInstaller\hooks) and put the following code in it:
@@ -64,13 +64,35 @@ googleIp = '8.8.8.8'
 # Audio sampling parameters
 sampleRate = 16000  # 16 kHz sampling rate
 chunkSize = 1600    # 100ms chunks
+# Encoding of the audio uploaded to Google: 'LINEAR16' (raw), 'FLAC' (lossless, about half the size) or 'OGG_OPUS'
+speechUploadEncoding = 'FLAC'
 
 # Pipe to receive messages from Excel
 pipeName = r'\\.\pipe\TuinXSlang172'
 # Time out connecting to pipe in seconds
 pipeTimeOut = 10
+# Seconds the main loop waits for a message from Excel before it processes the Excel macro calls again
+pipeReadWait = 0.01
+# Seconds between two checks that Excel is still running
+excelCheckInterval = 5.0
 # Time to wait between calling VBA macros in seconds
 excelMacroWaitTime = 0.5
+# Time in seconds during which macro calls are collected, so that they can be coalesced into fewer calls
+excelMacroCoalesceWindow = 0.02
+# Excel macro that receives a burst of recognized phrases as one array. Phrases are sent one by one if it is empty
+excelBatchMacro = 'receiveTextBatch'
+# File in which the settings are cached between launches
+settingsSnapshotFile = 'EasyGradexl.settings.json'
+# Directory in which synthesized speech is cached between launches
+audioCacheDirectory = 'EasyGradexl.audiocache'
+# Synthesize the texts that are read back, the student IDs and marks of the active sheet, in the background at startup
+prefetchReadBacks = True
+# Marks synthesized at startup in addition to the marks already on the active sheet
+prefetchMarks = range(0, 101)
+# File to which the pipeline metrics are appended periodically as JSON lines. Not written if it is empty
+metricsDumpFile = ''
+# Seconds between two metrics snapshots written to metricsDumpFile
+metricsDumpInterval = 10.0
 
 # Global variables
 xl = None                                       # Handle to Excel app
@@ -80,8 +102,9 @@ textToSpeech = None                             # Instantiation of the TextToSpe
 pipeClient = None                               # Instantiation of the PipeClient class
 audioEngine = None                              # Instantiation of the AudioEngine class
 speechToText = None                             # Instantiation of the SpeechToText class
-excelMacroBuffer = queue.Queue()                # Queue for messages send to Excel by calling Excel macros
-prevExcelCallMacroTime = time.time()
+channelPool = None                              # gRPC channels shared by the Google clients
+# Queue for messages send to Excel by calling Excel macros
+excelMacroDispatcher = macrodispatcher.MacroDispatcher(excelMacroCoalesceWindow, excelMacroWaitTime, excelBatchMacro)
 
 appRunning = True
 timeSpeechRecognitionResumed = time.time()      # Time at which speech recognition was resumed
@@ -205,8 +228,9 @@ def setGoogleCredentials(pathToGoogleCredentials: str):
 
 def callExcelMacro(macroName: str, argument1:str =None, argument2:str =None):
     """
-    Places a macro call to Excel in the Excel message buffer queue. Excel can be in blocking mode and may not be
-    able to run macro immediately. That is why the call is placed in a queue.
+    Places a macro call to Excel in the Excel macro dispatcher queue. Excel can be in blocking mode and may not be
+    able to run macro immediately. That is why the call is placed in a queue, where it can also be coalesced with
+    the calls that follow it.
 
     Parameters
     ----------
@@ -217,62 +241,72 @@ def callExcelMacro(macroName: str, argument1:str =None, argument2:str =None):
     argument2 : str, optional
         Second argument
     """
-    # Place the parameters in a dictionary
     try:
-        dictItem = {
-            "macroName": str(macroName),
-            "argument1": (argument1),
-            "argument2": (argument2),
-            "timeStamp": time.time()
-        }
-        excelMacroBuffer.put(dictItem)      # Add the dictionary to the queue
+        excelMacroDispatcher.call(macroName, argument1, argument2)     # Add the call to the queue
         processExcelMacros()                # Call the method to send the macro calls to Execl
     except:
         logException(sys.exc_info())
 
 def processExcelMacros():
     """
-        Checks for Excel macro calls in the excelMacroBuffer queue and send them to Excel. It will only
-        remove the call from the queue if no exception occurred when trying to execute the macro.
-    """
-    global xl, excelFileName, prevExcelCallMacroTime
-    # Check for incoming calls
-    if not excelMacroBuffer.empty():
-        # Do not remove the message from the queue unless Excel runs the Macro
-        lst = list(excelMacroBuffer.queue)  # Convert queue to a list
-        length = len(lst)
-        while length >= 1:
-            timeNow = time.time()
-            if time.time()-prevExcelCallMacroTime < excelMacroWaitTime:
-                break
-            prevExcelCallMacroTime = timeNow
-            dictItem = lst[0]    # Get the next item
-            macroName = dictItem["macroName"]
-            argument1 = dictItem["argument1"]
-            argument2 = dictItem["argument2"]
-            returnValue = None
-            try:
-                if argument1 == None:
-                    returnValue = xl.Application.Run("'" + excelFileName + "'" + '!' + macroName)
-                elif argument2 == None:
-                    returnValue = xl.Application.Run("'" + excelFileName + "'" + '!' + macroName, str(argument1))
-                else:
-                    returnValue = xl.Application.Run("'" + excelFileName + "'" + '!' + macroName, str(argument1), str(argument2))
-            except BaseException as ex:
-                exceptionCode = ex.args[0]
-                # Experience has shown that the following list of exceptions can be ignored
-                ignoreNumbers = [-2147418111, -2147221008, -2147352565, -2147417842]
-                if not exceptionCode in ignoreNumbers: raise
-            except:
-                exType, exValue, exTraceback = sys.exc_info()
-                exceptionHook(exType, exValue, exTraceback)
-            else:
-                if returnValue != None:
-                    if returnValue == 1:
-                        excelMacroBuffer.get(block=True, timeout=0.1)
-                        # Remove the call from the queue if no error has occurred
-                        lst = list(excelMacroBuffer.queue)
-                        length = len(lst)
+        Sends the Excel macro calls that are due from the excelMacroDispatcher queue to Excel. It will only
+        remove a call from the queue if no exception occurred when trying to execute the macro.
+    """
+    excelMacroDispatcher.flush(runExcelMacro, isMacroMissing)
+
+def runExcelMacro(macroName: str, argument1: object = None, argument2: object = None) -> bool:
+    """
+    Runs an Excel macro
+
+    Parameters
+    ----------
+    macroName : str
+        Name of the Excel macro to run
+    argument1 : object, optional
+        First argument. A tuple is passed to Excel as an array
+    argument2 : object, optional
+        Second argument
+
+    Returns
+    -------
+    bool :
+        True if Excel ran the macro
+    """
+    returnValue = None
+    if argument1 != None and not isinstance(argument1, tuple):
+        argument1 = str(argument1)
+    try:
+        if argument1 == None:
+            returnValue = xl.Application.Run("'" + excelFileName + "'" + '!' + macroName)
+        elif argument2 == None:
+            returnValue = xl.Application.Run("'" + excelFileName + "'" + '!' + macroName, argument1)
+        else:
+            returnValue = xl.Application.Run("'" + excelFileName + "'" + '!' + macroName, argument1, str(argument2))
+    except BaseException as ex:
+        exceptionCode = ex.args[0]
+        # Experience has shown that the following list of exceptions can be ignored
+        ignoreNumbers = [-2147418111, -2147221008, -2147352565, -2147417842]
+        if not exceptionCode in ignoreNumbers: raise
+    return returnValue == 1
+
+def isMacroMissing(exception: BaseException) -> bool:
+    """
+    Checks if an exception raised by runExcelMacro means that the macro is not in the workbook
+
+    Parameters
+    ----------
+    exception : BaseException
+        Exception raised by Application.Run
+
+    Returns
+    -------
+    bool :
+        True for "Cannot run the macro": DISP_E_EXCEPTION with the Excel error 0x800A03EC
+    """
+    if not isinstance(exception, pywintypes.com_error) or exception.args[0] != -2147352567:
+        return False
+    exceptionInfo = exception.args[2]
+    return exceptionInfo != None and len(exceptionInfo) > 5 and exceptionInfo[5] == -2146827284
 
 def processIncomingMessage(message: str):
     global audioEngine, speechToText, textToSpeech
@@ -299,6 +333,9 @@ def processIncomingMessage(message: str):
                 x = message.split('#', 1)   # Split at '#'
                 if len(x) == 2:
                     textToSpeech.speak(x[1])    # Run text-to-speech conversion
+            # Texts that are expected to be read back, separated by '#'. Not sent by gradebook.xlsm yet
+            if 'prefetchSpeech#' in message:
+                textToSpeech.prefetch(message.split('#')[1:])
             if message == 'killGradebookExe':
                 quitApp()                   # Quit App
     except Exception as ex:
@@ -398,6 +435,14 @@ def exceptionHook(exceptionType, exceptionValue, exceptionTraceback):
 BackupExceptionHook = sys.excepthook
 sys.excepthook = exceptionHook
 
+def pipeClosed():
+    """
+    Called from the pipe reader thread when Excel closes the pipe. The main loop then quits the app
+    """
+    global appRunning
+    logger.info('Excel closed the pipe')
+    appRunning = False
+
 def quitApp():
     """
     Quits application
@@ -407,6 +452,18 @@ def quitApp():
     appRunning = False
     # Restore exception hook
     sys.excepthook = BackupExceptionHook
+    try:
+        if speechToText != None:
+            speechToText.stop()
+        if textToSpeech != None:
+            textToSpeech.stop(0.5)
+        if channelPool != None:
+            channelPool.close()
+        if pipeClient != None:
+            pipeClient.close()
+        metrics.registry.stopDump()
+    except:
+        pass
     stopTime = time.time() + 1  # Process Excel macros for 1 seconds
     try:
         while time.time() < stopTime:
@@ -416,14 +473,54 @@ def quitApp():
         pass
     sys.exit(0)
 
+def openMicrophone() -> object:
+    """
+    Startup step that opens the microphone
+    """
+    import audioengine      # Imports PyAudio and NumPy
+    return audioengine.AudioEngine(sampleRate, chunkSize)
+
+def createChannelPool() -> object:
+    """
+    Startup step that creates the gRPC channels shared by the Google clients
+    """
+    import channelpool      # Imports gRPC
+    return channelpool.ChannelPool()
+
+def createSpeechClient(appStartup: startup.Startup) -> object:
+    """
+    Startup step that imports the Google speech-to-text library while the settings are read, then creates the client
+    once the credentials are set, and connects it in the background
+    """
+    importlib.import_module('google.cloud.speech')
+    pool = appStartup.result('channelPool')
+    appStartup.result('settings')
+    client = pool.speechClient()
+    pool.warmUp()
+    return client
+
+def createTextToSpeechClient(appStartup: startup.Startup) -> object:
+    """
+    Startup step that imports the Google text-to-speech library while the settings are read, then creates the client
+    once the credentials are set, and connects it in the background
+    """
+    importlib.import_module('google.cloud.texttospeech')
+    pool = appStartup.result('channelPool')
+    appStartup.result('settings')
+    client = pool.textToSpeechClient()
+    pool.warmUp()
+    return client
+
 def main():
     """
     Initializes the App and runs the main loop.
     """
-    global wb, xl, excelFileName, settings, pipeClient, audioEngine, speechToText, textToSpeech, appRunning
+    global wb, xl, excelFileName, settings, pipeClient, audioEngine, speechToText, textToSpeech, channelPool, appRunning
+    # Independent initialization steps run concurrently. The COM calls to Excel stay on the main thread
+    appStartup = startup.Startup()
     try:
         # Check if this computer is connected to the internet
-        ping(googleIp)
+        appStartup.submit('internet', ping, googleIp)
         # Check if excel is running
         if not isExcelOpen():
             quitApp()
@@ -435,47 +532,93 @@ def main():
         exType, exValue, exTraceback = sys.exc_info()
         exceptionHook(exType, exValue, exTraceback)
     try:
+        # Start the steps that do not need Excel
+        appStartup.submit('microphone', openMicrophone)
+        appStartup.submit('channelPool', createChannelPool)
+        appStartup.submit('speechClient', createSpeechClient, appStartup)
+        appStartup.submit('textToSpeechClient', createTextToSpeechClient, appStartup)
         arguments = sys.argv
         excelFileName = arguments[1]
-        # Excel app and workbook
-        xl = win32com.client.Dispatch("Excel.application")
-        wb = xl.Workbooks.Open(excelFileName)
-        # Get settings from Settings sheet in workbook
-        settings = getsettings.GetSettings(wb, callExcelMacro, exceptionHook)
-        # Open pipe
-        pipeClient = pipeclient.PipeClient(pipeName, processIncomingMessage, pipeTimeOut, exceptionHook)
-        pipeClient.openPipe()
-        # Set Google Cloud API credentials
-        setGoogleCredentials(settings.pathToGoogleCredentials)
+        with appStartup.phase('workbook'):
+            # Excel app and workbook
+            xl = win32com.client.Dispatch("Excel.application")
+            wb = xl.Workbooks.Open(excelFileName)
+        with appStartup.phase('settings'):
+            # Get settings from Settings sheet in workbook
+            settings = getsettings.GetSettings(wb, callExcelMacro, exceptionHook,
+                                               os.path.join(str(Path.home()), settingsSnapshotFile))
+            # Set Google Cloud API credentials
+            setGoogleCredentials(settings.pathToGoogleCredentials)
+        with appStartup.phase('pipe'):
+            pipeClient = pipeclient.PipeClient(pipeName, processIncomingMessage, pipeTimeOut, exceptionHook,
+                                               linkClosed=pipeClosed)
+            pipeClient.openPipe()
         processExcelMacros()
-        # Instantiate objects
-        audioEngine = audioengine.AudioEngine(sampleRate, chunkSize)
-        speechToText = speechtotext.SpeechToText(audioEngine, settings.speechToTextLanguageCode, settings.commonPhrases,
-                                                 settings.replacementDictionary, callExcelMacro, sampleRate, exceptionHook)
-        textToSpeech = texttospeech.TextToSpeech(settings.textToSpeechLanguageCode, settings.textToSpeechVoice,
-                                                 settings.textToSpeechGender, settings.SsmlSayAs, callExcelMacro,
-                                                 exceptionHook)
+        # Record the pipeline metrics
+        if metricsDumpFile != '':
+            metrics.registry.startDump(os.path.join(str(Path.home()), metricsDumpFile), metricsDumpInterval)
+        # Google clients that share pre-warmed channels
+        speechClient = None
+        textToSpeechClient = None
+        try:
+            channelPool = appStartup.result('channelPool')
+            speechClient = appStartup.result('speechClient')
+            textToSpeechClient = appStartup.result('textToSpeechClient')
+        except:
+            pass    # The clients create their own channels, and report missing credentials
+        with appStartup.phase('speechToText'):
+            audioEngine = appStartup.result('microphone')
+            # Speech recognition engine selected on the "Settings" sheet. If it cannot be created, e.g. because Vosk or
+            # its model is missing, the problem is reported and SpeechToText uses Google instead
+            speechRecognizer = None
+            try:
+                speechRecognizer = recognizer.createRecognizer(settings.speechRecognitionEngine,
+                                                               settings.speechToTextLanguageCode, settings.commonPhrases,
+                                                               sampleRate, speechtotext.lowLatencyGrades,
+                                                               settings.pathToLocalSpeechModel, speechClient,
+                                                               speechUploadEncoding)
+            except:
+                logger.warning('Unable to create the speech recognizer. Using Google', exc_info=True)
+                callExcelMacro("pythonError", 'speechRecognizerError')
+                speechRecognizer = None
+            speechToText = speechtotext.SpeechToText(audioEngine, settings.speechToTextLanguageCode, settings.commonPhrases,
+                                                     settings.replacementDictionary, callExcelMacro, sampleRate, exceptionHook,
+                                                     googleAPIClient=speechClient, recognizer=speechRecognizer)
+        with appStartup.phase('textToSpeech'):
+            textToSpeech = texttospeech.TextToSpeech(settings.textToSpeechLanguageCode, settings.textToSpeechVoice,
+                                                     settings.textToSpeechGender, settings.SsmlSayAs, callExcelMacro,
+                                                     exceptionHook,
+                                                     audiocache.AudioCache(os.path.join(str(Path.home()), audioCacheDirectory)),
+                                                     googleAPIClient=textToSpeechClient)
+            # Warm up the audio cache with the texts that the workbook reads back: the student IDs and the marks
+            if prefetchReadBacks:
+                try:
+                    readBacks = settings.readBackTexts(str(wb.ActiveSheet.Name))
+                    readBacks += [str(mark) for mark in prefetchMarks if str(mark) not in readBacks]
+                    textToSpeech.prefetch(readBacks)
+                except:
+                    logger.warning('Unable to read the texts to prefetch', exc_info=True)
+        logger.info(appStartup.report())
         # Pause speech recognition
         audioEngine.pause()
         speechToText.pause()
+        # Start the speech recognition worker. Recognized phrases are pushed to Excel as soon as they arrive
+        speechToText.start()
+        # Start the text-to-speech workers
+        textToSpeech.start()
     except:
         exType, exValue, exTraceback = sys.exc_info()
         exceptionHook(exType, exValue, exTraceback)
     # Main loop
     try:
-        checkEveryNumCycles = 999999                  # Check every 1000000 cycles if Excel is still open
-        count = checkEveryNumCycles
+        nextExcelCheck = time.monotonic()
         while appRunning:
-            speechToText.runSpeechRecognition()
-            pipeClient.readFromExcel()
+            pipeClient.readFromExcel(pipeReadWait)
             processExcelMacros()
-            textToSpeech.runTextToSpeech()
-            if count == checkEveryNumCycles:
+            if time.monotonic() >= nextExcelCheck:
                 if not isExcelOpen():   # Check if Excel is running
                     break
-                count = 0
-            else:
-                count += 1
+                nextExcelCheck = time.monotonic() + excelCheckInterval
     except:
         exType, exValue, exTraceback = sys.exc_info()
         exceptionHook(exType, exValue, exTraceback)
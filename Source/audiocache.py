@@ -0,0 +1,244 @@
+#************************************************************************************************************************************************************************************
+# Copyright (c) 2021 Tony L. Jones
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”),
+# to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# The sound files were downloaded from https://www.fesliyanstudios.com
+#********************************************************************************************************************************************************************************
+
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+# Settings
+memoryCacheSize = 16 * 1024 * 1024      # Maximum number of bytes of audio kept in memory
+diskCacheSize = 256 * 1024 * 1024       # Maximum number of bytes of audio kept on disk
+cacheFileExtension = '.audio'           # Extension of the files in the disk cache
+
+class AudioCache(object):
+    """
+        Two-tier cache of synthesized audio. The most recently used clips are kept in memory and all clips are kept
+        on disk. Both tiers evict the least recently used clips when their size limit is exceeded. The cache is
+        thread safe.
+
+        Attributes
+        ----------
+        memoryHits : int
+            Number of clips found in memory
+        diskHits : int
+            Number of clips found on disk
+        misses : int
+            Number of clips that had to be synthesized
+        bytesSaved : int
+            Number of bytes of audio that did not have to be downloaded
+
+        Methods
+        _______
+            makeKey(*parts)
+                Builds a cache key from the parameters that determine the synthesized audio
+            get(key)
+                Returns the audio stored under the key
+            contains(key)
+                Checks if audio is stored under the key without updating the counters
+            put(key, audio)
+                Stores the audio under the key
+            statistics()
+                Returns the cache counters
+    """
+
+    def __init__(self, cacheDirectory: str = None, memoryLimit: int = memoryCacheSize, diskLimit: int = diskCacheSize):
+        """
+        Parameters
+        ----------
+        cacheDirectory : str, optional
+            Directory in which the clips are stored. Only the memory tier is used if it is None
+        memoryLimit : int, optional
+            Maximum number of bytes kept in memory
+        diskLimit : int, optional
+            Maximum number of bytes kept on disk
+        """
+        self.memoryHits: int = 0
+        self.diskHits: int = 0
+        self.misses: int = 0
+        self.bytesSaved: int = 0
+        self.__cacheDirectory = cacheDirectory
+        self.__memoryLimit = memoryLimit
+        self.__diskLimit = diskLimit
+        self.__lock = threading.Lock()
+        self.__memory = OrderedDict()       # Clips in memory, least recently used first
+        self.__memoryBytes = 0
+        self.__disk = OrderedDict()         # Sizes of the clips on disk, least recently used first
+        self.__diskBytes = 0
+        if self.__cacheDirectory != None:
+            try:
+                os.makedirs(self.__cacheDirectory, exist_ok=True)
+                self.__scanDisk()
+            except OSError:
+                self.__cacheDirectory = None    # Fall back to the memory tier only
+
+    @staticmethod
+    def makeKey(*parts) -> str:
+        """
+        Builds a cache key from the parameters that determine the synthesized audio
+
+        Parameters
+        ----------
+        parts :
+            The SSML text, voice, language code, say-as and audio configuration
+
+        Returns
+        -------
+        str :
+            The cache key
+        """
+        return hashlib.sha256('\x1f'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+    def __scanDisk(self):
+        """
+        Indexes the clips already on disk, least recently used first
+        """
+        entries = []
+        for fileName in os.listdir(self.__cacheDirectory):
+            if fileName.endswith(cacheFileExtension):
+                fileStatus = os.stat(os.path.join(self.__cacheDirectory, fileName))
+                entries.append((fileStatus.st_mtime, fileName[:-len(cacheFileExtension)], fileStatus.st_size))
+        for _, key, size in sorted(entries):
+            self.__disk[key] = size
+            self.__diskBytes += size
+        self.__evictDisk()
+
+    def __path(self, key: str) -> str:
+        return os.path.join(self.__cacheDirectory, key + cacheFileExtension)
+
+    def __putMemory(self, key: str, audio: bytes):
+        """
+        Stores the clip in memory and evicts the least recently used clips if the memory limit is exceeded
+        """
+        if len(audio) > self.__memoryLimit:
+            return
+        if key in self.__memory:
+            self.__memoryBytes -= len(self.__memory.pop(key))
+        self.__memory[key] = audio
+        self.__memoryBytes += len(audio)
+        while self.__memoryBytes > self.__memoryLimit:
+            _, evicted = self.__memory.popitem(last=False)
+            self.__memoryBytes -= len(evicted)
+
+    def __evictDisk(self):
+        """
+        Deletes the least recently used clips from disk until the disk limit is respected
+        """
+        while self.__diskBytes > self.__diskLimit and self.__disk:
+            key, size = self.__disk.popitem(last=False)
+            self.__diskBytes -= size
+            try:
+                os.remove(self.__path(key))
+            except OSError:
+                pass
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Returns the audio stored under the key
+
+        Parameters
+        ----------
+        key : str
+            Key returned by makeKey()
+
+        Returns
+        -------
+        bytes :
+            The audio, or None if it is not in the cache
+        """
+        with self.__lock:
+            audio = self.__memory.get(key)
+            if audio != None:
+                self.__memory.move_to_end(key)
+                self.memoryHits += 1
+                self.bytesSaved += len(audio)
+                return audio
+            if self.__cacheDirectory != None and key in self.__disk:
+                try:
+                    with open(self.__path(key), 'rb') as audioFile:
+                        audio = audioFile.read()
+                    os.utime(self.__path(key))      # Keep the order of use across launches
+                    self.__disk.move_to_end(key)
+                    self.__putMemory(key, audio)
+                    self.diskHits += 1
+                    self.bytesSaved += len(audio)
+                    return audio
+                except OSError:
+                    self.__diskBytes -= self.__disk.pop(key)
+            self.misses += 1
+            return None
+
+    def contains(self, key: str) -> bool:
+        """
+        Checks if audio is stored under the key. Does not update the counters or the order of use
+
+        Parameters
+        ----------
+        key : str
+            Key returned by makeKey()
+
+        Returns
+        -------
+        bool :
+            True if the audio is in memory or on disk
+        """
+        with self.__lock:
+            return key in self.__memory or (self.__cacheDirectory != None and key in self.__disk)
+
+    def put(self, key: str, audio: bytes):
+        """
+        Stores the audio under the key
+
+        Parameters
+        ----------
+        key : str
+            Key returned by makeKey()
+        audio : bytes
+            The synthesized audio
+        """
+        with self.__lock:
+            self.__putMemory(key, audio)
+            if self.__cacheDirectory != None and key not in self.__disk and len(audio) <= self.__diskLimit:
+                try:
+                    # Write to a temporary file first, so that an interrupted write never leaves a truncated clip
+                    temporaryPath = self.__path(key) + '.tmp'
+                    with open(temporaryPath, 'wb') as audioFile:
+                        audioFile.write(audio)
+                    os.replace(temporaryPath, self.__path(key))
+                    self.__disk[key] = len(audio)
+                    self.__diskBytes += len(audio)
+                    self.__evictDisk()
+                except OSError:
+                    pass
+
+    def statistics(self) -> dict:
+        """
+        Returns the cache counters
+
+        Returns
+        -------
+        dict :
+            Hits, misses, bytes saved and the number of bytes held in each tier
+        """
+        with self.__lock:
+            return {
+                'memoryHits': self.memoryHits,
+                'diskHits': self.diskHits,
+                'misses': self.misses,
+                'bytesSaved': self.bytesSaved,
+                'memoryBytes': self.__memoryBytes,
+                'diskBytes': self.__diskBytes
+            }
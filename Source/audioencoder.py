@@ -0,0 +1,276 @@
+#************************************************************************************************************************************************************************************
+# Copyright (c) 2021 Tony L. Jones
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”),
+# to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# The sound files were downloaded from https://www.fesliyanstudios.com
+#********************************************************************************************************************************************************************************
+
+
+import struct
+from abc import ABC, abstractmethod
+
+# Settings
+flacCompressionLevel = 5        # 0 (fastest) to 8 (smallest)
+flacBlockDuration = 0.02        # Seconds per FLAC block. The encoder holds back one block, so this is its added latency
+opusBitrate = 24000             # Bits per second of the Opus stream. Google recommends at least 16 kbit/s for speech
+opusFrameDuration = 0.02        # Seconds per Opus packet: 0.0025, 0.005, 0.01, 0.02, 0.04 or 0.06
+opusPreSkip = 312               # Samples at 48 kHz that the decoder drops at the start: the libopus lookahead
+
+class AudioEncoder(ABC):
+    """
+    Compresses a stream of 16-bit mono chunks incrementally. The encoder state is kept from one chunk to the next,
+    so a new encoder must be created for every stream. The first bytes returned contain the stream header.
+
+    Attributes
+    ----------
+    encoding : str
+        Name of the encoding in the Google speech-to-text API
+    bytesIn : int
+        Number of bytes of PCM received
+    bytesOut : int
+        Number of bytes of encoded audio returned
+    samplesOut : int
+        Number of samples whose encoded audio was returned. Lags behind the input by the audio the encoder holds back
+
+    Methods
+    _______
+        encode(chunk)
+            Returns the encoded audio that is ready, possibly nothing
+        flush()
+            Returns the rest of the encoded audio at the end of the stream
+    """
+
+    encoding = 'LINEAR16'
+
+    def __init__(self):
+        self.bytesIn: int = 0
+        self.bytesOut: int = 0
+        self.samplesOut: int = 0
+
+    def encode(self, chunk: bytes) -> bytes:
+        self.bytesIn += len(chunk)
+        data = self._encode(chunk)
+        self.bytesOut += len(data)
+        return data
+
+    def flush(self) -> bytes:
+        data = self._flush()
+        self.bytesOut += len(data)
+        return data
+
+    @abstractmethod
+    def _encode(self, chunk: bytes) -> bytes:
+        """
+        Encodes a chunk and returns the output that is ready
+        """
+
+    def _flush(self) -> bytes:
+        return b''
+
+class PcmEncoder(AudioEncoder):
+    """
+    Passes the audio through uncompressed
+    """
+
+    def _encode(self, chunk: bytes) -> bytes:
+        self.samplesOut += len(chunk) // 2
+        return chunk
+
+class FlacEncoder(AudioEncoder):
+    """
+    Lossless FLAC stream, about half the size of the PCM for speech. Needs pyFLAC (pip install pyflac)
+    """
+
+    encoding = 'FLAC'
+
+    def __init__(self, sampleRate: int, compressionLevel: int = flacCompressionLevel,
+                 blockDuration: float = flacBlockDuration):
+        """
+        Parameters
+        ----------
+        sampleRate : int
+            Audio sample rate
+        compressionLevel : int, optional
+            0 (fastest) to 8 (smallest)
+        blockDuration : float, optional
+            Seconds per FLAC block
+        """
+        super().__init__()
+        import numpy as np
+        import pyflac       # Optional dependency: pip install pyflac
+        self.__numpy = np
+        self.__output = []
+        self.__encoder = pyflac.StreamEncoder(sampleRate, self.__write, compression_level=compressionLevel,
+                                              blocksize=max(16, int(sampleRate * blockDuration)))
+        self.__finished = False
+
+    def __write(self, buffer: bytes, numberOfBytes: int, numberOfSamples: int, currentFrame: int):
+        self.__output.append(bytes(buffer))
+        self.samplesOut += numberOfSamples
+
+    def __takeOutput(self) -> bytes:
+        data = b''.join(self.__output)
+        self.__output.clear()
+        return data
+
+    def _encode(self, chunk: bytes) -> bytes:
+        samples = self.__numpy.frombuffer(chunk[:len(chunk) - len(chunk) % 2], dtype=self.__numpy.int16)
+        if len(samples) > 0:
+            self.__encoder.process(samples)     # Calls __write synchronously for every complete block
+        return self.__takeOutput()
+
+    def _flush(self) -> bytes:
+        if not self.__finished:
+            self.__finished = True
+            self.__encoder.finish()
+        return self.__takeOutput()
+
+class OggWriter(object):
+    """
+    Minimal Ogg bitstream writer (RFC 3533). Every page is written out as soon as it is complete, so the pages can be
+    streamed
+    """
+
+    def __init__(self, serialNumber: int = 0x45474C58):
+        self.__serialNumber = serialNumber
+        self.__sequenceNumber = 0
+        # CRC-32 of the pages: polynomial 0x04C11DB7, no reflection, initial value and final XOR 0
+        self.__crcTable = []
+        for index in range(256):
+            remainder = index << 24
+            for bit in range(8):
+                remainder = ((remainder << 1) ^ 0x04C11DB7 if remainder & 0x80000000 else remainder << 1) & 0xFFFFFFFF
+            self.__crcTable.append(remainder)
+
+    def crc(self, data: bytes) -> int:
+        remainder = 0
+        for byte in data:
+            remainder = ((remainder << 8) & 0xFFFFFFFF) ^ self.__crcTable[(remainder >> 24) ^ byte]
+        return remainder
+
+    def page(self, packets: list, granulePosition: int, firstPage: bool = False, lastPage: bool = False) -> bytes:
+        """
+        Returns a page that holds complete packets
+
+        Parameters
+        ----------
+        packets : list
+            Packets (bytes) of the page. At most 255 segments of 255 bytes fit in a page
+        granulePosition : int
+            Codec-specific position at the end of the last packet
+        firstPage : bool, optional
+            Beginning of the stream
+        lastPage : bool, optional
+            End of the stream
+        """
+        lacing = bytearray()
+        for packet in packets:
+            lacing += b'\xff' * (len(packet) // 255) + bytes([len(packet) % 255])
+        headerType = (0x02 if firstPage else 0) | (0x04 if lastPage else 0)
+        header = struct.pack('<4sBBqIIIB', b'OggS', 0, headerType, granulePosition, self.__serialNumber,
+                             self.__sequenceNumber, 0, len(lacing)) + bytes(lacing)
+        self.__sequenceNumber += 1
+        page = bytearray(header + b''.join(packets))
+        struct.pack_into('<I', page, 22, self.crc(page))
+        return bytes(page)
+
+class OpusEncoder(AudioEncoder):
+    """
+    Lossy Ogg Opus stream, about a tenth of the size of the PCM. Each chunk is encoded into one page, so that no audio
+    is held back apart from a partial Opus packet. Needs opuslib (pip install opuslib) and the Opus library
+    """
+
+    encoding = 'OGG_OPUS'
+
+    def __init__(self, sampleRate: int, bitrate: int = opusBitrate, frameDuration: float = opusFrameDuration):
+        """
+        Parameters
+        ----------
+        sampleRate : int
+            Audio sample rate: 8, 12, 16, 24 or 48 kHz
+        bitrate : int, optional
+            Bits per second
+        frameDuration : float, optional
+            Seconds per Opus packet
+        """
+        super().__init__()
+        try:
+            import opuslib      # Optional dependency: pip install opuslib
+        except Exception as exception:      # opuslib raises Exception if the Opus library itself is missing
+            raise ImportError('Unable to load opuslib: ' + str(exception)) from exception
+        self.__encoder = opuslib.Encoder(sampleRate, 1, opuslib.APPLICATION_VOIP)
+        self.__encoder.bitrate = bitrate
+        self.__frameSamples = int(sampleRate * frameDuration)
+        self.__frameBytes = self.__frameSamples * 2
+        self.__granuleScale = 48000 // sampleRate      # Ogg Opus granule positions count samples at 48 kHz
+        self.__remainder = b''          # Partial packet carried over to the next chunk
+        self.__ogg = OggWriter()
+        opusHead = struct.pack('<8sBBHIhB', b'OpusHead', 1, 1, opusPreSkip, sampleRate, 0, 0)
+        vendor = b'EasyGradeXL'
+        opusTags = struct.pack('<8sI', b'OpusTags', len(vendor)) + vendor + struct.pack('<I', 0)
+        self.__header = self.__ogg.page([opusHead], 0, firstPage=True) + self.__ogg.page([opusTags], 0)
+
+    def __encodePackets(self, data: bytes, lastPage: bool = False, endGranule: int = None) -> bytes:
+        packets = []
+        for start in range(0, len(data) - self.__frameBytes + 1, self.__frameBytes):
+            packets.append(self.__encoder.encode(data[start:start + self.__frameBytes], self.__frameSamples))
+            self.samplesOut += self.__frameSamples
+        self.__remainder = data[len(packets) * self.__frameBytes:]
+        output = self.__header
+        self.__header = b''
+        if packets or lastPage:
+            # RFC 7845: the granule position counts the decoded samples, pre-skip included. A smaller granule position
+            # on the last page trims the padding at the end
+            granulePosition = self.samplesOut * self.__granuleScale if endGranule == None else endGranule
+            output += self.__ogg.page(packets, granulePosition, lastPage=lastPage)
+        return output
+
+    def _encode(self, chunk: bytes) -> bytes:
+        return self.__encodePackets(self.__remainder + chunk)
+
+    def _flush(self) -> bytes:
+        # The decoder drops the first opusPreSkip samples, so the last input samples only come out if the stream is
+        # padded with at least that much silence. The end granule position keeps the input and drops the padding
+        preSkipBytes = -(-opusPreSkip // self.__granuleScale) * 2
+        padding = preSkipBytes + (-(len(self.__remainder) + preSkipBytes)) % self.__frameBytes
+        endGranule = self.bytesIn // 2 * self.__granuleScale + opusPreSkip
+        return self.__encodePackets(self.__remainder + bytes(padding), lastPage=True, endGranule=endGranule)
+
+def createEncoder(encoding: str, sampleRate: int) -> AudioEncoder:
+    """
+    Creates an encoder for a stream
+
+    Parameters
+    ----------
+    encoding : str
+        'LINEAR16', 'FLAC' or 'OGG_OPUS'. LINEAR16 is used if it is empty
+    sampleRate : int
+        Audio sample rate
+
+    Returns
+    -------
+    AudioEncoder :
+        The encoder
+
+    Raises
+    ------
+    ValueError
+        If the encoding is unknown
+    ImportError
+        If the library of the encoder is not installed
+    """
+    encoding = str(encoding or 'LINEAR16').strip().upper()
+    if encoding == 'LINEAR16':
+        return PcmEncoder()
+    if encoding == 'FLAC':
+        return FlacEncoder(sampleRate)
+    if encoding in ('OGG_OPUS', 'OPUS'):
+        return OpusEncoder(sampleRate)
+    raise ValueError('Unknown audio encoding "' + str(encoding) + '"')
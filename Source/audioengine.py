@@ -1,8 +1,26 @@
 from __future__ import absolute_import
 from __future__ import division
 
-import pyaudio
-from six.moves import queue
+try:
+    import pyaudio
+    paContinue = pyaudio.paContinue
+except ImportError:     # Audio can still be injected with injectFrames()
+    pyaudio = None
+    paContinue = 0
+import threading
+import time
+from collections import deque
+from ringbuffer import RingBuffer
+from metrics import registry
+
+# Settings
+ringBufferSeconds = 10.0        # Seconds of audio held while the consumer is stalled, e.g. while the stream reconnects
+dropPolicy = 'dropOldest'       # 'dropOldest' or 'dropNewest'. What to discard when the ring buffer is full
+sampleWidth = 2                 # Bytes per sample (paInt16)
+voiceActivityDetection = False  # Only send speech to the speech recognizer, to reduce billed time and bandwidth
+vadKeepAliveInterval = 5.0      # Seconds without speech after which VAD sends a chunk of silence, to keep the stream open
+softwarePause = True            # Keep the microphone running while paused and gate the audio, so resuming is instant
+resumePreRollDuration = 0.5     # Seconds of audio captured just before resume() that are sent first, with softwarePause
 
 class AudioEngine(object):
     """
@@ -11,12 +29,18 @@ class AudioEngine(object):
     Methods
     _______
         pause()
-            Pauses the audio stream
+            Stops forwarding audio to the consumer
         resume()
-            Resumes the audio stream
+            Forwards audio again, starting with the pre-roll
+        injectFrames(data)
+            Feeds audio to the engine as if it came from the microphone
+        bufferStatistics()
+            Returns the counters of the ring buffer
+        vadStatistics()
+            Returns the counters of the voice activity detector
     """
 
-    def __init__(self, sampleRate: int, chunkSize: int):
+    def __init__(self, sampleRate: int, chunkSize: int, openDevice: bool = True, useVad: bool = None):
         """
         Parameters
         ----------
@@ -24,20 +48,39 @@ class AudioEngine(object):
             Audio sample rate. Google recommends 16 kHz
         sound : str
             The audio queue chuck size in bytes
+        openDevice : bool, optional
+            Open the microphone. If False, audio must be fed with injectFrames()
+        useVad : bool, optional
+            Forward only speech segments. Defaults to voiceActivityDetection
         """
 
         self.__sampleRate = sampleRate
         self.__chunkSize = chunkSize
-        # Initialize the audio queue
-        self.__openAudioStream()
+        self.__audioInterface = None
+        self.__audioStream = None
+        # Preallocated buffer that holds the audio until it is consumed
+        self.__ringBuffer = RingBuffer(int(self.__sampleRate * ringBufferSeconds) * sampleWidth, dropPolicy, sampleWidth)
+        # Voice activity detector between the ring buffer and the consumer
+        self.__vad = None
+        self.__lastCallbackTime = 0.0   # Time at which the audio callback last wrote to the ring buffer
+        # Software pause: while paused, the audio callback keeps the latest audio in the pre-roll instead
+        self.__paused = False
+        self.__preRoll = deque()
+        self.__preRollBytes = 0
+        self.__preRollCapacity = int(self.__sampleRate * resumePreRollDuration) * sampleWidth
+        self.__gateLock = threading.Lock()
+        if voiceActivityDetection if useVad == None else useVad:
+            from vad import VoiceActivityDetector       # Imports NumPy
+            self.__vad = VoiceActivityDetector(self.__sampleRate)
+        self.audioGenerator = self.__chunkGenerator()      # Generator of the audio chunks
+        if openDevice:
+            self.__openAudioStream()
 
     def __openAudioStream(self):
-        """Opens the audio stream and initiates the chunk queue.
+        """Opens the audio stream.
         """
 
-        self.__chunkQueue = queue.Queue()                  # Queue that holds the audio chunks
         self.__audioInterface = pyaudio.PyAudio()          # Create audio interface
-        self.audioGenerator = self.__chunkGenerator()      # Callback function to generate the audio chunks
         # Open audio stream
         self.__audioStream = self.__audioInterface.open(
             format=pyaudio.paInt16,
@@ -50,32 +93,40 @@ class AudioEngine(object):
         self.__audioStream.start_stream()
 
     def __chunkGenerator(self):
-        """ Chunk generator to fill audio queue
+        """ Chunk generator that drains the ring buffer
 
             Yields
             -------
-            chunk : list
-                A chunk of sampled audio data
+            chunk : bytes
+                All the sampled audio data captured since the previous chunk. Empty once the audio captured before
+                pause() has been drained, so that the consumer can end its stream. With voice activity detection,
+                silence replaces the audio that is dropped once every vadKeepAliveInterval seconds, because Google
+                ends a stream that receives no audio for about ten seconds
         """
 
+        lastYieldTime = time.monotonic()
         while True:
-            chunk = self.__chunkQueue.get(block=True)       # Get audio chunk from queue
-            if chunk is None:
+            chunk = self.__ringBuffer.read()        # Blocks until audio is available
+            if chunk is None:                       # The ring buffer was closed
                 return
-            data = [chunk]
-            # Now consume whatever other data's still in the queue
-            while True:
-                try:
-                    chunk = self.__chunkQueue.get(block=False)
-                    if chunk is None:
-                        return
-                    data.append(chunk)
-                except queue.Empty:
-                    break
-            yield b"".join(data)
+            if not chunk:                           # Interrupted by pause()
+                if self.__paused:
+                    yield chunk
+                continue
+            if self.__vad != None:
+                length = len(chunk)
+                chunk = self.__vad.process(chunk)   # Drop silence
+                if not chunk:
+                    if time.monotonic() - lastYieldTime < vadKeepAliveInterval:
+                        continue
+                    chunk = bytes(length)           # Keep the stream alive
+                    registry.increment('audio.keepAliveBytes', length)
+            registry.observe('audio.callbackToYield', time.monotonic() - self.__lastCallbackTime)
+            lastYieldTime = time.monotonic()
+            yield chunk
 
     def __fillChunkBuffer(self, in_data: list, frame_count, time_info, status_flags):
-        """ Continuously collect data from the audio stream and adds it to self.__chunkQueue
+        """ Continuously collect data from the audio stream and adds it to the ring buffer
         Parameters
         ----------
         in_data : list
@@ -86,18 +137,96 @@ class AudioEngine(object):
         pyaudio.paContinue : Portaudio callback return code
             Indicates __chunkGenerator must continue sending chunks
         """
-        self.__chunkQueue.put(in_data)
-        return None, pyaudio.paContinue
+        startTime = time.monotonic()
+        with self.__gateLock:
+            if self.__paused:
+                self.__keepPreRoll(in_data)
+                registry.increment('audio.bytesGated', len(in_data))
+                registry.observe('audio.callback', time.monotonic() - startTime)
+                return None, paContinue
+            self.__ringBuffer.write(in_data)
+        self.__lastCallbackTime = startTime
+        registry.increment('audio.bytesCaptured', len(in_data))
+        registry.gauge('audio.ringBufferBytes', len(self.__ringBuffer))
+        registry.observe('audio.callback', time.monotonic() - startTime)
+        return None, paContinue
+
+    def __keepPreRoll(self, data: bytes):
+        """ Adds audio to the pre-roll and discards the audio older than resumePreRollDuration. Must be called with
+        __gateLock held
+        """
+        if self.__preRollCapacity <= 0:
+            return
+        self.__preRoll.append(bytes(data))
+        self.__preRollBytes += len(data)
+        while self.__preRollBytes - len(self.__preRoll[0]) >= self.__preRollCapacity:
+            self.__preRollBytes -= len(self.__preRoll.popleft())
+
+    def injectFrames(self, data: bytes):
+        """ Feeds audio to the engine through the same path as the microphone
+
+        Parameters
+        ----------
+        data : bytes
+            16-bit mono samples at the engine's sample rate
+        """
+        self.__fillChunkBuffer(data, len(data) // sampleWidth, None, 0)
+
+    def bufferStatistics(self) -> dict:
+        """ Returns the counters of the ring buffer
+
+        Returns
+        _______
+        dict
+            Capacity, bytes held, high-water mark, bytes written, bytes dropped and number of overruns
+        """
+        return self.__ringBuffer.statistics()
+
+    def vadStatistics(self) -> dict:
+        """ Returns the counters of the voice activity detector
+
+        Returns
+        _______
+        dict
+            Bytes received, bytes forwarded and the fraction suppressed. Empty if voice activity detection is off
+        """
+        return self.__vad.statistics() if self.__vad != None else {}
 
     def pause(self):
-        """ Temporarily stops the audio stream"""
+        """ Stops forwarding audio. The audio captured so far is still delivered, then the chunk generator yields an
+        empty chunk. With softwarePause, the microphone keeps running and the latest audio is kept as pre-roll.
+        Otherwise, the audio stream is stopped.
+        """
 
-        self.__audioStream.stop_stream()
+        with self.__gateLock:
+            if self.__paused:
+                return
+            self.__paused = True
+            self.__preRoll.clear()
+            self.__preRollBytes = 0
+        if not softwarePause and self.__audioStream != None:
+            self.__audioStream.stop_stream()
+        self.__ringBuffer.interrupt()
 
     def resume(self):
-        """ Resumes the audio stream"""
+        """ Forwards audio again. The audio captured before pause() that was not consumed is discarded. With
+        softwarePause, the pre-roll is delivered first, so that words spoken while the resume request was on its way
+        are not clipped. Otherwise, the audio stream is restarted.
+        """
 
-        self.__audioStream.start_stream()
+        if not softwarePause and self.__audioStream != None:
+            self.__audioStream.start_stream()
+        with self.__gateLock:
+            if not self.__paused:
+                return
+            registry.increment('audio.bytesStale', len(self.__ringBuffer))
+            self.__ringBuffer.clear()
+            for chunk in self.__preRoll:
+                self.__ringBuffer.write(chunk)
+            registry.increment('audio.bytesPreRolled', self.__preRollBytes)
+            self.__preRoll.clear()
+            self.__preRollBytes = 0
+            self.__paused = False
 
     def __del__(self):
         """
@@ -113,7 +242,7 @@ class AudioEngine(object):
         except:
             pass
         try:
-            self.__chunkQueue.put(None)
+            self.__ringBuffer.close()
         except:
             pass
         try:
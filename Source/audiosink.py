@@ -0,0 +1,266 @@
+#************************************************************************************************************************************************************************************
+# Copyright (c) 2021 Tony L. Jones
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”),
+# to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# The sound files were downloaded from https://www.fesliyanstudios.com
+#********************************************************************************************************************************************************************************
+
+
+import importlib.util
+import io
+import os
+import threading
+import time
+import wave
+from abc import ABC, abstractmethod
+from typing import Iterable
+try:
+    import winsound
+except ImportError:     # Not available outside Windows
+    winsound = None
+
+# Settings
+playbackChunkFrames = 1024      # Number of frames written to the output device at a time by PyAudioSink
+defaultSampleRate = 24000       # Sample rate assumed for LINEAR16 audio without a wave header
+sampleWidth = 2                 # LINEAR16 is 16-bit
+
+class AudioSink(ABC):
+    """
+        Plays synthesized audio. play() blocks until the clip has finished or was cancelled.
+
+        Methods
+        _______
+            play(waveData)
+                Plays a LINEAR16 clip, with or without a wave header
+            playChunks(chunks, sampleRate, channels)
+                Plays LINEAR16 audio as the chunks arrive
+            cancel()
+                Stops the clip that is playing (barge-in)
+            close()
+                Releases the output device
+    """
+
+    def __init__(self):
+        self._generation = 0        # Incremented by cancel(). A clip stops when the generation changes
+
+    def play(self, waveData: bytes):
+        """
+        Plays a LINEAR16 clip and blocks until it has finished or was cancelled
+
+        Parameters
+        ----------
+        waveData : bytes
+            The audio in the form of a wave file, or raw LINEAR16 samples at defaultSampleRate
+        """
+        pcm, sampleRate, channels = splitWave(waveData)
+        self.playChunks([pcm], sampleRate, channels)
+
+    @abstractmethod
+    def playChunks(self, chunks: Iterable[bytes], sampleRate: int, channels: int = 1):
+        """
+        Plays LINEAR16 audio as the chunks arrive and blocks until it has finished or was cancelled
+
+        Parameters
+        ----------
+        chunks : iterable
+            Chunks of raw LINEAR16 samples
+        sampleRate : int
+            Sample rate in Hz
+        channels : int, optional
+            Number of channels
+        """
+
+    def cancel(self):
+        """
+        Stops the clip that is playing. Has no effect on sinks that can not be interrupted
+        """
+        self._generation += 1
+
+    def close(self):
+        """
+        Releases the output device
+        """
+        pass
+
+class WinsoundSink(AudioSink):
+    """
+        Plays clips with winsound.PlaySound. Windows only. The clip plays to the end, because winsound can not
+        play from memory asynchronously and therefore can not be interrupted.
+    """
+
+    def play(self, waveData: bytes):
+        winsound.PlaySound(waveData, winsound.SND_MEMORY | winsound.SND_NOSTOP)
+
+    def playChunks(self, chunks: Iterable[bytes], sampleRate: int, channels: int = 1):
+        self.play(makeWave(b''.join(chunks), sampleRate, channels))
+
+class PyAudioSink(AudioSink):
+    """
+        Streams clips to the default output device through PortAudio in chunks of playbackChunkFrames frames. A call
+        to cancel() stops the clip after the chunk that is being written. The Google text-to-speech API returns every
+        clip whole, so playback starts once the clip has arrived; playChunks() can play a stream of chunks as they
+        arrive from a streaming source.
+    """
+
+    def __init__(self):
+        super().__init__()
+        import pyaudio      # Imported when needed, it takes long to load
+        self.__pyaudio = pyaudio
+        self.__audioInterface = None
+        self.__stream = None
+        self.__streamFormat = None          # (sampleRate, channels) of the open stream
+        self.__lock = threading.Lock()
+
+    def __openStream(self, sampleRate: int, channels: int):
+        """
+        Opens the output stream, or reuses the open stream if it has the same format
+        """
+        if self.__streamFormat == (sampleRate, channels):
+            return
+        if self.__stream != None:
+            self.__stream.close()
+        if self.__audioInterface == None:
+            self.__audioInterface = self.__pyaudio.PyAudio()
+        self.__stream = self.__audioInterface.open(format=self.__pyaudio.paInt16, channels=channels, rate=sampleRate, output=True)
+        self.__streamFormat = (sampleRate, channels)
+
+    def playChunks(self, chunks: Iterable[bytes], sampleRate: int, channels: int = 1):
+        generation = self._generation
+        chunkBytes = playbackChunkFrames * sampleWidth * channels
+        with self.__lock:
+            self.__openStream(sampleRate, channels)
+            for chunk in chunks:
+                view = memoryview(chunk)
+                for start in range(0, len(view), chunkBytes):
+                    if generation != self._generation:      # Cancelled
+                        return
+                    self.__stream.write(view[start:start + chunkBytes].tobytes())
+
+    def close(self):
+        with self.__lock:
+            try:
+                if self.__stream != None:
+                    self.__stream.close()
+                if self.__audioInterface != None:
+                    self.__audioInterface.terminate()
+            finally:
+                self.__stream = None
+                self.__streamFormat = None
+                self.__audioInterface = None
+
+class NullSink(AudioSink):
+    """
+        Discards the audio. Used for headless benchmarking. If realTime is set, play() takes as long as the clip
+        would take to play, and can be cancelled.
+
+        Attributes
+        ----------
+        clipsPlayed : int
+            Number of clips received
+        bytesPlayed : int
+            Number of bytes of LINEAR16 samples received
+    """
+
+    def __init__(self, realTime: bool = False):
+        """
+        Parameters
+        ----------
+        realTime : bool, optional
+            Simulate the duration of the clips
+        """
+        super().__init__()
+        self.__realTime = realTime
+        self.clipsPlayed: int = 0
+        self.bytesPlayed: int = 0
+
+    def playChunks(self, chunks: Iterable[bytes], sampleRate: int, channels: int = 1):
+        generation = self._generation
+        self.clipsPlayed += 1
+        for chunk in chunks:
+            self.bytesPlayed += len(chunk)
+            if self.__realTime:
+                stopTime = time.monotonic() + len(chunk) / (sampleRate * sampleWidth * channels)
+                while time.monotonic() < stopTime:
+                    if generation != self._generation:
+                        return
+                    time.sleep(min(0.01, max(0.0, stopTime - time.monotonic())))
+
+class FileSink(AudioSink):
+    """
+        Writes every clip to a numbered wave file in a directory. Used for headless benchmarking
+    """
+
+    def __init__(self, directory: str):
+        """
+        Parameters
+        ----------
+        directory : str
+            Directory in which the wave files are written
+        """
+        super().__init__()
+        self.__directory = directory
+        self.__count = 0
+        os.makedirs(self.__directory, exist_ok=True)
+
+    def playChunks(self, chunks: Iterable[bytes], sampleRate: int, channels: int = 1):
+        self.__count += 1
+        with wave.open(os.path.join(self.__directory, 'clip%05d.wav' % self.__count), 'wb') as waveFile:
+            waveFile.setnchannels(channels)
+            waveFile.setsampwidth(sampleWidth)
+            waveFile.setframerate(sampleRate)
+            for chunk in chunks:
+                waveFile.writeframes(chunk)
+
+def splitWave(waveData: bytes):
+    """
+    Separates the samples from the header of a wave file
+
+    Parameters
+    ----------
+    waveData : bytes
+        The audio in the form of a wave file, or raw LINEAR16 samples at defaultSampleRate
+
+    Returns
+    -------
+    tuple :
+        The samples, the sample rate and the number of channels
+    """
+    if waveData[:4] == b'RIFF':
+        with wave.open(io.BytesIO(waveData), 'rb') as waveFile:
+            return waveFile.readframes(waveFile.getnframes()), waveFile.getframerate(), waveFile.getnchannels()
+    return waveData, defaultSampleRate, 1
+
+def makeWave(pcm: bytes, sampleRate: int, channels: int = 1) -> bytes:
+    """
+    Adds a wave header to LINEAR16 samples
+
+    Returns
+    -------
+    bytes :
+        The audio in the form of a wave file
+    """
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as waveFile:
+        waveFile.setnchannels(channels)
+        waveFile.setsampwidth(sampleWidth)
+        waveFile.setframerate(sampleRate)
+        waveFile.writeframes(pcm)
+    return buffer.getvalue()
+
+def defaultAudioSink() -> AudioSink:
+    """
+    Returns the sink for the platform: PortAudio if PyAudio is installed, because its clips can be cut off by
+    barge-in, otherwise winsound on Windows, and NullSink if neither is available
+    """
+    if importlib.util.find_spec('pyaudio') != None:
+        return PyAudioSink()
+    if winsound != None:
+        return WinsoundSink()
+    return NullSink()
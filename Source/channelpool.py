@@ -0,0 +1,273 @@
+#************************************************************************************************************************************************************************************
+# Copyright (c) 2021 Tony L. Jones
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”),
+# to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# The sound files were downloaded from https://www.fesliyanstudios.com
+#********************************************************************************************************************************************************************************
+
+
+import threading
+import time
+from typing import Dict
+import grpc
+import metrics
+
+# Settings
+speechEndpoint = 'speech.googleapis.com:443'                # Google speech-to-text API
+textToSpeechEndpoint = 'texttospeech.googleapis.com:443'    # Google text-to-speech API
+cloudPlatformScope = 'https://www.googleapis.com/auth/cloud-platform'
+keepAliveTime = 30.0            # Seconds between keepalive pings, so that routers and proxies do not drop an idle channel
+keepAliveTimeout = 10.0         # Seconds to wait for a keepalive ping to be acknowledged before reconnecting
+warmUpTimeout = 10.0            # Seconds the warm-up waits for the channels to connect
+
+class _FirstRequestInterceptor(grpc.UnaryUnaryClientInterceptor, grpc.StreamStreamClientInterceptor):
+    """
+    Measures the latency of the first request made on a channel: until the response of a unary request, or until
+    the server accepts a streaming request. Later requests pass through untouched
+    """
+
+    def __init__(self, report: callable):
+        self.__report = report
+        self.__measured = False
+        self.__lock = threading.Lock()
+
+    def __isFirst(self) -> bool:
+        with self.__lock:
+            first = not self.__measured
+            self.__measured = True
+            return first
+
+    def intercept_unary_unary(self, continuation, clientCallDetails, request):
+        if not self.__isFirst():
+            return continuation(clientCallDetails, request)
+        startTime = time.monotonic()
+        call = continuation(clientCallDetails, request)
+        call.add_done_callback(lambda call: self.__report(time.monotonic() - startTime))
+        return call
+
+    def intercept_stream_stream(self, continuation, clientCallDetails, requestIterator):
+        if not self.__isFirst():
+            return continuation(clientCallDetails, requestIterator)
+        startTime = time.monotonic()
+        call = continuation(clientCallDetails, requestIterator)
+
+        def waitForServer():
+            try:
+                call.initial_metadata()     # Returns when the server has accepted the stream
+                self.__report(time.monotonic() - startTime)
+            except Exception:
+                pass    # The error is raised to the caller by the call itself
+
+        threading.Thread(target=waitForServer, daemon=True).start()
+        return call
+
+class ChannelPool(object):
+    """
+        The gRPC channels to the Google APIs, shared by the speech-to-text and text-to-speech clients of the app. There
+        is one channel per endpoint, configured with keepalive pings so that it stays open between dictation sessions,
+        and the credentials are loaded once for all the channels.
+
+        A new channel connects on its first request, so the first grade and the first readback would wait for the DNS
+        lookup, the TLS handshake and the access token. warmUp() does all of this in the background at startup.
+
+        Methods
+        _______
+            speechClient()
+                Returns a speech.SpeechClient that uses the pool
+            textToSpeechClient()
+                Returns a texttospeech.TextToSpeechClient that uses the pool
+            channel(endpoint)
+                Returns the channel to an endpoint
+            warmUp(timeout)
+                Connects the channels in the background
+            waitUntilReady(timeout)
+                Waits for the warm-up to finish
+            channelStates()
+                Returns the connectivity state of each channel
+            statistics()
+                Returns the state, connect time and first-request latency of each channel
+            close()
+                Closes the channels
+    """
+
+    def __init__(self, speechEndpoint: str = speechEndpoint, textToSpeechEndpoint: str = textToSpeechEndpoint,
+                 secure: bool = True, credentials: object = None):
+        """
+        Parameters
+        ----------
+        speechEndpoint : str, optional
+            Address of the speech-to-text API
+        textToSpeechEndpoint : str, optional
+            Address of the text-to-speech API
+        secure : bool, optional
+            Connect with TLS and credentials. Unsecured channels are used to connect to local test servers
+        credentials : google.auth.credentials.Credentials, optional
+            Credentials of the channels. The application default credentials are used if they are not given
+        """
+        self.__speechEndpoint = speechEndpoint
+        self.__textToSpeechEndpoint = textToSpeechEndpoint
+        self.__secure = secure
+        self.__credentials = credentials
+        self.__lock = threading.Lock()
+        self.__channels: Dict[str, grpc.Channel] = {}
+        self.__states: Dict[str, str] = {}              # Endpoint -> name of the connectivity state
+        self.__connectStarts: Dict[str, float] = {}     # Endpoint -> time at which the warm-up started connecting
+        self.__connectTimes: Dict[str, float] = {}      # Endpoint -> seconds the warm-up took to connect
+        self.__firstRequestLatencies: Dict[str, float] = {}
+        self.__warmUpThread = None
+
+    def speechClient(self) -> object:
+        """
+        Returns a speech.SpeechClient whose requests go through the pool
+        """
+        from google.cloud import speech
+        transportClass = speech.SpeechClient.get_transport_class('grpc')
+        return speech.SpeechClient(transport=transportClass(channel=self.channel(self.__speechEndpoint)))
+
+    def textToSpeechClient(self) -> object:
+        """
+        Returns a texttospeech.TextToSpeechClient whose requests go through the pool
+        """
+        from google.cloud import texttospeech
+        transportClass = texttospeech.TextToSpeechClient.get_transport_class('grpc')
+        return texttospeech.TextToSpeechClient(transport=transportClass(channel=self.channel(self.__textToSpeechEndpoint)))
+
+    def channel(self, endpoint: str) -> grpc.Channel:
+        """
+        Returns the channel to an endpoint, and creates it if it does not exist yet
+
+        Parameters
+        ----------
+        endpoint : str
+            Address of the API, as host:port
+
+        Returns
+        -------
+        grpc.Channel :
+            The channel
+        """
+        with self.__lock:
+            channel = self.__channels.get(endpoint)
+            if channel == None:
+                channel = self.__channels[endpoint] = self.__createChannel(endpoint)
+            return channel
+
+    def __createChannel(self, endpoint: str) -> grpc.Channel:
+        options = [
+            ('grpc.keepalive_time_ms', int(keepAliveTime * 1000)),
+            ('grpc.keepalive_timeout_ms', int(keepAliveTimeout * 1000)),
+            ('grpc.keepalive_permit_without_calls', 1),     # Keep the channel open while recognition is paused
+            ('grpc.http2.max_pings_without_data', 0),
+            ('grpc.max_send_message_length', -1),
+            ('grpc.max_receive_message_length', -1),
+        ]
+        if self.__secure:
+            import google.auth
+            from google.api_core import grpc_helpers
+            if self.__credentials == None:
+                self.__credentials, project = google.auth.default(scopes=[cloudPlatformScope])
+            channel = grpc_helpers.create_channel(endpoint, credentials=self.__credentials, options=options)
+        else:
+            channel = grpc.insecure_channel(endpoint, options=options)
+        self.__states[endpoint] = grpc.ChannelConnectivity.IDLE.name
+        channel.subscribe(lambda state: self.__setState(endpoint, state))
+        return grpc.intercept_channel(channel,
+                                      _FirstRequestInterceptor(lambda latency: self.__setFirstRequestLatency(endpoint, latency)))
+
+    def __setState(self, endpoint: str, state: grpc.ChannelConnectivity):
+        with self.__lock:
+            self.__states[endpoint] = state.name
+            startTime = self.__connectStarts.get(endpoint)
+            if state == grpc.ChannelConnectivity.READY and startTime != None and endpoint not in self.__connectTimes:
+                self.__connectTimes[endpoint] = time.monotonic() - startTime
+                metrics.registry.observe('grpc.connect', self.__connectTimes[endpoint])
+
+    def __setFirstRequestLatency(self, endpoint: str, latency: float):
+        with self.__lock:
+            self.__firstRequestLatencies[endpoint] = latency
+        metrics.registry.observe('grpc.firstRequestLatency', latency)
+
+    def warmUp(self, timeout: float = warmUpTimeout) -> threading.Thread:
+        """
+        Connects the channels of the clients created so far in the background, and refreshes the access token, so
+        that the first requests do not have to wait for them. Failures are left to the first requests to report
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Seconds to wait for the channels to connect
+
+        Returns
+        -------
+        threading.Thread :
+            The thread doing the warm-up
+        """
+        with self.__lock:
+            channels = dict(self.__channels)
+            for endpoint in channels:
+                self.__connectStarts.setdefault(endpoint, time.monotonic())
+        self.__warmUpThread = threading.Thread(target=self.__warmUp, args=(channels, timeout), daemon=True)
+        self.__warmUpThread.start()
+        return self.__warmUpThread
+
+    def __warmUp(self, channels: Dict[str, grpc.Channel], timeout: float):
+        stopTime = time.monotonic() + timeout
+        # The channels connect concurrently in the gRPC threads while the token is refreshed
+        readyFutures = [grpc.channel_ready_future(channel) for channel in channels.values()]
+        if self.__secure and self.__credentials != None and not self.__credentials.valid:
+            try:
+                import google.auth.transport.requests
+                self.__credentials.refresh(google.auth.transport.requests.Request())
+            except Exception:
+                pass
+        for readyFuture in readyFutures:
+            try:
+                readyFuture.result(timeout=max(0.0, stopTime - time.monotonic()))
+            except grpc.FutureTimeoutError:
+                readyFuture.cancel()
+
+    def waitUntilReady(self, timeout: float = None) -> bool:
+        """
+        Waits for the warm-up to finish
+
+        Returns
+        -------
+        bool :
+            True if all the channels are connected
+        """
+        if self.__warmUpThread != None:
+            self.__warmUpThread.join(timeout)
+        states = self.channelStates()
+        return states != {} and all(state == grpc.ChannelConnectivity.READY.name for state in states.values())
+
+    def channelStates(self) -> Dict[str, str]:
+        """
+        Returns the connectivity state of each channel: IDLE, CONNECTING, READY, TRANSIENT_FAILURE or SHUTDOWN
+        """
+        with self.__lock:
+            return dict(self.__states)
+
+    def statistics(self) -> Dict[str, dict]:
+        """
+        Returns, per endpoint, the connectivity state, the seconds the warm-up took to connect and the latency of the
+        first request in seconds. The times are None until they are known
+        """
+        with self.__lock:
+            return {endpoint: {'state': self.__states.get(endpoint),
+                               'connectTime': self.__connectTimes.get(endpoint),
+                               'firstRequestLatency': self.__firstRequestLatencies.get(endpoint)}
+                    for endpoint in self.__channels}
+
+    def close(self):
+        with self.__lock:
+            channels = list(self.__channels.values())
+            self.__channels.clear()
+        for channel in channels:
+            channel.close()
@@ -12,7 +12,10 @@
 # The sound files were downloaded from https://www.fesliyanstudios.com
 #********************************************************************************************************************************************************************************
 from typing import Dict, Any
+import json
+import os
 import sys
+from workbookreader import WorkbookReader, ExcelWorkbookReader
 """ Reads the settings from the "Settings" sheet of the Excel workbook
 
     Attributes
@@ -37,18 +40,49 @@ import sys
         Google Cloud API speech-to-text gender
     SsmlSayAs : str = ''
         Google Cloud API say as string
+    languages : Dict[str, str]
+        Google Cloud API language codes from the "Languages" sheet, keyed by language name
+    speechRecognitionEngine : str
+        Speech recognition engine, 'Google' or 'Local'. Google is used if it is empty
+    pathToLocalSpeechModel : str
+        Full path to the directory of the local speech recognition model
+    idColumn : str
+        Column of the marked sheets that holds the student IDs
+    markColumn : str
+        Column of the marked sheets that holds the marks
+    firstRow : int
+        First row of the marked sheets that holds a student
+    lastRow : int
+        Last row of the marked sheets that is searched for students
+    loadedFromSnapshot : bool
+        True if the settings were loaded from the snapshot file instead of the workbook
 """
+
+# Settings
+snapshotVersion = 3             # Increment when the format of the snapshot changes
+maxSnapshots = 20               # Maximum number of workbooks kept in the snapshot file
+# Attributes stored in the snapshot
+snapshotAttributes = ['speechToTextLanguageCode', 'textToSpeechLanguageCode', 'pathToGoogleCredentials',
+                      'replacementDictionary', 'commonPhrases', 'textToSpeechVoice', 'textToSpeechGender', 'SsmlSayAs',
+                      'languages', 'speechRecognitionEngine', 'pathToLocalSpeechModel', 'idColumn', 'markColumn',
+                      'firstRow', 'lastRow']
+# Sheets of the workbook that do not hold students and marks
+settingsSheets = ['Settings', 'Languages']
+
 class GetSettings(object):
-    def __init__(self, wb: object, callExcelMacro: callable, exceptionHook: callable):
+    def __init__(self, wb: object, callExcelMacro: callable, exceptionHook: callable, snapshotPath: str = None):
         """
             Parameters
             ----------
-            pipeName : wb
-                The workbook object
+            wb : object
+                The workbook object, or a WorkbookReader to read the settings from
             callExcelMacro : callable
                 Handle to method that must be called to call Excel VBA macros
             exceptionHook : callable
                 Handle to the method that handles exceptions
+            snapshotPath : str, optional
+                Path to the JSON file in which the settings are cached between launches. The settings are read
+                from the workbook only if it was saved since the snapshot was taken
         """
         self.speechToTextLanguageCode: str = ''
         self.textToSpeechLanguageCode: str = ''
@@ -60,101 +94,194 @@ class GetSettings(object):
         self.textToSpeechVoice: str = ''
         self.textToSpeechGender: str = ''
         self.SsmlSayAs: str = ''
+        self.languages: Dict[str, str] = {}
+        self.speechRecognitionEngine: str = ''
+        self.pathToLocalSpeechModel: str = ''
+        self.idColumn: str = 'A'
+        self.markColumn: str = 'B'
+        self.firstRow: int = 2
+        self.lastRow: int = 1000
         self.__wb: object
+        self.__workbook: WorkbookReader
         self.__callExcelMacro: callable
         self.__exceptionHook: callable
         self.__wb = wb
+        if isinstance(wb, WorkbookReader):
+            self.__workbook = wb
+        else:
+            self.__workbook = ExcelWorkbookReader(wb)
         self.__callExcelMacro = callExcelMacro
         self.__exceptionHook = exceptionHook
-        self.__getSettingsFromExcel()
+        self.__snapshotPath = snapshotPath
+        self.__settingsRead = False         # Set to true when all the settings were read from the workbook
+        self.loadedFromSnapshot = False     # Set to true if the settings were loaded from the snapshot
+        fingerprint = None
+        if self.__snapshotPath != None:
+            fingerprint = self.__workbook.fingerprint()
+        if fingerprint != None:
+            self.loadedFromSnapshot = self.__loadSnapshot(fingerprint)
+        if not self.loadedFromSnapshot:
+            self.__getSettingsFromExcel()
+            if fingerprint != None and self.__settingsRead:
+                self.__saveSnapshot(fingerprint)
+
+    def __readSnapshotFile(self) -> dict:
+        """
+            Reads the snapshot file
+
+            Returns
+            -------
+            dict
+                Snapshots keyed by workbook name. Empty if the file does not exist or has another version
+        """
+        try:
+            with open(self.__snapshotPath, 'r', encoding='utf-8') as snapshotFile:
+                contents = json.load(snapshotFile)
+            if contents.get('version') == snapshotVersion:
+                return contents['workbooks']
+        except:
+            pass
+        return {}
 
-    def __getLanguageCode(self, wb: object, selectedLanguage: str)->str:
+    def __loadSnapshot(self, fingerprint: tuple) -> bool:
         """
-            Reads the language code from the "Settings" sheet of the workbook
+            Loads the settings from the snapshot file if the snapshot was taken from the current version of the
+            workbook
+
+            Parameters
+            ----------
+            fingerprint : tuple
+                The workbook name and stamp returned by WorkbookReader.fingerprint()
+
+            Returns
+            -------
+            bool
+                True if the settings were loaded
+        """
+        workbookName, stamp = fingerprint
+        snapshot = self.__readSnapshotFile().get(workbookName)
+        try:
+            if snapshot == None or snapshot['stamp'] != stamp:
+                return False
+            settings = snapshot['settings']
+            if set(settings) != set(snapshotAttributes):
+                return False
+            for attribute in snapshotAttributes:
+                setattr(self, attribute, settings[attribute])
+            return True
+        except:
+            return False
+
+    def __saveSnapshot(self, fingerprint: tuple):
+        """
+            Saves the settings to the snapshot file. A failure to write the file is ignored, because the settings
+            will simply be read from the workbook again on the next launch
+
+            Parameters
+            ----------
+            fingerprint : tuple
+                The workbook name and stamp returned by WorkbookReader.fingerprint()
+        """
+        workbookName, stamp = fingerprint
+        try:
+            workbooks = self.__readSnapshotFile()
+            workbooks.pop(workbookName, None)       # Re-insert to mark this workbook as the most recently used
+            workbooks[workbookName] = {
+                'stamp': stamp,
+                'settings': {attribute: getattr(self, attribute) for attribute in snapshotAttributes}
+            }
+            while len(workbooks) > maxSnapshots:
+                del workbooks[next(iter(workbooks))]
+            # Write to a temporary file first, so that an interrupted write never leaves a corrupt snapshot
+            temporaryPath = self.__snapshotPath + '.tmp'
+            with open(temporaryPath, 'w', encoding='utf-8') as snapshotFile:
+                json.dump({'version': snapshotVersion, 'workbooks': workbooks}, snapshotFile, separators=(',', ':'))
+            os.replace(temporaryPath, self.__snapshotPath)
+        except:
+            pass
+
+    def readBackTexts(self, sheetName: str) -> list:
+        """
+            Reads the texts that the workbook reads back while marks are entered on a sheet: the student IDs in the
+            ID column and the marks in the mark column, between firstRow and lastRow. Each column is read in a
+            single call.
+
+            Parameters
+            ----------
+            sheetName : str
+                Name of the sheet on which the marks are entered
+            Returns
+            -------
+            list
+                The distinct texts, as the macros of the workbook pass them to text-to-speech. Empty if the sheet
+                is a settings sheet
+        """
+        texts = []
+        if sheetName in settingsSheets:
+            return texts
+        for column in (self.idColumn, self.markColumn):
+            cells = self.__workbook.readRange(sheetName, column + str(self.firstRow) + ':' + column + str(self.lastRow))
+            for value, in cells:
+                text = cellText(value)
+                if text != '' and text not in texts:
+                    texts.append(text)
+        return texts
+
+    def getLanguageCode(self, selectedLanguage: str)->str:
+        """
+            Looks up the language code of a language in the index of the "Languages" sheet of the workbook
 
             Parameters
             ----------
-            wb : object
-               The workbook object
             selectedLanguage : string
                The name of the selected language
             Returns
             -------
-    l       string
+            string
                 The Google Cloud API language code
+
+            Raises
+            ------
+            ValueError
+                If the language is not on the "Languages" sheet
        """
 
         try:
-            wsLanguages = wb.Sheets('Languages')
-            language = wsLanguages.Range('A1').Value
-            languageCode = wsLanguages.Range('B1').Value
-            found = str(selectedLanguage) == str(language)
-            row = 2
-            while not found and language != None and languageCode != None:
-                language = wsLanguages.Range('A' + str(row)).Value
-                languageCode = wsLanguages.Range('B' + str(row)).Value
-                found = str(selectedLanguage) == str(language)
-                row += 1
-            return languageCode
-        except:
-            exType, exValue, exTraceback = sys.exc_info()
-            self.__exceptionHook(exType, exValue, exTraceback)
+            return self.languages[str(selectedLanguage)]
+        except KeyError:
+            raise ValueError('Unable to find setting: language "' + str(selectedLanguage) + '" is not on the "Languages" sheet') from None
 
     def __getSettingsFromExcel(self):
         """
-            Reads the settings from the "Settings" sheet in the Execl workbook
+            Reads the settings from the "Settings" sheet in the Execl workbook. Each block of cells is read from the
+            workbook in a single call.
         """
 
         settingsFound = True
         try:
-            ws = self.__wb.Sheets('Settings')
+            # Selected languages, voice, SSML <say as> and speech recognition engine in cells B3:B7
+            settingsCells = self.__workbook.readRange('Settings', 'B3:B7')
         except:
             settingsFound = False
-            self.__callExcelMacro("pythonError", 'settingsSheetNotFound')
         try:
             if settingsFound:
                 # Construct replacements dictionary
-                key = ws.Range('D2').Value
-                if key != None:
-                    keyString = str(key)
-                    keyString = keyString.replace('"', '')
-                value = ws.Range('E2').Value
-                if value != None:
-                    valueString = str(value)
-                    valueString = valueString.replace('"', '')
-                if keyString != None:
-                    row = 3
-                    while key != None and value != None:
-                        self.replacementDictionary[keyString] = valueString
-                        key = ws.Range('D' + str(row)).Value
-                        if key != None:
-                            keyString = str(key)
-                            keyString = keyString.replace('"', '')
-                        value = ws.Range('E' + str(row)).Value
-                        if value != None:
-                            valueString = str(value)
-                            valueString = valueString.replace('"', '')
-                        row += 1
+                for key, value in self.__workbook.readRows('Settings', 'D', 'E', 2):
+                    keyString = str(key).replace('"', '')
+                    valueString = str(value).replace('"', '')
+                    self.replacementDictionary[keyString] = valueString
                 # Get commonPhrases
-                phrase = ws.Range('F2').Value
-                if phrase != None:
-                    phraseString = str(phrase)
-                row = 3
-                while phrase != None:
-                    phraseString = phraseString.replace('"', '')
+                for phrase, in self.__workbook.readRows('Settings', 'F', 'F', 2):
+                    phraseString = str(phrase).replace('"', '')
                     self.commonPhrases.append(phraseString)
-                    phrase = ws.Range('F' + str(row)).Value
-                    if phrase != None:
-                        phraseString = str(phrase)
-                    row += 1
-                # Get speech-to-text language code
-                selectedLanguage = ws.Range('B3').Value
-                self.speechToTextLanguageCode = self.__getLanguageCode(self.__wb, selectedLanguage)
-                # Get text-to-speech language code
-                selectedLanguage = ws.Range('B4').Value
-                self.textToSpeechLanguageCode = self.__getLanguageCode(self.__wb, selectedLanguage)
+                # Index the "Languages" sheet by language name
+                for language, languageCode in self.__workbook.readRows('Languages', 'A', 'B', 1):
+                    self.languages.setdefault(str(language), str(languageCode))     # The first row wins if a name is duplicated
+                # Get speech-to-text and text-to-speech language codes
+                self.speechToTextLanguageCode = self.getLanguageCode(settingsCells[0][0])
+                self.textToSpeechLanguageCode = self.getLanguageCode(settingsCells[1][0])
                 # Get text to speech voice
-                voiceAndGender = str(ws.Range('B5').Value)
+                voiceAndGender = str(settingsCells[2][0])
                 if '(' in voiceAndGender:
                     voiceAndGenderSplit = voiceAndGender.split('(')
                     voice = voiceAndGenderSplit[0].strip()
@@ -165,12 +292,49 @@ class GetSettings(object):
                     self.textToSpeechVoice = voiceAndGender
                     self.textToSpeechGender = 'neutral'
                 # Get SSML <say as>
-                self.SsmlSayAs = str(ws.Range('B6').Value)
-                # Get path to Google API key
-                self.pathToGoogleCredentials = str(ws.Range('H4').Value)
+                self.SsmlSayAs = str(settingsCells[3][0])
+                # Get speech recognition engine
+                if settingsCells[4][0] != None:
+                    self.speechRecognitionEngine = str(settingsCells[4][0]).strip()
+                # Get the general settings in cells H2:H8: the last row, the path to Google API key and to the local
+                # speech model, and the ID column, mark column and first row used by the macros of the workbook
+                generalCells = self.__workbook.readRange('Settings', 'H2:H8')
+                if generalCells[0][0] != None:
+                    self.lastRow = int(generalCells[0][0])
+                self.pathToGoogleCredentials = str(generalCells[2][0])
+                if generalCells[3][0] != None:
+                    self.pathToLocalSpeechModel = str(generalCells[3][0]).strip()
+                if generalCells[4][0] != None:
+                    self.idColumn = str(generalCells[4][0]).strip()
+                if generalCells[5][0] != None:
+                    self.markColumn = str(generalCells[5][0]).strip()
+                if generalCells[6][0] != None:
+                    self.firstRow = int(generalCells[6][0])
+                self.__settingsRead = True
         except:
             exType, exValue, exTraceback = sys.exc_info()
             self.__exceptionHook(exType, exValue, exTraceback)
         finally:
             if not settingsFound:
                 self.__callExcelMacro("pythonError", "settingsSheetNotFound")
+
+def cellText(value: Any) -> str:
+    """
+    Converts the value of a cell to the text that VBA makes of it. Whole numbers are read from Excel as floats, but
+    VBA converts them to text without a decimal point
+
+    Parameters
+    ----------
+    value : Any
+        Value of the cell. None for an empty cell
+
+    Returns
+    -------
+    str :
+        The text of the cell
+    """
+    if value == None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
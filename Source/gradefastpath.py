@@ -0,0 +1,157 @@
+#************************************************************************************************************************************************************************************
+# Copyright (c) 2021 Tony L. Jones
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”),
+# to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# The sound files were downloaded from https://www.fesliyanstudios.com
+#********************************************************************************************************************************************************************************
+
+
+import re
+import threading
+import time
+from typing import Optional
+
+# Settings
+gradePattern = r'-?\d+(?:[.,]\d+)?'    # Text that can be committed before the result is final
+minStability = 0.8                      # Minimum stability reported by Google for an interim result
+stableTime = 0.15                       # Seconds an interim result must stay unchanged before it is committed
+
+# Actions returned by GradeFastPath.final()
+SEND = 'send'               # Nothing was committed early. Send the final result
+SKIP = 'skip'               # The early commit was correct. Nothing has to be sent
+CORRECT = 'correct'         # The early commit was wrong. Send a correction
+
+class GradeFastPath(object):
+    """
+    Decides when an interim speech recognition result can be sent to Excel before the result is final, and how
+    to reconcile the early commit with the final result. Only short numeric grades are committed early: the
+    interim text must match gradePattern, be reported with at least minStability, and be unchanged for stableTime
+    seconds. Google often sends a single interim result before the final one, so a timer commits the candidate
+    through the commit callback once it has been unchanged long enough, without waiting for the next result.
+
+    Methods
+    _______
+        interim(text, stability)
+            Returns the text to commit early, if any
+        final(text)
+            Returns what to do with the final result
+    """
+
+    def __init__(self, pattern: str = gradePattern, stability: float = minStability, unchangedFor: float = stableTime,
+                 clock: callable = time.monotonic, commit: callable = None):
+        """
+        Parameters
+        ----------
+        pattern : str, optional
+            Regular expression that the whole interim text must match
+        stability : float, optional
+            Minimum stability of the interim result
+        unchangedFor : float, optional
+            Seconds the interim text must stay unchanged
+        clock : callable, optional
+            Returns the time in seconds
+        commit : callable, optional
+            Called with the text from a timer thread when a candidate becomes stable before the next result arrives
+        """
+        self.__pattern = re.compile(pattern)
+        self.__stability = stability
+        self.__unchangedFor = unchangedFor
+        self.__clock = clock
+        self.__commit = commit
+        self.__timer = None             # Commits the candidate when it has been unchanged for unchangedFor seconds
+        self.__lock = threading.Lock()
+        self.__candidate = None         # Interim text being watched
+        self.__candidateSince = 0.0     # Time at which the candidate was first seen
+        self.__committed = None         # Text committed early for the current utterance
+        self.earlyCommits: int = 0      # Number of results committed early
+        self.corrections: int = 0       # Number of early commits that had to be corrected
+
+    def interim(self, text: str, stability: float) -> Optional[str]:
+        """
+        Processes an interim result
+
+        Parameters
+        ----------
+        text : str
+            Interim text, after replacements
+        stability : float
+            Stability of the interim result reported by Google
+
+        Returns
+        -------
+        str :
+            The text to commit now, or None
+        """
+        text = text.strip()
+        with self.__lock:
+            now = self.__clock()
+            self.__cancelTimer()
+            if self.__committed != None:        # Only one early commit per utterance
+                return None
+            if text != self.__candidate:
+                self.__candidate = text
+                self.__candidateSince = now
+            if stability < self.__stability or self.__pattern.fullmatch(text) == None:
+                return None
+            remaining = self.__unchangedFor - (now - self.__candidateSince)
+            if remaining > 0:
+                if self.__commit != None:
+                    self.__timer = threading.Timer(remaining, self.__commitCandidate, args=(text,))
+                    self.__timer.daemon = True
+                    self.__timer.start()
+                return None
+            self.__committed = text
+            self.earlyCommits += 1
+            return text
+
+    def __commitCandidate(self, text: str):
+        """
+        Runs on the timer thread. Commits the text if it is still the candidate and nothing else has been committed
+        """
+        with self.__lock:
+            if self.__committed != None or self.__candidate != text:
+                return
+            self.__committed = text
+            self.earlyCommits += 1
+            self.__commit(text)     # Under the lock, so that final() sees the commit
+
+    def __cancelTimer(self):
+        """
+        Cancels the timer of the previous candidate. Must be called with __lock held
+        """
+        if self.__timer != None:
+            self.__timer.cancel()
+            self.__timer = None
+
+    def final(self, text: str) -> str:
+        """
+        Processes the final result and starts a new utterance
+
+        Parameters
+        ----------
+        text : str
+            Final text, after replacements
+
+        Returns
+        -------
+        str :
+            SEND, SKIP or CORRECT
+        """
+        with self.__lock:
+            self.__cancelTimer()
+            committed = self.__committed
+            self.__candidate = None
+            self.__committed = None
+        if committed == None:
+            return SEND
+        if committed == text.strip():
+            return SKIP
+        self.corrections += 1
+        return CORRECT
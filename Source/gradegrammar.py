@@ -0,0 +1,312 @@
+#************************************************************************************************************************************************************************************
+# Copyright (c) 2021 Tony L. Jones
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”),
+# to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# The sound files were downloaded from https://www.fesliyanstudios.com
+#********************************************************************************************************************************************************************************
+
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Settings
+digitPairAsDecimal = True       # "seven five" is read as 7.5, as grades are often dictated that way
+
+# Command codes sent to Excel with the value
+NO_COMMAND = 0
+NEXT = 1                        # Move to the next student
+BACK = 2                        # Move back to the previous student
+SKIP = 3                        # Leave the grade of this student empty
+
+# Word classes used by the state machine
+UNIT = 'unit'                   # 0 - 9
+TEEN = 'teen'                   # 10 - 19
+TENS = 'tens'                   # 20, 30, ... 90
+COMPOUND = 'compound'           # 21 - 99 written as one word, e.g. "vijfentwintig"
+HUNDRED = 'hundred'
+NUMERAL = 'numeral'             # Digits, e.g. "7" or "7.5"
+SEPARATOR = 'separator'         # Decimal separator, e.g. "point"
+AND = 'and'
+ARTICLE = 'article'             # "a" in "a half"
+FRACTION = 'fraction'           # "half", "quarter"
+COMMAND = 'command'
+
+# Words of each language, keyed by the first part of the language code. Languages that are not listed only
+# understand digits and the words added through the replacement dictionary
+vocabularies = {
+    'en': {
+        'units': ['zero', 'one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine'],
+        'teens': ['ten', 'eleven', 'twelve', 'thirteen', 'fourteen', 'fifteen', 'sixteen', 'seventeen', 'eighteen',
+                  'nineteen'],
+        'tens': ['twenty', 'thirty', 'forty', 'fifty', 'sixty', 'seventy', 'eighty', 'ninety'],
+        'compoundJoin': None,
+        'hundred': ['hundred'],
+        'separators': ['point', 'comma', 'dot'],
+        'and': ['and'],
+        'articles': ['a', 'an'],
+        'fractions': {'half': 0.5, 'halves': 0.5, 'quarter': 0.25, 'quarters': 0.25},
+        'commands': {'next': NEXT, 'back': BACK, 'previous': BACK, 'skip': SKIP},
+    },
+    'nl': {
+        'units': ['nul', 'een', 'twee', 'drie', 'vier', 'vijf', 'zes', 'zeven', 'acht', 'negen'],
+        'teens': ['tien', 'elf', 'twaalf', 'dertien', 'veertien', 'vijftien', 'zestien', 'zeventien', 'achttien',
+                  'negentien'],
+        'tens': ['twintig', 'dertig', 'veertig', 'vijftig', 'zestig', 'zeventig', 'tachtig', 'negentig'],
+        'compoundJoin': ('en', 'ën'),       # "vijfentwintig", "tweeëntwintig"
+        'hundred': ['honderd'],
+        'separators': ['komma', 'punt'],
+        'and': ['en'],
+        'articles': ['één'],
+        'fractions': {'half': 0.5, 'halve': 0.5, 'kwart': 0.25, 'driekwart': 0.75},
+        'commands': {'volgende': NEXT, 'terug': BACK, 'vorige': BACK, 'overslaan': SKIP},
+    },
+}
+
+vulgarFractions = {'½': 0.5, '¼': 0.25, '¾': 0.75}
+minusSigns = ('-', '\u2212')    # A grade may start with a hyphen-minus or a minus sign, e.g. "-2"
+
+class Grade(object):
+    """
+    A phrase normalized by GradeGrammar
+
+    Attributes
+    ----------
+    value : float
+        The grade, or None if the phrase is only a command
+    command : int
+        One of the command codes NO_COMMAND, NEXT, BACK or SKIP
+    """
+
+    def __init__(self, value: Optional[float], command: int):
+        self.value = value
+        self.command = command
+
+    def __eq__(self, other):
+        return isinstance(other, Grade) and self.value == other.value and self.command == other.command
+
+    def __repr__(self):
+        return 'Grade(' + repr(self.value) + ', ' + repr(self.command) + ')'
+
+    def toMessage(self) -> str:
+        """
+        Returns the grade as sent to Excel: the value with a decimal point, or an empty string if there is none,
+        and the command code, separated by '#'. For example "7.5#1"
+        """
+        value = '' if self.value == None else format(self.value, 'g')
+        return value + '#' + str(self.command)
+
+class GradeGrammar(object):
+    """
+    Turns a transcript of a dictated grade into a Grade: spoken numbers such as "seven and a half", "7 point 5" or
+    "seven five", and the commands "next", "back" and "skip". The vocabulary is built once from the language code
+    and the replacement dictionary, after which each phrase is tokenized with one regular expression and parsed
+    with a small state machine. Phrases that are not grades, like names or comments, are left to Excel.
+
+    Methods
+    _______
+        parse(text)
+            Returns the Grade of a phrase, or None if the phrase is not a grade
+    """
+
+    def __init__(self, languageCode: str, replacementDictionary: dict = None):
+        """
+        Parameters
+        ----------
+        languageCode : str
+            Speech-to-text language code, e.g. 'en-US'. Only the language part is used
+        replacementDictionary : dict, optional
+            Replacements from the "Settings" sheet. Single words that are replaced by a number or a command are
+            understood as well, so that a raw transcript can be parsed
+        """
+        vocabulary = vocabularies.get(str(languageCode).split('-')[0].lower(), {})
+        self.__lexicon: Dict[str, Tuple[str, object]] = {}      # Word -> (word class, value)
+        for value, word in enumerate(vocabulary.get('units', [])):
+            self.__lexicon[word] = (UNIT, value)
+        for value, word in enumerate(vocabulary.get('teens', [])):
+            self.__lexicon[word] = (TEEN, value + 10)
+        for value, word in enumerate(vocabulary.get('tens', [])):
+            self.__lexicon[word] = (TENS, (value + 2) * 10)
+        join = vocabulary.get('compoundJoin')
+        if join != None:
+            for unitValue, unit in enumerate(vocabulary['units'][1:], 1):
+                for tensValue, tens in enumerate(vocabulary['tens']):
+                    for joinWord in join:
+                        self.__lexicon[unit + joinWord + tens] = (COMPOUND, (tensValue + 2) * 10 + unitValue)
+        for category, key in ((HUNDRED, 'hundred'), (SEPARATOR, 'separators'), (AND, 'and'), (ARTICLE, 'articles')):
+            for word in vocabulary.get(key, []):
+                self.__lexicon[word] = (category, None)
+        for word, value in vocabulary.get('fractions', {}).items():
+            self.__lexicon[word] = (FRACTION, value)
+        for word, code in vocabulary.get('commands', {}).items():
+            self.__lexicon[word] = (COMMAND, code)
+        self.__tokenPattern = re.compile(r'\d+(?:[.,]\d+)?|[^\W\d_]+|[½¼¾]')
+        self.__aliases: Dict[str, List[Tuple[str, object]]] = {}
+        for key, value in (replacementDictionary or {}).items():
+            key = str(key).strip().lower()
+            if key != '' and ' ' not in key and key not in self.__lexicon:
+                tokens = self.__tokenize(str(value))
+                if tokens != None and tokens != []:
+                    self.__aliases[key] = tokens
+
+    def __tokenize(self, text: str) -> Optional[List[Tuple[str, object]]]:
+        """
+        Splits the text into classified tokens. Returns None if the text contains a word that is not part of the
+        vocabulary, or any character other than white space between the words
+        """
+        tokens = []
+        end = 0
+        for match in self.__tokenPattern.finditer(text.lower()):
+            if text[end:match.start()].strip() != '':       # Characters such as "-", "+" or "%" are not understood
+                return None
+            end = match.end()
+            word = match.group()
+            if word[0].isdigit():
+                if ',' in word and len(word.partition(',')[2]) == 3:      # "1,000" is a thousands separator, not a decimal comma
+                    return None
+                tokens.append((NUMERAL, float(word.replace(',', '.'))))
+            elif word in vulgarFractions:
+                tokens.append((FRACTION, vulgarFractions[word]))
+            elif word in self.__lexicon:
+                tokens.append(self.__lexicon[word])
+            elif word in self.__aliases:
+                tokens.extend(self.__aliases[word])
+            else:
+                return None
+        if text[end:].strip() != '':
+            return None
+        return tokens
+
+    def parse(self, text: str) -> Optional[Grade]:
+        """
+        Parses a phrase
+
+        Parameters
+        ----------
+        text : str
+            The transcript, after replacements
+
+        Returns
+        -------
+        Grade :
+            The grade, or None if the phrase is not a grade
+        """
+        text = text.strip()
+        negative = text[:1] in minusSigns and text[1:2].isdigit()
+        tokens = self.__tokenize(text[1:] if negative else text)
+        if not tokens:
+            return None
+        command = NO_COMMAND
+        if tokens[-1][0] == COMMAND:            # "seven and a half next"
+            command = tokens.pop()[1]
+        elif tokens[0][0] == COMMAND:           # "next seven"
+            command = tokens.pop(0)[1]
+        if any(category == COMMAND for category, value in tokens):
+            return None
+        if not tokens:
+            return Grade(None, command)
+        value = self.__parseValue(tokens)
+        if value == None:
+            return None
+        return Grade(-value if negative else value, command)
+
+    @staticmethod
+    def __parseValue(tokens: List[Tuple[str, object]]) -> Optional[float]:
+        """
+        Runs the state machine over the tokens of a number. Returns None if they do not form a number
+        """
+        state = 'start'
+        whole = 0.0             # Integer part, or the whole number when it was given in digits
+        small = None            # Number below one hundred being built
+        decimals = ''           # Digits after the decimal separator
+        count = None            # Numerator of a fraction, e.g. the 3 in "three quarters"
+        singleDigit = False     # The whole number is a single unit or digit, for "seven five"
+        for category, value in tokens:
+            if state in ('start', 'afterHundred'):
+                if category in (UNIT, TEEN, TENS, COMPOUND):
+                    small = value
+                    singleDigit = state == 'start' and category == UNIT
+                    state = 'tens' if category == TENS else 'small'
+                elif category == NUMERAL and state == 'start':
+                    whole = value
+                    singleDigit = value.is_integer() and value < 10
+                    state = 'numeral' if value.is_integer() else 'decimal'
+                elif category == HUNDRED and state == 'start':     # "honderd"
+                    whole = 100
+                    state = 'afterHundred'
+                elif category == ARTICLE and state == 'start':
+                    count = 1
+                    state = 'count'
+                elif category == FRACTION and state == 'start':
+                    return value
+                elif category == AND and state == 'afterHundred':
+                    pass
+                else:
+                    return None
+            elif state in ('small', 'tens', 'numeral'):
+                if category == UNIT and state == 'tens':        # "twenty five"
+                    small += value
+                    state = 'small'
+                elif category == HUNDRED and state != 'numeral' and whole == 0:
+                    whole = (small or 1) * 100
+                    small = None
+                    singleDigit = False
+                    state = 'afterHundred'
+                elif category == SEPARATOR:
+                    state = 'separator'
+                elif category == AND:
+                    state = 'and'
+                elif category == FRACTION and state == 'numeral':     # "7½"
+                    whole += value
+                    state = 'done'
+                elif category == FRACTION and state == 'small' and (value == 0.25 or small == 1):   # "three quarters"
+                    return float(small * value)
+                elif category in (UNIT, NUMERAL) and singleDigit and digitPairAsDecimal and value < 10 \
+                        and float(value).is_integer():          # "seven five"
+                    decimals = str(int(value))
+                    state = 'pair'
+                else:
+                    return None
+                if state in ('separator', 'and', 'afterHundred') and small != None:
+                    whole += small
+                    small = None
+            elif state in ('separator', 'decimals'):
+                if category in (UNIT, NUMERAL) and float(value).is_integer():
+                    decimals += str(int(value))
+                    state = 'decimals'
+                else:
+                    return None
+            elif state == 'and':
+                if category in (ARTICLE, UNIT) and (category == ARTICLE or value > 0):
+                    count = 1 if category == ARTICLE else value
+                    state = 'count'
+                elif category == NUMERAL and value.is_integer() and value > 0:
+                    count = value
+                    state = 'count'
+                elif category == FRACTION:                      # "seven and half"
+                    whole += value
+                    state = 'done'
+                else:
+                    return None
+            elif state == 'count':
+                if category == FRACTION:
+                    whole += count * value
+                    count = None
+                    state = 'done'
+                else:
+                    return None
+            else:       # 'decimal', 'pair' and 'done' end the number
+                return None
+        if state in ('separator', 'and', 'count'):
+            return None
+        if small != None:
+            whole += small
+        if decimals != '':
+            whole = float(str(int(whole)) + '.' + decimals)
+        return float(whole)
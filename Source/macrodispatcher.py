@@ -0,0 +1,224 @@
+#************************************************************************************************************************************************************************************
+# Copyright (c) 2021 Tony L. Jones
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”),
+# to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# The sound files were downloaded from https://www.fesliyanstudios.com
+#********************************************************************************************************************************************************************************
+
+
+
+import threading
+import time
+from typing import List
+from metrics import registry
+
+# Settings
+coalesceWindow = 0.02           # Seconds a call waits in the queue so that a burst of calls can be sent together
+errorRepeatWindow = 5.0         # Seconds during which an identical error is not reported to Excel again
+batchTextMacro = 'receiveTextBatch'     # Excel macro that receives a burst of phrases as one array
+textMacro = 'receiveText'       # Macro whose consecutive calls are sent to batchTextMacro
+cumulativeMacros = ['charactersBilled']         # Macros whose argument is added to the pending call instead of queued
+errorMacros = ['pythonError', 'pythonException']    # Macros whose identical calls are only sent once
+
+class MacroDispatcher(object):
+    """
+        Queue of Excel macro calls. Every macro call is a blocking COM round trip that keeps the Excel UI thread
+        busy, so calls that arrive within a short window are coalesced before they are sent: billing updates are
+        added up into a single cumulative call, a burst of phrases is sent to a batch macro as one array, and
+        identical errors are reported only once. The order of the remaining calls is kept. The dispatcher is
+        thread safe.
+
+        Methods
+        _______
+            call(macroName, argument1, argument2)
+                Queues a macro call
+            flush(runMacro)
+                Sends the calls that are due
+            pending()
+                Returns the number of queued calls
+            statistics()
+                Returns the dispatcher counters
+    """
+
+    def __init__(self, window: float = coalesceWindow, minimumInterval: float = 0.0, batchMacro: str = batchTextMacro,
+                 clock: callable = time.monotonic):
+        """
+        Parameters
+        ----------
+        window : float, optional
+            Seconds a call waits before it is sent, so that the calls that follow it can be coalesced
+        minimumInterval : float, optional
+            Minimum time in seconds between two macro calls
+        batchMacro : str, optional
+            Macro that receives a burst of phrases. Phrases are sent one by one if it is None or empty
+        clock : callable, optional
+            Returns the time in seconds
+        """
+        self.__window = window
+        self.__minimumInterval = minimumInterval
+        self.__batchMacro = batchMacro
+        self.__clock = clock
+        self.__lock = threading.Lock()          # Protects the queue
+        self.__sendLock = threading.Lock()      # Held while a macro is running, so that calls are sent in order
+        self.__queue: List[dict] = []           # Calls not yet run by Excel
+        self.__inFlight: List[dict] = []        # Calls being sent. They are no longer coalesced
+        self.__recentErrors = {}                # (macro name, arguments) -> time at which the error was last sent
+        self.__previousRunTime = None           # Time at which the previous macro was run
+        self.calls: int = 0                     # Number of calls queued
+        self.macrosRun: int = 0                 # Number of macros run by Excel
+        self.coalesced: int = 0                 # Number of calls merged into another call
+        self.duplicatesDropped: int = 0         # Number of identical errors not sent again
+
+    def call(self, macroName: str, argument1: object = None, argument2: object = None):
+        """
+        Queues a macro call
+
+        Parameters
+        ----------
+        macroName : str
+            Name of the Excel macro to call
+        argument1 : object, optional
+            First argument
+        argument2 : object, optional
+            Second argument
+        """
+        with self.__lock:
+            now = self.__clock()
+            self.calls += 1
+            if macroName in errorMacros:
+                key = (macroName, argument1, argument2)
+                sentAt = self.__recentErrors.get(key)
+                if (sentAt != None and now - sentAt < errorRepeatWindow) or \
+                        any(self.__key(item) == key for item in self.__queue):
+                    self.duplicatesDropped += 1
+                    return
+            if macroName in cumulativeMacros:
+                for item in self.__queue:
+                    if item["macroName"] == macroName and not any(item is sent for sent in self.__inFlight):
+                        item["argument1"] = str(self.__toNumber(item["argument1"]) + self.__toNumber(argument1))
+                        self.coalesced += 1
+                        return
+            self.__queue.append({
+                "macroName": str(macroName),
+                "argument1": argument1,
+                "argument2": argument2,
+                "timeStamp": now
+            })
+            registry.gauge('excel.pendingMacros', len(self.__queue))
+
+    def flush(self, runMacro: callable, isMacroMissing: callable = None):
+        """
+        Sends the calls that are due. Returns when the queue is empty, when the next call must wait, or when Excel
+        did not run a macro, in which case it is retried on the next flush. Exceptions raised by runMacro are
+        passed on, except for a batch macro that is missing from the workbook, after which the phrases are sent
+        one by one.
+
+        Parameters
+        ----------
+        runMacro : callable
+            runMacro(macroName, argument1, argument2) runs the macro and returns True if Excel ran it. Arguments
+            that are None are not passed. The first argument of the batch macro is a tuple
+        isMacroMissing : callable, optional
+            isMacroMissing(exception) returns True if the exception raised by runMacro means that the macro does
+            not exist. Without it, batching is never turned off
+        """
+        if not self.__sendLock.acquire(blocking=False):     # Another thread is sending
+            return
+        try:
+            while True:
+                with self.__lock:
+                    now = self.__clock()
+                    if self.__queue == [] or now - self.__queue[0]["timeStamp"] < self.__window:
+                        return
+                    if self.__previousRunTime != None and now - self.__previousRunTime < self.__minimumInterval:
+                        return
+                    self.__inFlight = self.__nextCall()
+                items = self.__inFlight
+                isBatch = len(items) > 1
+                if isBatch:
+                    macroName = self.__batchMacro
+                    argument1 = tuple(str(item["argument1"]) for item in items)
+                    argument2 = str(sum(self.__toNumber(item["argument2"]) for item in items))
+                else:
+                    macroName, argument1, argument2 = items[0]["macroName"], items[0]["argument1"], items[0]["argument2"]
+                self.__previousRunTime = self.__clock()
+                try:
+                    success = runMacro(macroName, argument1, argument2)
+                    registry.observe('excel.macroRun', self.__clock() - self.__previousRunTime)
+                except BaseException as exception:
+                    if not isBatch or isMacroMissing == None or not isMacroMissing(exception):
+                        raise       # E.g. Excel is busy. The call stays queued
+                    self.__batchMacro = None        # The workbook has no batch macro. Send the phrases one by one
+                    continue
+                finally:
+                    with self.__lock:
+                        self.__inFlight = []
+                if not success:
+                    return
+                with self.__lock:
+                    now = self.__clock()
+                    for item in items:
+                        registry.observe('excel.macroQueueWait', now - item["timeStamp"])
+                    self.macrosRun += 1
+                    self.coalesced += len(items) - 1
+                    self.__queue = [item for item in self.__queue if not any(item is sent for sent in items)]
+                    for item in items:
+                        if item["macroName"] in errorMacros:
+                            self.__recentErrors[self.__key(item)] = self.__clock()
+        finally:
+            self.__sendLock.release()
+
+    def __nextCall(self) -> List[dict]:
+        """
+        Returns the calls to send next: the first queued call, or the burst of phrases at the front of the queue
+        """
+        items = [self.__queue[0]]
+        if self.__batchMacro and items[0]["macroName"] == textMacro:
+            for item in self.__queue[1:]:
+                if item["macroName"] != textMacro:
+                    break
+                items.append(item)
+        return items
+
+    @staticmethod
+    def __key(item: dict) -> tuple:
+        return (item["macroName"], item["argument1"], item["argument2"])
+
+    @staticmethod
+    def __toNumber(value: object) -> int:
+        try:
+            return int(float(value))
+        except (TypeError, ValueError):
+            return 0
+
+    def pending(self) -> int:
+        """
+        Returns the number of queued calls
+        """
+        with self.__lock:
+            return len(self.__queue)
+
+    def statistics(self) -> dict:
+        """
+        Returns the dispatcher counters
+
+        Returns
+        -------
+        dict :
+            calls, macrosRun, coalesced, duplicatesDropped and pending
+        """
+        with self.__lock:
+            return {
+                'calls': self.calls,
+                'macrosRun': self.macrosRun,
+                'coalesced': self.coalesced,
+                'duplicatesDropped': self.duplicatesDropped,
+                'pending': len(self.__queue),
+            }
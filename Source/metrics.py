@@ -0,0 +1,211 @@
+#************************************************************************************************************************************************************************************
+# Copyright (c) 2021 Tony L. Jones
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”),
+# to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# The sound files were downloaded from https://www.fesliyanstudios.com
+#********************************************************************************************************************************************************************************
+
+
+import json
+import math
+import threading
+import time
+from typing import Dict
+
+# Settings
+enabled = True                  # Record metrics. Recording costs about a microsecond per observation
+histogramMinimum = 1e-6         # Smallest value, in seconds, that the histograms distinguish
+histogramMaximum = 600.0        # Largest value, in seconds. Larger values are counted in the last bucket
+histogramGrowth = 1.05          # Each bucket is this much wider than the previous one. Percentiles are within 5 %
+
+class Histogram(object):
+    """
+    Streaming histogram with logarithmic buckets. Memory and recording time do not depend on the number of values,
+    so it can stay on in production. Not thread safe; Metrics serializes access.
+
+    Methods
+    _______
+        record(value)
+            Adds a value
+        percentile(fraction)
+            Returns the value below which the fraction of the values lies
+        snapshot()
+            Returns the count, mean, maximum and the 50th, 95th and 99th percentiles
+    """
+
+    __logGrowth = math.log(histogramGrowth)
+    __bucketCount = int(math.log(histogramMaximum / histogramMinimum) / math.log(histogramGrowth)) + 2
+
+    def __init__(self):
+        self.__buckets = [0] * self.__bucketCount
+        self.count: int = 0
+        self.total: float = 0.0
+        self.maximum: float = 0.0
+
+    def record(self, value: float):
+        if value <= histogramMinimum:
+            index = 0
+        else:
+            index = min(self.__bucketCount - 1, int(math.log(value / histogramMinimum) / self.__logGrowth) + 1)
+        self.__buckets[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.maximum:
+            self.maximum = value
+
+    def percentile(self, fraction: float) -> float:
+        """
+        Returns the upper edge of the bucket that holds the value below which the fraction of the values lies, or
+        the maximum if that is smaller
+        """
+        if self.count == 0:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for index, bucketCount in enumerate(self.__buckets):
+            seen += bucketCount
+            if seen >= rank and bucketCount > 0:
+                return min(self.maximum, histogramMinimum * histogramGrowth ** index)
+        return self.maximum
+
+    def snapshot(self) -> dict:
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'max': self.maximum,
+            'p50': self.percentile(0.50),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99),
+        }
+
+class Metrics(object):
+    """
+        Named histograms, counters and gauges recorded along the speech pipeline. Stage durations are measured with
+        time.monotonic() and recorded in seconds. The registry is thread safe.
+
+        Methods
+        _______
+            observe(name, value)
+                Adds a value to a histogram
+            increment(name, amount)
+                Adds to a counter
+            gauge(name, value)
+                Sets a gauge, e.g. a queue depth, and keeps its maximum
+            snapshot()
+                Returns all the metrics
+            reset()
+                Clears all the metrics
+            startDump(path, interval)
+                Appends a snapshot to a JSON lines file periodically
+            stopDump()
+                Stops the periodic dump
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__histograms: Dict[str, Histogram] = {}
+        self.__counters: Dict[str, float] = {}
+        self.__gauges: Dict[str, list] = {}      # Name -> [value, maximum]
+        self.__dumpThread = None
+        self.__stopDump = threading.Event()
+
+    def observe(self, name: str, value: float):
+        if not enabled:
+            return
+        with self.__lock:
+            histogram = self.__histograms.get(name)
+            if histogram == None:
+                histogram = self.__histograms[name] = Histogram()
+            histogram.record(value)
+
+    def increment(self, name: str, amount: float = 1):
+        if not enabled:
+            return
+        with self.__lock:
+            self.__counters[name] = self.__counters.get(name, 0) + amount
+
+    def gauge(self, name: str, value: float):
+        if not enabled:
+            return
+        with self.__lock:
+            entry = self.__gauges.get(name)
+            if entry == None:
+                self.__gauges[name] = [value, value]
+            else:
+                entry[0] = value
+                if value > entry[1]:
+                    entry[1] = value
+
+    def snapshot(self) -> dict:
+        """
+        Returns all the metrics
+
+        Returns
+        -------
+        dict :
+            time (seconds since the epoch), histograms (count, mean, max, p50, p95 and p99 per name), counters
+            and gauges (value and max per name)
+        """
+        with self.__lock:
+            return {
+                'time': time.time(),
+                'histograms': {name: histogram.snapshot() for name, histogram in self.__histograms.items()},
+                'counters': dict(self.__counters),
+                'gauges': {name: {'value': entry[0], 'max': entry[1]} for name, entry in self.__gauges.items()},
+            }
+
+    def reset(self):
+        with self.__lock:
+            self.__histograms.clear()
+            self.__counters.clear()
+            self.__gauges.clear()
+
+    def startDump(self, path: str, interval: float):
+        """
+        Appends a snapshot to a JSON lines file every interval seconds, until stopDump() is called
+
+        Parameters
+        ----------
+        path : str
+            Path of the file
+        interval : float
+            Seconds between two snapshots
+        """
+        if self.__dumpThread != None:
+            return
+        self.__stopDump.clear()
+        self.__dumpThread = threading.Thread(target=self.__dump, args=(path, interval), daemon=True)
+        self.__dumpThread.start()
+
+    def __dump(self, path: str, interval: float):
+        while not self.__stopDump.wait(interval):
+            try:
+                with open(path, 'a', encoding='utf-8') as dumpFile:
+                    dumpFile.write(json.dumps(self.snapshot(), separators=(',', ':')) + '\n')
+            except OSError:
+                pass    # The metrics must never stop the app
+
+    def stopDump(self):
+        """
+        Stops the periodic dump
+        """
+        self.__stopDump.set()
+        if self.__dumpThread != None:
+            self.__dumpThread.join(1.0)
+            self.__dumpThread = None
+
+# Registry shared by all the modules
+registry = Metrics()
+
+def metrics() -> dict:
+    """
+    Returns a snapshot of the metrics recorded by all the modules, see Metrics.snapshot
+    """
+    return registry.snapshot()
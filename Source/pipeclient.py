@@ -1,41 +1,67 @@
 import threading
-import time
 import sys
-import pywintypes
-import win32file
+from six.moves import queue
+from transport import Transport, StreamTransport, createTransport
+
+# Settings
+readerStopTimeout = 1.0         # Seconds to wait for the reader thread to stop
 
 class PipeClient(object):
-    """ Connects as a client to a pipe to receive messages from Excel
+    """ Connects as a client to a pipe to receive messages from Excel. A single reader thread reads the pipe for
+        as long as it is open and reassembles the messages, which are delivered by readFromExcel, by a callback on
+        the reader thread, or through an asyncio queue. The pipe is a Windows named pipe, or, e.g. on Linux, any
+        other Transport.
 
         Methods
         _______
             openPipe
                 Connects to the pipe a get a pipe handle
+            openStream(stream)
+                Reads the messages from a socket or a file descriptor that is already open
             readFromExcel
-                Must be run periodically to receive messages from Excel
+                Must be run periodically to receive messages from Excel, unless they are delivered on the reader thread
+            asyncioQueue(loop)
+                Returns an asyncio queue that receives the messages
+            connectStatistics
+                Returns how long connecting to the pipe took
+            close
+                Stops the reader and closes the pipe
 
     """
 
-    def __init__(self, pipeName: str, processIncomingMessages: callable, timeOut: int, exceptionHook: callable):
+    def __init__(self, pipeName: str, processIncomingMessages: callable, timeOut: int, exceptionHook: callable,
+                 deliverOnReaderThread: bool = False, transport: Transport = None, linkClosed: callable = None):
         """
         Parameters
         ----------
         pipeName : str
-            Name of the pipe that was opened by Excel
+            Name of the pipe that was opened by Excel, or the path of a Unix domain socket or FIFO
         processIncomingMessages : callable
             Handle to method that must be called to process the incoming messages
         timeOut : int
             The number of seconds to retry opening the pipe if open fails
         exceptionHook : callable
             Handle to the method that handles exceptions
+        deliverOnReaderThread : bool, optional
+            Call processIncomingMessages from the reader thread as soon as a message is complete, instead of from
+            readFromExcel
+        transport : Transport, optional
+            Link to read instead of the one created for pipeName
+        linkClosed : callable, optional
+            Called from the reader thread when Excel closes the pipe, unless close() was called
         """
         self.__pipeName = pipeName
         self.__processIncomingMessages = processIncomingMessages
         self.__timeOut = timeOut
         self.__exceptionHook = exceptionHook
-        self.__pipeHandle = None        # Handle to pipe
-        self.__incomingText = None      # Text that was received through pipe
+        self.__deliverOnReaderThread = deliverOnReaderThread
+        self.__transport = transport    # Link over which the messages are received
+        self.__linkClosed = linkClosed
+        self.__transportOpen = False    # Set to true when the link was opened
         self.__readThread = None        # Thread in which the pipe read process runs
+        self.__messages = queue.Queue()     # Complete messages waiting for readFromExcel
+        self.__asyncioQueues = []       # (event loop, asyncio queue) pairs that receive the messages
+        self.__closing = threading.Event()
 
     def openPipe(self):
         """
@@ -47,74 +73,149 @@ class PipeClient(object):
         If the connecting to the pipe timed out
         """
         success = False
-        stopTime = time.time()+self.__timeOut
         try:
-            while time.time() < stopTime and not success:
-                try:
-                        # See http://timgolden.me.uk/pywin32-docs/win32file__CreateFile_meth.html
-                        self.__pipeHandle = win32file.CreateFile(
-                            self.__pipeName,
-                            win32file.GENERIC_READ,
-                            0,
-                            None,
-                            win32file.OPEN_EXISTING,
-                            0,
-                            None
-                        )
-                        success = True
-                except pywintypes.error as ex:
-                    if ex.args == (2, 'CreateFile', 'The system cannot find the file specified.'):
-                        time.sleep(0.1)     # Wait 0.1s before trying another time
+            if self.__transport == None:
+                self.__transport = createTransport(self.__pipeName, self.__timeOut)
+            self.__transport.open()
+            success = True
+        except RuntimeError:
+            pass        # Timed out
         except:
             exType, exValue, exTraceback = sys.exc_info()
             self.__exceptionHook(exType, exValue, exTraceback)
         finally:
             if not success:
-                self.__pipeHandle = None
                 raise RuntimeError('Timeout error opening pipe')
+        self.__transportOpen = True
+
+    def openStream(self, stream: object):
+        """
+        Reads the messages from a socket or a file descriptor instead of the pipe, e.g. to test on Linux
+
+        Parameters
+        ----------
+        stream : object
+            A connected socket, or a file descriptor opened for reading
+        """
+        self.__transport = StreamTransport(stream)
+        self.__transportOpen = True
+
+    def __startReader(self):
+        """
+        Starts the reader thread, once
+        """
+        if self.__readThread == None and self.__transportOpen:
+            self.__readThread = threading.Thread(target=self.__readFromPipe, daemon=True)
+            self.__readThread.start()
 
     def __readFromPipe(self):
         """
-        Reads text from incoming pipe and puts it in self.__incomingText. This method runs
-        in its own thread.
+        Reads from the pipe until it is closed, and delivers the complete messages. Reports the end of the link if
+        Excel closed the pipe. This method runs in its own thread.
         """
-        if self.__pipeHandle != None:
-            result, str = win32file.ReadFile(self.__pipeHandle, 10240, None)  # Read 10 KB
-            if result == 0:     # No error
-                self.__incomingText = str.decode("utf-16")  # Convert to UTF-16 format
-            else:   # Error
-                self.__incomingText = None
+        try:
+            for message in self.__transport.readMessages():     # Ends when the pipe is closed
+                if self.__closing.is_set():
+                    return
+                self.__deliver(message)
+            if not self.__closing.is_set() and self.__linkClosed != None:
+                self.__linkClosed()
+        except:
+            if not self.__closing.is_set():
+                exType, exValue, exTraceback = sys.exc_info()
+                self.__exceptionHook(exType, exValue, exTraceback)
+
+    def __deliver(self, message: str):
+        """
+        Delivers a complete message to the asyncio queues if there are any, otherwise to the callback or to
+        readFromExcel
+        """
+        if self.__asyncioQueues != []:
+            for loop, asyncioQueue in self.__asyncioQueues:
+                loop.call_soon_threadsafe(asyncioQueue.put_nowait, message)
+        elif self.__deliverOnReaderThread:
+            self.__processIncomingMessages(message)
         else:
-            self.__incomingText = None
+            self.__messages.put(message)
 
-    def readFromExcel(self):
+    def readFromExcel(self, timeout: float = 0.0):
         """
-        Runs the thread that reads data from the pipe. Must be called regularly.
+        Processes the messages received from Excel. Must be called regularly, unless the messages are delivered on
+        the reader thread.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Seconds to wait for a message if there is none
         """
         try:
-            if self.__readThread == None:   # Thread has not yet been created
-                self.__readThread = threading.Thread(target=self.__readFromPipe, daemon=True)
-                self.__readThread.start()
-            else:
-                if not self.__readThread.is_alive():    # Check if the thread is alive
-                    messages = self.__incomingText
-                    if messages != None:
-                        messages = messages.split('\r\n')   # Messages are separated by '\r\n'
-                        for message in messages:
-                            message = message.replace('\r\n', '')       # Remove '\r\n'
-                            self.__processIncomingMessages(message)     # Process incoming text
-                    self.__readThread = threading.Thread(target=self.__readFromPipe, daemon=True)    # Restart thread
-                    self.__readThread.start()
+            self.__startReader()
+            try:
+                message = self.__messages.get(block=timeout > 0, timeout=timeout if timeout > 0 else None)
+            except queue.Empty:
+                return
+            while True:
+                self.__processIncomingMessages(message)     # Process incoming text
+                try:
+                    message = self.__messages.get_nowait()
+                except queue.Empty:
+                    return
         except:
             exType, exValue, exTraceback = sys.exc_info()
             self.__exceptionHook(exType, exValue, exTraceback)
 
+    def asyncioQueue(self, loop: object = None) -> object:
+        """
+        Returns an asyncio queue that receives every message, instead of readFromExcel and the callback. The
+        reader is started if it is not running
+
+        Parameters
+        ----------
+        loop : asyncio event loop, optional
+            Loop that owns the queue. The running loop is used if it is None
+
+        Returns
+        -------
+        asyncio.Queue :
+            Queue that receives the messages
+        """
+        import asyncio
+        if loop == None:
+            loop = asyncio.get_running_loop()
+        asyncioQueue = asyncio.Queue()
+        self.__asyncioQueues.append((loop, asyncioQueue))
+        self.__startReader()
+        return asyncioQueue
+
+    def connectStatistics(self) -> dict:
+        """
+        Returns how long connecting to the pipe took
+
+        Returns
+        -------
+        dict :
+            attempts, latency (seconds until connected), waitTime and retryableErrors. Empty if the pipe was not
+            opened with openPipe
+        """
+        if self.__transport == None:
+            return {}
+        return self.__transport.connectStatistics()
+
+    def close(self):
+        """
+        Stops the reader thread and closes the pipe
+        """
+        self.__closing.set()
+        if self.__transport != None:
+            self.__transport.close()
+        if self.__readThread != None:
+            self.__readThread.join(readerStopTimeout)
+
     def __del__(self):
         """
         Closes the pipe handle
         """
         try:
-            self.__pipeHandle.close()
+            self.__transport.close()
         except:
             pass
-
@@ -0,0 +1,325 @@
+#************************************************************************************************************************************************************************************
+# Copyright (c) 2021 Tony L. Jones
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”),
+# to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# The sound files were downloaded from https://www.fesliyanstudios.com
+#********************************************************************************************************************************************************************************
+
+
+import json
+import os
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Iterable, Iterator, List
+import audioencoder
+from metrics import registry
+
+# Settings
+googleModel = 'command_and_search'     # Google speech-to-text model
+localPartialStability = 0.0            # Stability reported for partial results of the local recognizer
+
+class RecognitionResult(object):
+    """
+    A transcript produced by a recognizer
+
+    Attributes
+    ----------
+    transcript : str
+        The recognized text
+    isFinal : bool
+        False for interim results, which may still change
+    stability : float
+        Estimate between 0 and 1 of how likely an interim result is to stay unchanged
+    endTime : float
+        End of the recognized audio in seconds since the start of the stream
+    secondsBilled : int
+        Seconds billed for the stream so far. Only reported by some recognizers
+    """
+
+    def __init__(self, transcript: str, isFinal: bool = True, stability: float = 0.0, endTime: float = 0.0,
+                 secondsBilled: int = 0):
+        self.transcript = transcript
+        self.isFinal = isFinal
+        self.stability = stability
+        self.endTime = endTime
+        self.secondsBilled = secondsBilled
+
+class Recognizer(ABC):
+    """
+    A streaming speech recognizer used by SpeechToText
+
+    Methods
+    _______
+        streamingRecognize(audioChunks)
+            Recognizes a stream of audio chunks
+        cancel()
+            Ends the stream in progress without waiting for its remaining results
+    """
+
+    @abstractmethod
+    def streamingRecognize(self, audioChunks: Iterable[bytes]) -> Iterator[RecognitionResult]:
+        """
+        Recognizes a stream of 16-bit mono audio chunks. Returns when the chunks run out or when cancel() is called
+
+        Parameters
+        ----------
+        audioChunks : iterable
+            Chunks of 16-bit mono audio
+
+        Yields
+        -------
+        RecognitionResult
+            The results, in order
+        """
+
+    @abstractmethod
+    def cancel(self):
+        """
+        Ends the stream in progress without waiting for its remaining results
+        """
+
+class GoogleRecognizer(Recognizer):
+    """
+        Streams the audio to the Google Cloud speech-to-text API
+    """
+
+    def __init__(self, languageCode: str, commonPhrases: list, sampleRate: int, interimResults: bool = False,
+                 googleAPIClient: object = None, audioEncoding: str = 'LINEAR16'):
+        """
+        Parameters
+        ----------
+        languageCode : str
+            Recognition language code
+        commonPhrases : list
+            Phrases sent to Google as speech context
+        sampleRate : int
+            Audio sample rate
+        interimResults : bool, optional
+            Ask for interim results
+        googleAPIClient : object, optional
+            Speech client to use instead of a new speech.SpeechClient, e.g. one connected to a local test server
+        audioEncoding : str, optional
+            Encoding of the uploaded audio: 'LINEAR16', 'FLAC' or 'OGG_OPUS'. LINEAR16 is used if the library of
+            the encoder is not installed
+        """
+        # The client library takes long to import, so it is imported when the recognizer is created
+        from google.cloud import speech
+        import google.api_core.exceptions
+        self.__speech = speech
+        self.__apiExceptions = google.api_core.exceptions
+        self.__googleAPIClient = googleAPIClient if googleAPIClient != None else speech.SpeechClient()
+        self.__activeCall = None        # The streaming call in progress
+        self.__sampleRate = sampleRate
+        try:
+            self.__audioEncoding = audioencoder.createEncoder(audioEncoding, sampleRate).encoding
+        except ImportError:
+            self.__audioEncoding = audioencoder.PcmEncoder.encoding
+        # List of common phrases from the settings module
+        speechContext = speech.SpeechContext(phrases=commonPhrases)
+        # Set up the speech-to-text configuration.
+        # Details can be found at https://cloud.google.com/speech-to-text/docs/basics
+        config = speech.RecognitionConfig(
+            encoding=speech.RecognitionConfig.AudioEncoding[self.__audioEncoding],
+            sample_rate_hertz=sampleRate,
+            language_code=languageCode,
+            audio_channel_count=1,
+            model=googleModel,
+            speech_contexts=[speechContext],
+        )
+        # Create the Google API configuration
+        self.__streamingConfig = speech.StreamingRecognitionConfig(config=config, interim_results=interimResults)
+
+    def __requests(self, audioChunks: Iterable[bytes]) -> Iterator[object]:
+        """
+        Encodes the audio of a stream. Every stream starts with a new encoder, because the encoded stream begins with
+        a header
+        """
+        encoder = audioencoder.createEncoder(self.__audioEncoding, self.__sampleRate)
+        for chunk in audioChunks:
+            startTime = time.monotonic()
+            content = encoder.encode(chunk)
+            registry.observe('speech.encode', time.monotonic() - startTime)
+            if content:
+                registry.increment('speech.bytesUploaded', len(content))
+                yield self.__speech.StreamingRecognizeRequest(audio_content=content)
+        content = encoder.flush()
+        if content:
+            registry.increment('speech.bytesUploaded', len(content))
+            yield self.__speech.StreamingRecognizeRequest(audio_content=content)
+
+    def streamingRecognize(self, audioChunks: Iterable[bytes]) -> Iterator[RecognitionResult]:
+        requests = self.__requests(audioChunks)
+        try:
+            responses = self.__googleAPIClient.streaming_recognize(self.__streamingConfig, requests)
+            self.__activeCall = responses
+            if responses != None:
+                for response in responses:
+                    # Check that the response contains results
+                    if response != None and hasattr(response, 'results') and response.results != []:
+                        result = response.results[0]
+                        yield RecognitionResult(result.alternatives[0].transcript, result.is_final, result.stability,
+                                                result.result_end_time.total_seconds(),
+                                                int(response.total_billed_time.total_seconds()))
+        except self.__apiExceptions.OutOfRange:
+            pass   # This exception can be ignored and sometimes occurs sporadically as the audio engine is paused or closed
+        except self.__apiExceptions.Cancelled:
+            pass   # The stream was ended by cancel()
+        finally:
+            self.__activeCall = None
+
+    def cancel(self):
+        call = self.__activeCall
+        if call != None and hasattr(call, 'cancel'):
+            call.cancel()
+
+class VoskRecognizer(Recognizer):
+    """
+        Recognizes speech locally with Vosk (https://alphacephei.com/vosk). No network connection is needed. The
+        recognizer is constrained to a grammar built from the common phrases, which makes it fast and accurate
+        for the short grades and names that are dictated. The language is the one of the model: a Vosk model does
+        not record its language, so it is only checked against the name of the model directory, e.g.
+        "vosk-model-small-en-us-0.15".
+    """
+
+    def __init__(self, modelPath: str, commonPhrases: list, sampleRate: int, languageCode: str = ''):
+        """
+        Parameters
+        ----------
+        modelPath : str
+            Directory of the Vosk model for the recognition language
+        commonPhrases : list
+            Phrases the recognizer is constrained to. The recognizer is unconstrained if the list is empty
+        sampleRate : int
+            Audio sample rate
+        languageCode : str, optional
+            Recognition language code, e.g. 'en-US'. Not checked if it is empty
+
+        Raises
+        ------
+        ValueError
+            If the name of the model directory shows that the model is for another language
+        """
+        self.checkModelLanguage(modelPath, languageCode)
+        import vosk     # Optional dependency: pip install vosk
+        vosk.SetLogLevel(-1)
+        self.__vosk = vosk
+        self.__model = vosk.Model(modelPath)       # Loading the model takes a while, so it is done once
+        self.__sampleRate = sampleRate
+        self.__grammar = self.makeGrammar(commonPhrases)
+        self.__cancelled = threading.Event()
+
+    @staticmethod
+    def checkModelLanguage(modelPath: str, languageCode: str):
+        """
+        Raises ValueError if the name of the model directory, e.g. "vosk-model-nl-spraakherkenning-0.6", names
+        another language than languageCode. Models with other names are accepted
+        """
+        match = re.match(r'vosk-model-(?:small-)?([a-z]{2,3})\b', os.path.basename(os.path.normpath(modelPath)).lower())
+        if not languageCode or match == None:
+            return
+        modelLanguage = {'cn': 'zh', 'ua': 'uk'}.get(match.group(1), match.group(1))     # Names that are not ISO 639
+        if modelLanguage != str(languageCode).split('-')[0].lower():
+            raise ValueError('The local speech model "' + str(modelPath) + '" is not for the language "' +
+                             str(languageCode) + '"')
+
+    @staticmethod
+    def makeGrammar(commonPhrases: list) -> List[str]:
+        """
+        Builds the grammar from the common phrases. The phrases and their words are allowed, and anything else is
+        recognized as '[unk]'
+
+        Returns
+        -------
+        list :
+            The grammar, or an empty list if the recognizer must be unconstrained
+        """
+        grammar = []
+        for phrase in commonPhrases:
+            phrase = str(phrase).strip().lower()
+            for item in [phrase] + phrase.split():
+                if item != '' and item not in grammar:
+                    grammar.append(item)
+        if grammar:
+            grammar.append('[unk]')
+        return grammar
+
+    def streamingRecognize(self, audioChunks: Iterable[bytes]) -> Iterator[RecognitionResult]:
+        self.__cancelled.clear()
+        if self.__grammar:
+            recognizer = self.__vosk.KaldiRecognizer(self.__model, self.__sampleRate, json.dumps(self.__grammar))
+        else:
+            recognizer = self.__vosk.KaldiRecognizer(self.__model, self.__sampleRate)
+        bytesReceived = 0
+        previousPartial = ''
+        for chunk in audioChunks:
+            if self.__cancelled.is_set():
+                return
+            bytesReceived += len(chunk)
+            endTime = bytesReceived / (self.__sampleRate * 2)
+            if recognizer.AcceptWaveform(chunk):
+                previousPartial = ''
+                text = json.loads(recognizer.Result()).get('text', '').replace('[unk]', '').strip()
+                if text != '':
+                    yield RecognitionResult(text, True, 1.0, endTime)
+            else:
+                partial = json.loads(recognizer.PartialResult()).get('partial', '').replace('[unk]', '').strip()
+                if partial != '' and partial != previousPartial:
+                    previousPartial = partial
+                    yield RecognitionResult(partial, False, localPartialStability, endTime)
+        if not self.__cancelled.is_set():
+            text = json.loads(recognizer.FinalResult()).get('text', '').replace('[unk]', '').strip()
+            if text != '':
+                yield RecognitionResult(text, True, 1.0, bytesReceived / (self.__sampleRate * 2))
+
+    def cancel(self):
+        self.__cancelled.set()
+
+def createRecognizer(engine: str, languageCode: str, commonPhrases: list, sampleRate: int, interimResults: bool = False,
+                     localModelPath: str = '', googleAPIClient: object = None, audioEncoding: str = 'LINEAR16') -> Recognizer:
+    """
+    Creates the recognizer selected on the "Settings" sheet
+
+    Parameters
+    ----------
+    engine : str
+        'Google' or 'Local'. Google is used if it is empty
+    languageCode : str
+        Recognition language code
+    commonPhrases : list
+        Common phrases from the "Settings" sheet
+    sampleRate : int
+        Audio sample rate
+    interimResults : bool, optional
+        Produce interim results
+    localModelPath : str, optional
+        Directory of the local model
+    googleAPIClient : object, optional
+        Speech client of the Google recognizer, e.g. one from a ChannelPool
+    audioEncoding : str, optional
+        Encoding of the audio uploaded by the Google recognizer: 'LINEAR16', 'FLAC' or 'OGG_OPUS'
+
+    Returns
+    -------
+    Recognizer :
+        The recognizer
+
+    Raises
+    ------
+    ValueError
+        If the engine is unknown, or if the local model is for another language
+    """
+    engine = str(engine or 'Google').strip().lower()
+    if engine == 'google':
+        return GoogleRecognizer(languageCode, commonPhrases, sampleRate, interimResults, googleAPIClient, audioEncoding)
+    if engine in ('local', 'vosk'):
+        return VoskRecognizer(localModelPath, commonPhrases, sampleRate, languageCode)
+    raise ValueError('Unable to find setting: unknown speech recognition engine "' + str(engine) + '"')
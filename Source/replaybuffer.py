@@ -0,0 +1,114 @@
+#************************************************************************************************************************************************************************************
+# Copyright (c) 2021 Tony L. Jones
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”),
+# to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# The sound files were downloaded from https://www.fesliyanstudios.com
+#********************************************************************************************************************************************************************************
+
+
+import threading
+from collections import deque
+
+class ReplayBuffer(object):
+    """
+    Keeps the audio sent on the current streaming request that has not yet been covered by a final result. When
+    the stream is rotated or dropped, that audio is replayed at the start of the next stream, so that words spoken
+    during the handoff are neither lost nor recognized twice.
+
+    Methods
+    _______
+        startStream()
+            Starts a new stream and returns the audio to replay on it
+        append(chunk)
+            Records a chunk sent on the current stream
+        finalize(endTime)
+            Discards the audio covered by a final result
+        clear()
+            Discards all the audio, so that nothing is replayed
+    """
+
+    def __init__(self, bytesPerSecond: int, maxDuration: float):
+        """
+        Parameters
+        ----------
+        bytesPerSecond : int
+            Number of bytes per second of audio
+        maxDuration : float
+            Maximum number of seconds of audio kept for replay. Older audio is discarded
+        """
+        self.__bytesPerSecond = bytesPerSecond
+        self.__maxBytes = int(bytesPerSecond * maxDuration)
+        self.__chunks = deque()         # (start offset in bytes, chunk) of the unfinalized audio
+        self.__size = 0                 # Number of bytes in __chunks
+        self.__offset = 0               # Number of bytes sent on the current stream
+        self.__lock = threading.Lock()
+
+    def startStream(self) -> list:
+        """
+        Starts a new stream
+
+        Returns
+        -------
+        list :
+            The unfinalized chunks of the previous stream. They must be sent, through append(), before new audio
+        """
+        with self.__lock:
+            chunks = [chunk for _, chunk in self.__chunks]
+            self.__chunks.clear()
+            self.__size = 0
+            self.__offset = 0
+            return chunks
+
+    def append(self, chunk: bytes):
+        """
+        Records a chunk sent on the current stream
+
+        Parameters
+        ----------
+        chunk : bytes
+            Audio sent to the speech recognizer
+        """
+        with self.__lock:
+            self.__chunks.append((self.__offset, chunk))
+            self.__offset += len(chunk)
+            self.__size += len(chunk)
+            while self.__size - len(self.__chunks[0][1]) >= self.__maxBytes:
+                _, dropped = self.__chunks.popleft()
+                self.__size -= len(dropped)
+
+    def finalize(self, endTime: float):
+        """
+        Discards the audio that ends before the end of a final result
+
+        Parameters
+        ----------
+        endTime : float
+            End of the final result in seconds since the start of the stream
+        """
+        endOffset = int(endTime * self.__bytesPerSecond)
+        with self.__lock:
+            while self.__chunks and self.__chunks[0][0] + len(self.__chunks[0][1]) <= endOffset:
+                _, dropped = self.__chunks.popleft()
+                self.__size -= len(dropped)
+
+    def clear(self):
+        """
+        Discards all the audio, so that nothing is replayed on the next stream
+        """
+        with self.__lock:
+            self.__chunks.clear()
+            self.__size = 0
+
+    def streamDuration(self) -> float:
+        """
+        Returns the number of seconds of audio sent on the current stream
+        """
+        with self.__lock:
+            return self.__offset / self.__bytesPerSecond
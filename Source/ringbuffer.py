@@ -0,0 +1,248 @@
+#************************************************************************************************************************************************************************************
+# Copyright (c) 2021 Tony L. Jones
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”),
+# to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# The sound files were downloaded from https://www.fesliyanstudios.com
+#********************************************************************************************************************************************************************************
+
+
+import threading
+from typing import Optional
+
+class RingBuffer(object):
+    """
+    Fixed-capacity byte ring buffer between the PortAudio callback and the consumer of the audio. The storage is
+    allocated once. Writes copy the incoming data into the ring through a memoryview, and reads hand out
+    memoryview slices of the ring, so no intermediate objects are created.
+
+    Attributes
+    ----------
+    bytesWritten : int
+        Number of bytes offered to the buffer
+    bytesDropped : int
+        Number of bytes lost because the buffer was full
+    overruns : int
+        Number of writes that did not fit in the buffer
+    highWater : int
+        Largest number of bytes held at any time
+
+    Methods
+    _______
+        write(data)
+            Adds data to the buffer. Never blocks
+        read(maxBytes, timeout)
+            Removes data from the buffer and returns it as bytes
+        readInto(buffer, timeout)
+            Removes data from the buffer and copies it into buffer
+        interrupt()
+            Wakes up the reader without data
+        close()
+            Wakes up the reader. Reads return None once the buffer is empty
+    """
+
+    def __init__(self, capacity: int, dropPolicy: str = 'dropOldest', alignment: int = 2):
+        """
+        Parameters
+        ----------
+        capacity : int
+            Size of the buffer in bytes. Rounded down to a multiple of alignment
+        dropPolicy : str
+            'dropOldest' overwrites the oldest data when the buffer is full, 'dropNewest' discards the data that
+            does not fit
+        alignment : int
+            Size of one sample frame in bytes. Data is always dropped in whole frames
+        """
+        if dropPolicy not in ('dropOldest', 'dropNewest'):
+            raise ValueError('Unknown drop policy: ' + str(dropPolicy))
+        self.__capacity = capacity - capacity % alignment
+        if self.__capacity <= 0:
+            raise ValueError('Ring buffer capacity must hold at least one frame')
+        self.__dropPolicy = dropPolicy
+        self.__alignment = alignment
+        self.__storage = bytearray(self.__capacity)
+        self.__view = memoryview(self.__storage)
+        self.__start = 0            # Position of the oldest byte
+        self.__size = 0             # Number of bytes held
+        self.__closed = False
+        self.__interrupted = False  # Set by interrupt() until a read finds the buffer empty
+        self.__condition = threading.Condition()
+        self.bytesWritten: int = 0
+        self.bytesDropped: int = 0
+        self.overruns: int = 0
+        self.highWater: int = 0
+
+    def __len__(self) -> int:
+        with self.__condition:
+            return self.__size
+
+    def write(self, data: bytes):
+        """
+        Adds data to the buffer. Safe to call from the PortAudio callback, because it never blocks on the reader
+
+        Parameters
+        ----------
+        data : bytes
+            Audio samples
+        """
+        source = memoryview(data).cast('B')
+        with self.__condition:
+            self.bytesWritten += len(source)
+            free = self.__capacity - self.__size
+            if len(source) > free:
+                self.overruns += 1
+                if self.__dropPolicy == 'dropNewest':
+                    fit = free - free % self.__alignment
+                    self.bytesDropped += len(source) - fit
+                    source = source[:fit]
+                else:
+                    if len(source) > self.__capacity:      # Only the most recent data fits
+                        excess = len(source) - self.__capacity
+                        excess += -excess % self.__alignment
+                        self.bytesDropped += excess
+                        source = source[excess:]
+                    drop = len(source) - (self.__capacity - self.__size)
+                    if drop > 0:
+                        self.__start = (self.__start + drop) % self.__capacity
+                        self.__size -= drop
+                        self.bytesDropped += drop
+            if len(source) > 0:
+                end = (self.__start + self.__size) % self.__capacity
+                first = min(len(source), self.__capacity - end)
+                self.__view[end:end + first] = source[:first]
+                if first < len(source):     # Wrap around
+                    self.__view[:len(source) - first] = source[first:]
+                self.__size += len(source)
+                if self.__size > self.highWater:
+                    self.highWater = self.__size
+                self.__condition.notify()
+
+    def __wait(self, timeout: Optional[float]) -> bool:
+        """
+        Waits until there is data in the buffer. Must be called with the condition held
+
+        Returns
+        -------
+        bool :
+            True if there is data to read
+        """
+        if self.__size == 0 and not self.__closed and not self.__interrupted:
+            self.__condition.wait_for(lambda: self.__size > 0 or self.__closed or self.__interrupted, timeout)
+        if self.__size > 0:
+            return True
+        self.__interrupted = False
+        return False
+
+    def __consume(self, count: int):
+        """
+        Returns the memoryview segments holding the oldest count bytes and removes them from the buffer. Must be
+        called with the condition held
+        """
+        first = min(count, self.__capacity - self.__start)
+        segments = [self.__view[self.__start:self.__start + first]]
+        if first < count:
+            segments.append(self.__view[:count - first])
+        self.__start = (self.__start + count) % self.__capacity
+        self.__size -= count
+        return segments
+
+    def read(self, maxBytes: int = None, timeout: float = None) -> Optional[bytes]:
+        """
+        Blocks until data is available, then removes up to maxBytes bytes from the buffer
+
+        Parameters
+        ----------
+        maxBytes : int, optional
+            Maximum number of bytes to return. All the data in the buffer is returned if it is None
+        timeout : float, optional
+            Maximum number of seconds to wait for data
+
+        Returns
+        -------
+        bytes :
+            The oldest data in the buffer. Empty if the timeout expired or the read was interrupted, None if the
+            buffer was closed and is empty
+        """
+        with self.__condition:
+            if not self.__wait(timeout):
+                return None if self.__closed else b''
+            count = self.__size if maxBytes == None else min(self.__size, maxBytes - maxBytes % self.__alignment)
+            return b''.join(self.__consume(count))
+
+    def readInto(self, buffer, timeout: float = None) -> Optional[int]:
+        """
+        Blocks until data is available, then moves as much data as fits into buffer
+
+        Parameters
+        ----------
+        buffer : bytearray, memoryview or numpy array
+            Writable buffer
+        timeout : float, optional
+            Maximum number of seconds to wait for data
+
+        Returns
+        -------
+        int :
+            Number of bytes copied. 0 if the timeout expired or the read was interrupted, None if the buffer was
+            closed and is empty
+        """
+        target = memoryview(buffer).cast('B')
+        with self.__condition:
+            if not self.__wait(timeout):
+                return None if self.__closed else 0
+            count = min(self.__size, len(target) - len(target) % self.__alignment)
+            position = 0
+            for segment in self.__consume(count):
+                target[position:position + len(segment)] = segment
+                position += len(segment)
+            return count
+
+    def clear(self):
+        """
+        Discards the data in the buffer
+        """
+        with self.__condition:
+            self.__start = 0
+            self.__size = 0
+
+    def interrupt(self):
+        """
+        Wakes up the reader without data. Once the buffer is empty, the read in progress or the next one returns
+        empty
+        """
+        with self.__condition:
+            self.__interrupted = True
+            self.__condition.notify_all()
+
+    def close(self):
+        """
+        Wakes up the reader. Reads return None once the remaining data has been read
+        """
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+
+    def statistics(self) -> dict:
+        """
+        Returns the buffer counters
+
+        Returns
+        -------
+        dict :
+            Capacity, bytes held, high-water mark, bytes written, bytes dropped and number of overruns
+        """
+        with self.__condition:
+            return {
+                'capacity': self.__capacity,
+                'size': self.__size,
+                'highWater': self.highWater,
+                'bytesWritten': self.bytesWritten,
+                'bytesDropped': self.bytesDropped,
+                'overruns': self.overruns
+            }
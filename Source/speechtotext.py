@@ -16,14 +16,31 @@ from __future__ import absolute_import
 from __future__ import division
 import sys
 import threading
-from typing import List
-from google.cloud import speech
-import google.api_core
+import time
 from six.moves import queue
+from textreplacer import TextReplacer
+from replaybuffer import ReplayBuffer
+import gradefastpath
+from gradegrammar import GradeGrammar
+from recognizer import Recognizer, RecognitionResult, GoogleRecognizer
+from metrics import registry
+
+# Settings
+workerStopTimeout = 2.0         # Seconds to wait for the speech recognition worker to stop
+workerIdleWait = 0.5            # Seconds the worker waits for recognition to be resumed before checking for a stop request
+workerRestartDelay = 0.1        # Minimum time in seconds between two consecutive streaming requests made by the worker
+replaceWholeWordsOnly = False   # Only replace words from the "Replacements" columns that are not part of a longer word
+streamingLimit = 290.0          # Seconds after which a stream is rotated. Google ends streams after about 305 seconds
+maxReplayDuration = 5.0         # Maximum seconds of unfinalized audio replayed on the next stream
+lowLatencyGrades = False        # Send stable numeric grades from interim results, before Google finalizes them
+correctionMacro = 'correctText' # Excel macro called when a grade sent early differs from the final result
+normalizeGrades = False         # Send grades and commands to Excel as a value and a command code instead of text
+gradeMacro = 'receiveGrade'     # Excel macro that receives the normalized grades, as "value#commandCode"
 
 class SpeechToText(object):
     """
-        Sends the audio chunks to the Google speech-to-text API and sends the recognized text to Excel
+        Sends the audio chunks to a speech recognizer, by default the Google speech-to-text API, and sends the
+        recognized text to Excel
 
         Methods
         _______
@@ -31,10 +48,14 @@ class SpeechToText(object):
                 Pauses speech recognition
             resume()
                 Resumes speech recognition
+            start()
+                Starts the event-driven speech recognition worker
+            stop()
+                Stops the event-driven speech recognition worker
             runSpeechRecognition()
-                Must be called periodically to run the speech recognition engine
+                Must be called periodically to run the speech recognition engine when the worker is not used
     """
-    def __init__(self, audioEngine: object, languageCode: str, commonPhrases: list, replacementDictionary: dict, callExcelMacro: callable, sampleRate: int, exceptionHook: callable):
+    def __init__(self, audioEngine: object, languageCode: str, commonPhrases: list, replacementDictionary: dict, callExcelMacro: callable, sampleRate: int, exceptionHook: callable, googleAPIClient: object = None, recognizer: Recognizer = None):
         """
         Parameters
         ----------
@@ -50,6 +71,10 @@ class SpeechToText(object):
             A handle to the method that calls nan Excel VBA macro
          exceptionHook :
             Method to call when an exception has occurred
+         googleAPIClient : object, optional
+            Speech client to use instead of a new speech.SpeechClient, e.g. one connected to a local test server
+         recognizer : Recognizer, optional
+            Recognizer to use instead of the Google speech-to-text API, e.g. a local recognizer
         """
 
         self.__audioEngine = audioEngine
@@ -61,35 +86,41 @@ class SpeechToText(object):
         self.__exceptionHook = exceptionHook
         self.__thread = None                        # Thread in which speech recognition runs
         self.__phraseQueue = queue.Queue()          # A queue to hold the phrases as they are generated by the Google speech-to-text API
-        self.__googleAPIClient = None               # Handle to the Google API client
-        self.__streamingConfig = None               # Stream configuration object
-        self.__secondsBilled = 0                    # Seconds billed by the Google API
+        self.__recognizer = recognizer              # Speech recognizer
+        self.__secondsBilled = 0                    # Seconds billed by the Google API that were not yet reported to Excel
         self.__recognitionActive = False            # Set to true when running speech recognition
+        self.__worker = None                        # Long-lived thread used in event-driven mode
+        self.__eventDriven = False                  # Set to true when phrases are pushed to Excel by the worker
+        self.__stopEvent = threading.Event()        # Set to request the worker to stop
+        self.__resumeEvent = threading.Event()      # Set while speech recognition is active
+        self.__textReplacer = None                  # Compiled replacements from the "Settings" sheet
+        self.__replayBuffer = ReplayBuffer(sampleRate * 2, maxReplayDuration)   # Unfinalized audio of the current stream
+        self.__streamStartTime = 0.0                # Time at which the current stream was opened
+        self.__lastChunkTime = 0.0                  # Time at which the last audio chunk was sent to the recognizer
+        self.rotations = 0                          # Number of streams rotated before reaching the streaming limit
+        self.__gradeFastPath = gradefastpath.GradeFastPath(commit=self.__commitEarly) \
+            if lowLatencyGrades else None
+        self.__gradeGrammar = None                  # Normalizes dictated grades and commands
 
-        # List of common phrases from the settings module
-        speechContext = speech.SpeechContext(phrases=self.__commonPhrases)
-        # Instantiate the Google API client
-        try:
-            self.__googleAPIClient = speech.SpeechClient()
-        except:
-            self.__callExcelMacro("pythonError", 'GoogleCredentialsError.')
+        # Compile the replacements once, so that each transcript is scanned in a single pass
         try:
-            # Set up the speech-to-text configuration.
-            # Details can be found at https://cloud.google.com/speech-to-text/docs/basics
-            config = speech.RecognitionConfig(
-                encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
-                sample_rate_hertz=self.__sampleRate,
-                language_code=self.__languageCode,
-                audio_channel_count=1,
-                model='command_and_search',  #
-                speech_contexts=[speechContext],
-            )
-            # Create the Google API configuration
-            self.__streamingConfig = speech.StreamingRecognitionConfig(config=config, interim_results=False)
+            self.__textReplacer = TextReplacer(self.__replacementDictionary, replaceWholeWordsOnly)
         except:
-            exType, exValue, exTraceback = sys.exc_info()
-            self.__exceptionHook(exType, exValue, exTraceback)
-
+            self.__callExcelMacro("pythonError", "textReplacementError")
+        # Build the grade grammar once for the language and the replacements
+        if normalizeGrades:
+            try:
+                self.__gradeGrammar = GradeGrammar(self.__languageCode, self.__replacementDictionary)
+            except:
+                exType, exValue, exTraceback = sys.exc_info()
+                self.__exceptionHook(exType, exValue, exTraceback)
+        # Instantiate the Google API client, unless another recognizer was given
+        if self.__recognizer == None:
+            try:
+                self.__recognizer = GoogleRecognizer(self.__languageCode, self.__commonPhrases, self.__sampleRate,
+                                                     lowLatencyGrades, googleAPIClient)
+            except:
+                self.__callExcelMacro("pythonError", 'GoogleCredentialsError.')
 
     def __replaceText(self, text: str) -> str:
         """
@@ -108,77 +139,210 @@ class SpeechToText(object):
             Text with replacements made
         """
         try:
-            for key in self.__replacementDictionary:
-                text = text.replace(key, self.__replacementDictionary[key])
+            startTime = time.monotonic()
+            text = self.__textReplacer.replace(text)
+            registry.observe('speech.replaceText', time.monotonic() - startTime)
         except:
             self.__callExcelMacro("pythonError", "textReplacementError")
         finally:
             return text
 
-    def __timeDeltaToSeconds(self, tDelta: object) -> int:
+    def __recognizeStream(self):
+        """
+        Sends the audio data collected by the Audio Engine Object to the recognizer. The recognized speech and time
+        billed (in seconds) are sent to Excel, or entered into the __phraseQueue queue as a dictionary object.
+        """
+
+        if self.__recognitionActive:    # Check if speech recognition is turned on
+            try:
+                for result in self.__recognizer.streamingRecognize(self.__audioGenerator()):
+                    self.__processResult(result)
+            except:
+                self.__callExcelMacro("pythonError", "speechRecognitionError")
+
+    def __processResult(self, result: RecognitionResult):
         """
-        Converts timedelta object to seconds
+        Sends a result to Excel. Interim results are only used by the low-latency grade mode, which sends a stable
+        numeric grade before the result is final and sends a correction if the final result turns out to be
+        different.
 
         Parameters
         ----------
-        tDelta : timedelta object
-            Object to be converted to seconds
+        result : RecognitionResult
+            Result produced by the recognizer
+        """
+        # Time from sending the latest audio to receiving the result
+        registry.observe('speech.finalResultLatency' if result.isFinal else 'speech.interimResultLatency',
+                         time.monotonic() - self.__lastChunkTime)
+        # Replace words with alternatives as defined on the "Settings" sheet of the workbook
+        textString = self.__replaceText(result.transcript)
+        timeBilled = result.secondsBilled
+        if not result.isFinal:
+            if self.__gradeFastPath != None:
+                earlyText = self.__gradeFastPath.interim(textString, result.stability)
+                if earlyText != None:
+                    self.__deliverPhrase({"macroName": 'receiveText', "textString": earlyText, "timeBilled": timeBilled})
+            return
+        # The audio up to the end of this result no longer has to be replayed
+        self.__replayBuffer.finalize(result.endTime)
+        macroName = 'receiveText'
+        if self.__gradeFastPath != None:
+            action = self.__gradeFastPath.final(textString)
+            if action == gradefastpath.SKIP:     # Already sent. Report the billed time with the next phrase
+                self.__secondsBilled += timeBilled
+                return
+            if action == gradefastpath.CORRECT:
+                macroName = correctionMacro
+        # Send grades and commands ready to be entered, so that Excel does not have to parse them
+        if macroName == 'receiveText' and self.__gradeGrammar != None:
+            grade = self.__gradeGrammar.parse(textString)
+            if grade != None:
+                macroName = gradeMacro
+                textString = grade.toMessage()
+        phraseDictionary = {
+            "macroName": macroName,
+            "textString": textString,
+            "timeBilled": timeBilled + self.__secondsBilled
+        }
+        self.__secondsBilled = 0
+        self.__deliverPhrase(phraseDictionary)
 
-        Returns
-        -------
-        str : int
-            seconds tDelta converted to seconds
+    def __commitEarly(self, text: str):
+        """
+        Sends a grade that the low-latency grade mode committed on its timer, before the next result arrived
+
+        Parameters
+        ----------
+        text : str
+            The grade
         """
         try:
-            hms: List[str] = str(tDelta).split(':')
-            h = hms[0]  # hours
-            m = hms[1]  # minutes
-            s = hms[2]  # seconds
-            seconds = int(h) * 3600 + int(m) * 60 + int(s)
-            return seconds
+            self.__deliverPhrase({"macroName": 'receiveText', "textString": text, "timeBilled": 0})
         except:
             exType, exValue, exTraceback = sys.exc_info()
             self.__exceptionHook(exType, exValue, exTraceback)
 
-    def __callGoogleSpeech(self):
+    def __audioGenerator(self):
         """
-        Calls the Google speech API with audio data collected by the Audio Engine Object. The recognized speech and
-        time billed (in seconds) is entered into the __phraseQueue queue as a dictionary object.
+        Generates the audio chunks of one stream from the chunks generated by the Audio Engine. Starts with the audio that was
+        not finalized on the previous stream. Ends the request stream when the worker is asked to stop or when speech
+        recognition is paused, so that no audio is uploaded while paused, and cancels the stream when it reaches
+        streamingLimit, so that the next stream takes over before Google ends it.
+
+        Yields
+        -------
+        bytes
+            A chunk of audio data
         """
+        self.__streamStartTime = time.monotonic()
+        for content in self.__replayBuffer.startStream():
+            self.__replayBuffer.append(content)
+            registry.increment('speech.bytesReplayed', len(content))
+            yield content
+        for content in self.__audioEngine.audioGenerator:
+            if self.__stopEvent.is_set():
+                return
+            if not content:     # The Audio Engine was paused and has delivered the audio captured before
+                self.__endPausedStream()
+                return
+            self.__replayBuffer.append(content)
+            self.__lastChunkTime = time.monotonic()
+            registry.increment('speech.bytesStreamed', len(content))
+            yield content
+            if not self.__recognitionActive:
+                self.__endPausedStream()
+                return
+            if time.monotonic() - self.__streamStartTime >= streamingLimit:
+                self.__rotateStream()
+                return
 
-        if self.__recognitionActive:    # Check if speech recognition is turned on
-            # First generate the request with audio data received from the Audio Generator
-            requests = (
-                speech.StreamingRecognizeRequest(audio_content=content)
-                for content in self.__audioEngine.audioGenerator
-            )
-            # Call the Google Speech API to get a list of responses
-            try:
-                responses = self.__googleAPIClient.streaming_recognize(self.__streamingConfig, requests)
-                if responses != None:
-                    for response in responses:
-                        if response != None:
-                            # Check that the response contains results
-                            if hasattr(response, 'results'):
-                                if response.results != []:
-                                    result = response.results[0]
-                                    # Get first result
-                                    textString = result.alternatives[0].transcript
-                                    # Replace words with alternatives as defined on the "Settings" sheet of the workbook
-                                    textString = self.__replaceText(textString)
-                                    timeBilled = response.total_billed_time
-                                    # Convert the TimeDelta object to seconds
-                                    timeBilled = self.__timeDeltaToSeconds(timeBilled)
-                                    phraseDictionary = {
-                                        "textString": textString,
-                                        "timeBilled": timeBilled
-                                    }
-                                    # Place the text and billed time in a Queue. This information will be sent to Excel by the "__sendTextToExcel" method
-                                    self.__phraseQueue.put(phraseDictionary, block=True, timeout=0.1)
-            except google.api_core.exceptions.OutOfRange:
-                pass   # This exception can be ignored and sometimes occurs sporadically as the audio engine is paused or closed
-            except:
-                self.__callExcelMacro("pythonError", "speechRecognitionError")
+    def __endPausedStream(self):
+        """
+        Ends the request stream when speech recognition is paused. Google still returns the results of the audio
+        already sent. Nothing is replayed on the next stream, which starts with the pre-roll of the Audio Engine.
+        """
+        self.__replayBuffer.clear()
+        registry.increment('speech.pausedStreams')
+
+    def __rotateStream(self):
+        """
+        Cancels the stream in progress. Results that were not final are dropped on the old stream and their audio
+        is replayed on the new stream, which the worker opens immediately.
+        """
+        self.rotations += 1
+        self.__recognizer.cancel()
+
+    def __deliverPhrase(self, phraseDictionary: dict):
+        """
+        Sends the phrase to Excel immediately in event-driven mode. Otherwise, places it in __phraseQueue, from where
+        it will be sent to Excel by the "__sendTextToExcel" method.
+
+        Parameters
+        ----------
+        phraseDictionary : dict
+            Dictionary containing the recognized text and the time billed
+        """
+        if self.__eventDriven:
+            startTime = time.monotonic()
+            self.__callExcelMacro(phraseDictionary["macroName"], phraseDictionary["textString"], phraseDictionary["timeBilled"])
+            registry.observe('speech.callExcelMacro', time.monotonic() - startTime)
+        else:
+            phraseDictionary["timeStamp"] = time.monotonic()
+            self.__phraseQueue.put(phraseDictionary, block=True, timeout=0.1)
+            registry.gauge('speech.phraseQueueDepth', self.__phraseQueue.qsize())
+
+    def __runWorker(self, started: threading.Event):
+        """
+            Body of the long-lived worker thread. Waits until speech recognition is resumed and keeps a streaming
+            request open until stop() is called.
+
+            Parameters
+            ----------
+            started : threading.Event
+                Set as soon as the worker is running
+        """
+        started.set()
+        while not self.__stopEvent.is_set():
+            if not self.__resumeEvent.wait(workerIdleWait):     # Wake up regularly to check for a stop request
+                continue
+            startTime = time.monotonic()
+            self.__recognizeStream()
+            # Do not hammer the API if the stream ends immediately, e.g. when there is no network connection
+            elapsedTime = time.monotonic() - startTime
+            if elapsedTime < workerRestartDelay:
+                self.__stopEvent.wait(workerRestartDelay - elapsedTime)
+
+    def start(self):
+        """
+            Starts the event-driven speech recognition worker. Recognized phrases are sent to Excel as soon as they
+            arrive, so runSpeechRecognition() does not have to be called. Blocks until the worker is running.
+        """
+        try:
+            if self.__worker == None or not self.__worker.is_alive():
+                self.__eventDriven = True
+                self.__stopEvent.clear()
+                started = threading.Event()
+                self.__worker = threading.Thread(target=self.__runWorker, args=(started,), daemon=True)
+                self.__worker.start()
+                started.wait()
+        except:
+            exType, exValue, exTraceback = sys.exc_info()
+            self.__exceptionHook(exType, exValue, exTraceback)
+
+    def stop(self):
+        """
+            Stops the event-driven speech recognition worker. Blocks until the worker has finished or until
+            workerStopTimeout has expired.
+        """
+        try:
+            self.__stopEvent.set()
+            if self.__worker != None:
+                self.__worker.join(workerStopTimeout)
+                self.__worker = None
+            self.__eventDriven = False
+        except:
+            exType, exValue, exTraceback = sys.exc_info()
+            self.__exceptionHook(exType, exValue, exTraceback)
 
     def __recognizeSpeech(self):
         """
@@ -187,11 +351,11 @@ class SpeechToText(object):
         try:
             if self.__recognitionActive:    # Check is speech recognition is activated
                 if self.__thread == None:
-                    self.__thread = threading.Thread(target=self.__callGoogleSpeech, daemon=True)
+                    self.__thread = threading.Thread(target=self.__recognizeStream, daemon=True)
                     self.__thread.start()
                 else:
                     if not self.__thread.is_alive():    # Restart the thread if it has completed
-                        self.__thread = threading.Thread(target=self.__callGoogleSpeech)
+                        self.__thread = threading.Thread(target=self.__recognizeStream)
                         self.__thread.start()
         except:
             self.__callExcelMacro("pythonError", "speechRecognitionError")
@@ -204,18 +368,24 @@ class SpeechToText(object):
             if self.__recognitionActive:                # Check if speechrecognition is activated
                 if not self.__phraseQueue.empty():      # Check if there are messages in the queue
                     phraseDictionary = self.__phraseQueue.get()
+                    startTime = time.monotonic()
+                    registry.observe('speech.phraseQueueWait', startTime - phraseDictionary["timeStamp"])
                     text = phraseDictionary["textString"]
                     timeBilled = phraseDictionary["timeBilled"]     # Send to Excel by calling the Excel "receiveText" macro
-                    self.__callExcelMacro('receiveText', text, timeBilled)
+                    self.__callExcelMacro(phraseDictionary["macroName"], text, timeBilled)
+                    registry.observe('speech.callExcelMacro', time.monotonic() - startTime)
         except:
             exType, exValue, exTraceback = sys.exc_info()
             self.__exceptionHook(exType, exValue, exTraceback)
 
     def runSpeechRecognition(self):
         """
-            Must be called periodically to run the speech recognition engine
+            Must be called periodically to run the speech recognition engine. Does nothing while the event-driven
+            worker is running.
         """
         try:
+            if self.__eventDriven:
+                return
             self.__recognizeSpeech()
             self.__sendTextToExcel()
         except:
@@ -227,6 +397,7 @@ class SpeechToText(object):
         """
         try:
             self.__recognitionActive = False
+            self.__resumeEvent.clear()
         except:
             exType, exValue, exTraceback = sys.exc_info()
             self.__exceptionHook(exType, exValue, exTraceback)
@@ -238,9 +409,13 @@ class SpeechToText(object):
         """
         try:
             self.__recognitionActive = True
+            self.__resumeEvent.set()
         except:
             exType, exValue, exTraceback = sys.exc_info()
             self.__exceptionHook(exType, exValue, exTraceback)
 
     def __del__(self):
-        pass
+        try:
+            self.__stopEvent.set()
+        except:
+            pass
@@ -0,0 +1,170 @@
+#************************************************************************************************************************************************************************************
+# Copyright (c) 2021 Tony L. Jones
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”),
+# to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# The sound files were downloaded from https://www.fesliyanstudios.com
+#********************************************************************************************************************************************************************************
+
+
+import concurrent.futures
+import contextlib
+import threading
+import time
+from typing import Dict, List
+from metrics import registry
+
+# Settings
+stepTimeout = 60.0              # Seconds result() waits for a step by default
+
+class Startup(object):
+    """
+        Runs the initialization steps of the app concurrently and records the startup timeline.
+
+        A step submitted with submit() runs in its own daemon thread, so that slow steps, e.g. opening the microphone
+        or importing and connecting the Google clients, overlap with each other and with the main thread. Steps that
+        must run on the main thread, e.g. the COM calls to Excel, are timed with phase(). A step can wait for another
+        one with result().
+
+        Methods
+        _______
+            submit(name, function, *arguments)
+                Starts a step in a new thread
+            phase(name)
+                Context manager that runs a step on the calling thread
+            result(name, timeout)
+                Waits for a step and returns its value, or raises its exception
+            timeline()
+                Returns when each step started and finished
+            report()
+                Returns the timeline as text
+    """
+
+    def __init__(self):
+        self.__startTime = time.monotonic()
+        self.__lock = threading.Lock()
+        self.__futures: Dict[str, concurrent.futures.Future] = {}
+        self.__timeline: List[dict] = []
+
+    def __future(self, name: str) -> concurrent.futures.Future:
+        with self.__lock:
+            future = self.__futures.get(name)
+            if future == None:
+                future = self.__futures[name] = concurrent.futures.Future()
+            return future
+
+    def __record(self, name: str, startTime: float, error: BaseException = None):
+        endTime = time.monotonic()
+        registry.observe('startup.' + name, endTime - startTime)
+        with self.__lock:
+            self.__timeline.append({
+                'name': name,
+                'start': startTime - self.__startTime,
+                'end': endTime - self.__startTime,
+                'duration': endTime - startTime,
+                'thread': threading.current_thread().name,
+                'error': None if error == None else repr(error),
+            })
+
+    def submit(self, name: str, function: callable, *arguments) -> concurrent.futures.Future:
+        """
+        Starts a step in a new daemon thread
+
+        Parameters
+        ----------
+        name : str
+            Name of the step in the timeline
+        function : callable
+            The step. Its return value is returned by result(name)
+        arguments :
+            Arguments of the function
+
+        Returns
+        -------
+        concurrent.futures.Future :
+            The result of the step
+        """
+        future = self.__future(name)
+
+        def run():
+            startTime = time.monotonic()
+            try:
+                value = function(*arguments)
+            except BaseException as exception:
+                self.__record(name, startTime, exception)
+                future.set_exception(exception)
+            else:
+                self.__record(name, startTime)
+                future.set_result(value)
+
+        threading.Thread(target=run, name='startup-' + name, daemon=True).start()
+        return future
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        """
+        Runs the body of the with statement as a step on the calling thread. Steps waiting for it with result()
+        receive None, or the exception raised by the body
+        """
+        future = self.__future(name)
+        startTime = time.monotonic()
+        try:
+            yield
+        except BaseException as exception:
+            self.__record(name, startTime, exception)
+            future.set_exception(exception)
+            raise
+        self.__record(name, startTime)
+        future.set_result(None)
+
+    def result(self, name: str, timeout: float = stepTimeout) -> object:
+        """
+        Waits for a step to finish
+
+        Parameters
+        ----------
+        name : str
+            Name of the step. It may not have started yet
+        timeout : float, optional
+            Seconds to wait
+
+        Returns
+        -------
+        object :
+            The value returned by the step
+
+        Raises
+        ------
+        Exception
+            The exception raised by the step, or concurrent.futures.TimeoutError
+        """
+        return self.__future(name).result(timeout)
+
+    def timeline(self) -> List[dict]:
+        """
+        Returns the finished steps in the order in which they started. Times are in seconds since the startup began
+
+        Returns
+        -------
+        list :
+            name, start, end, duration, thread and error (None if the step succeeded) of each step
+        """
+        with self.__lock:
+            return sorted((dict(step) for step in self.__timeline), key=lambda step: step['start'])
+
+    def report(self) -> str:
+        """
+        Returns the timeline as a table, e.g. for the log file
+        """
+        lines = ['Startup timeline (ms):']
+        for step in self.timeline():
+            lines.append(f'  {step["name"]:24s} {step["start"] * 1000:8.1f} - {step["end"] * 1000:8.1f}'
+                         f'  ({step["duration"] * 1000:8.1f})  {step["thread"]}'
+                         + ('' if step['error'] == None else '  ' + step['error']))
+        return '\n'.join(lines)
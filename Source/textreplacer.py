@@ -0,0 +1,85 @@
+#************************************************************************************************************************************************************************************
+# Copyright (c) 2021 Tony L. Jones
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”),
+# to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# The sound files were downloaded from https://www.fesliyanstudios.com
+#********************************************************************************************************************************************************************************
+
+
+import re
+from typing import Dict
+
+class TextReplacer(object):
+    """
+        Replaces the words defined in the "Replacements" columns of the "Settings" sheet of the workbook. All the
+        replacements are compiled into a single regular expression when the object is created, so each text is
+        scanned only once, regardless of the number of replacements. At every position the longest matching key
+        wins, and replaced text is never scanned again, so the result does not depend on the order of the keys.
+
+        Methods
+        _______
+            replace(text)
+                Returns the text with all the replacements made
+    """
+
+    def __init__(self, replacementDictionary: Dict[str, str], wholeWordsOnly: bool = False):
+        """
+        Parameters
+        ----------
+        replacementDictionary : dict
+            A dictionary of word replacements from the "Settings" sheet of the workbook
+        wholeWordsOnly : bool, optional
+            Only replace keys that are not part of a longer word
+        """
+        # Empty keys can not be matched and are ignored
+        self.__replacementDictionary = {str(key): str(value) for key, value in replacementDictionary.items() if str(key) != ''}
+        self.__wholeWordsOnly = wholeWordsOnly
+        self.__pattern = None       # Compiled regular expression. None if there is nothing to replace
+        if self.__replacementDictionary:
+            # Longest keys first, so that the alternation prefers the longest match at each position
+            keys = sorted(self.__replacementDictionary, key=len, reverse=True)
+            alternation = '|'.join(re.escape(key) for key in keys)
+            if self.__wholeWordsOnly:
+                alternation = r'(?<!\w)(?:' + alternation + r')(?!\w)'
+            self.__pattern = re.compile(alternation)
+
+    def __lookUp(self, match: re.Match) -> str:
+        """
+        Returns the replacement for the matched key
+
+        Parameters
+        ----------
+        match : re.Match
+            The match object of the key found in the text
+
+        Returns
+        -------
+        str :
+            The replacement string
+        """
+        return self.__replacementDictionary[match.group(0)]
+
+    def replace(self, text: str) -> str:
+        """
+        Replaces all the keys found in the text in a single pass
+
+        Parameters
+        ----------
+        text : str
+            Original text
+
+        Returns
+        -------
+        str :
+            Text with replacements made
+        """
+        if self.__pattern == None:
+            return text
+        return self.__pattern.sub(self.__lookUp, text)
@@ -14,17 +14,25 @@
 
 from __future__ import absolute_import
 from __future__ import division
-from google.cloud import speech
-from google.cloud import texttospeech  # pip install google-cloud-texttospeech
-import google.api_core
 import threading
-import winsound
+import concurrent.futures
 import sys
 from six.moves import queue
+from audiocache import AudioCache
+from audiosink import AudioSink, defaultAudioSink
 
 # Settings
 textToSpeechTimeout = 60.0      # Timeout in seconds
 maxQueueSize = 10               # Maximum number of text messages in the queue
+prefetchConcurrency = 4         # Maximum number of texts synthesized concurrently by prefetch()
+# What to do when speak() is called while the queue is full:
+#   'reject'        Discard the new text and report textToSpeechQueueOverflow to Excel
+#   'dropOldest'    Discard the oldest text in the queue
+#   'coalesce'      Discard the new text if the same text is already waiting, otherwise discard the oldest text
+overflowPolicy = 'reject'
+workerIdleWait = 0.5            # Seconds the workers wait for work before checking for a stop request
+workerStopTimeout = 2.0         # Seconds start() waits for the workers of a previous stop() to finish
+bargeIn = False                 # A new text cuts off the text that is being spoken and discards the texts still waiting
 
 class TextToSpeech(object):
     """
@@ -34,8 +42,16 @@ class TextToSpeech(object):
     _______
     speak(text)
         Converts the string of text to speech and plays it through the default audio output device
+    start()
+        Starts the synthesis and playback workers
+    stop()
+        Stops the synthesis and playback workers
+    prefetch(texts)
+        Synthesizes texts in the background so that they can be spoken without delay later
+    cacheStatistics()
+        Returns the counters of the audio cache
     """
-    def __init__(self, textToSpeechLanguageCode: str, textToSpeechVoice: str, textToSpeechGender: str, ssmlSayAs: str, callExcelMacro: callable, exceptionHook: callable):
+    def __init__(self, textToSpeechLanguageCode: str, textToSpeechVoice: str, textToSpeechGender: str, ssmlSayAs: str, callExcelMacro: callable, exceptionHook: callable, audioCache: AudioCache = None, audioSink: AudioSink = None, googleAPIClient: object = None):
         """
         Parameters
         ----------
@@ -51,6 +67,12 @@ class TextToSpeech(object):
             Method to call in order to send message to Excel
         exceptionHook : callable
             Method to call when an exception has occurred
+        audioCache : AudioCache, optional
+            Cache of synthesized audio. A memory-only cache is used if it is None
+        audioSink : AudioSink, optional
+            Plays the synthesized audio. The default sink for the platform is used if it is None
+        googleAPIClient : object, optional
+            Text-to-speech client to use instead of a new TextToSpeechClient, e.g. one connected to a local test server
         """
         self.__textToSpeechLanguageCode = textToSpeechLanguageCode
         self.__textToSpeechVoice = textToSpeechVoice
@@ -58,55 +80,202 @@ class TextToSpeech(object):
         self.__ssmlSayAs = ssmlSayAs
         self.__callExcelMacro = callExcelMacro
         self.__exceptionHook = exceptionHook
-        self.__text = ''
-        self.__thread = None            # Thread in which text to speech runs
-        self.__queue = queue.Queue()    # Queue messages to read back
+        self.__queue = queue.Queue(maxsize=maxQueueSize)    # Queue messages to read back
+        self.__audioQueue = queue.Queue(maxsize=1)          # Synthesized audio waiting to be played
+        self.__synthesisThread = None   # Long-lived thread that converts the queued texts to speech
+        self.__playbackThread = None    # Long-lived thread that plays the synthesized audio
+        self.__stopEvent = threading.Event()
+        self.__workerLock = threading.Lock()
+        self.__audioCache = audioCache if audioCache != None else AudioCache()
+        self.__audioSink = audioSink if audioSink != None else defaultAudioSink()
+        self.__generation = 0           # Incremented on barge-in. Queued items of older generations are discarded
+        self.__prefetchPool = None      # Worker pool in which prefetch() synthesizes texts
+        self.__inFlight = {}            # Futures of the texts being prefetched, keyed by cache key
+        self.__inFlightLock = threading.Lock()
+        # The client library takes long to import, so it is imported when the first instance is created
+        from google.cloud import texttospeech as googleTextToSpeech   # pip install google-cloud-texttospeech
+        self.__googleTextToSpeech = googleTextToSpeech
         # Instantiate text-to-speech a client
         try:
-            self.__client = google.cloud.texttospeech.TextToSpeechClient()
+            self.__client = googleAPIClient if googleAPIClient != None else self.__googleTextToSpeech.TextToSpeechClient()
         except:
             self.__callExcelMacro("pythonError", 'GoogleCredentialsError.')
         try:
             # Set the voice gender
             if self.__textToSpeechGender == 'neutral':
-                gender = google.cloud.texttospeech.SsmlVoiceGender.NEUTRAL
+                gender = self.__googleTextToSpeech.SsmlVoiceGender.NEUTRAL
             else:
                 gender = self.__textToSpeechGender
             # Set the voice configuration
-            self.__voice = google.cloud.texttospeech.VoiceSelectionParams(
+            self.__voice = self.__googleTextToSpeech.VoiceSelectionParams(
                 language_code=self.__textToSpeechLanguageCode,
                 name=self.__textToSpeechVoice,
                 ssml_gender=gender
             )
             # Select the type of audio file to return
-            self.__audio_config = google.cloud.texttospeech.AudioConfig(audio_encoding=google.cloud.texttospeech.AudioEncoding.LINEAR16)
+            self.__audio_config = self.__googleTextToSpeech.AudioConfig(audio_encoding=self.__googleTextToSpeech.AudioEncoding.LINEAR16)
         except:
             exType, exValue, exTraceback = sys.exc_info()
             self.__exceptionHook(exType, exValue, exTraceback)
 
-    def __speakGoogle(self):
+    def __toSsml(self, text: str) -> str:
         """
-        Converts the self.__text to speech and plays it through the default audio output device
+        Adds the SSML markups to the text
+
+        Parameters
+        ----------
+        text : str
+            Text to be converted to speech
+
+        Returns
+        -------
+        str :
+            The SSML string
+        """
+        # Replace - with minus character
+        text1 = text.replace('-', '\u2212')
+        # Add SSML markups
+        return '<speak> <say-as interpret-as=\"'+self.__ssmlSayAs+'\">'+text1+'</say-as> </speak>'
+
+    def __cacheKey(self, ssmlText: str) -> str:
+        """
+        Returns the audio cache key of the SSML string for the current voice and audio configuration
+        """
+        return AudioCache.makeKey(ssmlText, self.__textToSpeechVoice, self.__textToSpeechLanguageCode,
+                                  self.__textToSpeechGender, self.__ssmlSayAs, self.__audio_config)
+
+    def __requestSynthesis(self, ssmlText: str, cacheKey: str) -> bytes:
+        """
+        Calls the Google text-to-speech API and stores the audio in the audio cache
+
+        Parameters
+        ----------
+        ssmlText : str
+            The SSML string to be synthesized
+        cacheKey : str
+            The audio cache key of the SSML string
+
+        Returns
+        -------
+        bytes :
+            The synthesized audio in the form of a wave file
+        """
+        charactersBilled = str(len(ssmlText))
+        # Set the text input to be synthesized
+        synthesis_input = self.__googleTextToSpeech.SynthesisInput(ssml=ssmlText)
+        # Build the voice request, select the language code and the ssml voice gender.
+        # Perform the text-to-speech request on the text input with the selected
+        # voice parameters and audio file type.
+        response = self.__client.synthesize_speech(
+            input=synthesis_input, voice=self.__voice, audio_config=self.__audio_config, timeout=textToSpeechTimeout
+        )
+        waveData = response.audio_content
+        self.__audioCache.put(cacheKey, waveData)
+        self.__callExcelMacro("charactersBilled", str(charactersBilled))
+        return waveData
+
+    def __synthesize(self, text: str) -> bytes:
+        """
+        Converts the text to speech. The audio is taken from the audio cache if the same text was synthesized before
+        with the same voice and audio configuration. If the text is being prefetched, waits for the prefetch to
+        finish instead of sending a second request.
+
+        Parameters
+        ----------
+        text : str
+            Text to be converted to speech
+
+        Returns
+        -------
+        bytes :
+            The synthesized audio in the form of a wave file
         """
+        ssmlText = self.__toSsml(text)
+        cacheKey = self.__cacheKey(ssmlText)
+        waveData = self.__audioCache.get(cacheKey)
+        if waveData == None:
+            with self.__inFlightLock:
+                future = self.__inFlight.get(cacheKey)
+            if future != None:
+                try:
+                    waveData = future.result(timeout=textToSpeechTimeout)
+                except:
+                    waveData = None     # The prefetch failed. Try again below
+            if waveData == None:
+                waveData = self.__requestSynthesis(ssmlText, cacheKey)
+        return waveData
+
+    def __prefetchOne(self, ssmlText: str, cacheKey: str) -> bytes:
+        """
+        Synthesizes one prefetched text. Runs in the prefetch worker pool
+        """
+        try:
+            return self.__requestSynthesis(ssmlText, cacheKey)
+        finally:
+            with self.__inFlightLock:
+                self.__inFlight.pop(cacheKey, None)
+
+    def prefetch(self, texts: list) -> int:
+        """
+        Synthesizes the texts in the background and stores the audio in the audio cache, so that they can be
+        spoken without waiting for the Google API later. At most prefetchConcurrency texts are synthesized at the
+        same time. Texts that are already cached or being prefetched are skipped. Failures are ignored, because the
+        text will be synthesized again when it is spoken.
+
+        Parameters
+        ----------
+        texts : list
+            Texts that are expected to be spoken, e.g. marks and student names
+
+        Returns
+        -------
+        int :
+            The number of texts that were queued for synthesis
+        """
+        count = 0
         try:
-            if self.__text != '':
-                # Replace - with minus character
-                text1 = self.__text.replace('-', '\u2212')
-                # Add SSML markups
-                ssmlText = '<speak> <say-as interpret-as=\"'+self.__ssmlSayAs+'\">'+text1+'</say-as> </speak>'
-                charactersBilled = str(len(ssmlText))
-                # Set the text input to be synthesized
-                synthesis_input = google.cloud.texttospeech.SynthesisInput(ssml=ssmlText)
-                # Build the voice request, select the language code and the ssml voice gender.
-                # Perform the text-to-speech request on the text input with the selected
-                # voice parameters and audio file type.
-                response = self.__client.synthesize_speech(
-                    input=synthesis_input, voice=self.__voice, audio_config=self.__audio_config, timeout=textToSpeechTimeout
-                )
-                waveData = response.audio_content
-                # This is in the form of a Wave file. We need to strip header before playing it
-                self.__callExcelMacro("charactersBilled", str(charactersBilled))
-                winsound.PlaySound(waveData, winsound.SND_MEMORY | winsound.SND_NOSTOP)
+            with self.__inFlightLock:
+                if self.__prefetchPool == None:
+                    self.__prefetchPool = concurrent.futures.ThreadPoolExecutor(max_workers=prefetchConcurrency,
+                                                                                thread_name_prefix='prefetch')
+                for text in texts:
+                    text = str(text)
+                    if text == '':
+                        continue
+                    ssmlText = self.__toSsml(text)
+                    cacheKey = self.__cacheKey(ssmlText)
+                    if cacheKey in self.__inFlight or self.__audioCache.contains(cacheKey):
+                        continue
+                    self.__inFlight[cacheKey] = self.__prefetchPool.submit(self.__prefetchOne, ssmlText, cacheKey)
+                    count += 1
+        except:
+            exType, exValue, exTraceback = sys.exc_info()
+            self.__exceptionHook(exType, exValue, exTraceback)
+        return count
+
+    def cacheStatistics(self) -> dict:
+        """
+        Returns the hit, miss and bytes saved counters of the audio cache
+
+        Returns
+        -------
+        dict :
+            The audio cache counters
+        """
+        return self.__audioCache.statistics()
+
+    def __play(self, waveData: bytes):
+        """
+        Plays the synthesized audio through the audio sink. synthesize_speech returns the clip whole, so it is
+        played once it has arrived. Google's streaming synthesis does not accept SSML, which the readback relies on
+
+        Parameters
+        ----------
+        waveData : bytes
+            Audio in the form of a wave file
+        """
+        try:
+            self.__audioSink.play(waveData)
         except:
             ExceptionType, ExceptionValue, excpetionTraceback = sys.exc_info()
             arguments = str(ExceptionValue.args)
@@ -116,9 +285,140 @@ class TextToSpeech(object):
                 exType, exValue, exTraceback = sys.exc_info()
                 self.__exceptionHook(exType, exValue, exTraceback)
 
+    def __runSynthesis(self):
+        """
+        Body of the synthesis worker. Converts the queued texts to speech and hands the audio to the playback
+        worker. Because the audio queue holds one clip, the next text is synthesized while the current one plays.
+        """
+        while not self.__stopEvent.is_set():
+            try:
+                generation, text = self.__queue.get(timeout=workerIdleWait)
+            except queue.Empty:
+                continue
+            try:
+                if text != '' and generation == self.__generation:
+                    waveData = self.__synthesize(text)
+                    while not self.__stopEvent.is_set():
+                        try:
+                            self.__audioQueue.put((generation, waveData), timeout=workerIdleWait)
+                            break
+                        except queue.Full:
+                            continue
+            except:
+                exType, exValue, exTraceback = sys.exc_info()
+                self.__exceptionHook(exType, exValue, exTraceback)
+
+    def __runPlayback(self):
+        """
+        Body of the playback worker. Plays the synthesized audio in the order in which the texts were queued
+        """
+        while not self.__stopEvent.is_set():
+            try:
+                generation, waveData = self.__audioQueue.get(timeout=workerIdleWait)
+            except queue.Empty:
+                continue
+            if generation == self.__generation:     # Skip clips that were cut off by barge-in
+                self.__play(waveData)
+
+    def start(self) -> bool:
+        """
+        Starts the synthesis and playback workers if they are not running. After stop(), waits up to
+        workerStopTimeout for the old workers to finish, so that there is never more than one of each
+
+        Returns
+        -------
+        bool :
+            False if a worker stopped by stop() is still running, e.g. waiting for Google. Nothing was started
+        """
+        try:
+            with self.__workerLock:
+                if self.__stopEvent.is_set():
+                    for thread in (self.__synthesisThread, self.__playbackThread):
+                        if thread != None:
+                            thread.join(workerStopTimeout)
+                            if thread.is_alive():
+                                return False
+                    self.__stopEvent.clear()
+                if self.__synthesisThread == None or not self.__synthesisThread.is_alive():
+                    self.__synthesisThread = threading.Thread(target=self.__runSynthesis, daemon=True)
+                    self.__synthesisThread.start()
+                if self.__playbackThread == None or not self.__playbackThread.is_alive():
+                    self.__playbackThread = threading.Thread(target=self.__runPlayback, daemon=True)
+                    self.__playbackThread.start()
+                return True
+        except:
+            exType, exValue, exTraceback = sys.exc_info()
+            self.__exceptionHook(exType, exValue, exTraceback)
+            return False
+
+    def stop(self, timeout: float = None):
+        """
+        Stops the synthesis and playback workers. Texts and audio that are still waiting are discarded. A worker
+        that does not finish within the timeout keeps running until it sees the stop request, and start() waits
+        for it
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Maximum number of seconds to wait for each worker to finish
+        """
+        try:
+            self.__stopEvent.set()
+            self.__discardPending()
+            with self.__workerLock:
+                for thread in (self.__synthesisThread, self.__playbackThread):
+                    if thread != None:
+                        thread.join(timeout)
+        except:
+            exType, exValue, exTraceback = sys.exc_info()
+            self.__exceptionHook(exType, exValue, exTraceback)
+
+    def __enqueue(self, text: str) -> bool:
+        """
+        Places the text in the queue, applying overflowPolicy if the queue is full
+
+        Parameters
+        ----------
+        text : str
+            Text to be converted to speech
+
+        Returns
+        -------
+        bool :
+            False if the text was rejected
+        """
+        if overflowPolicy == 'coalesce':
+            with self.__queue.mutex:
+                if (self.__generation, text) in self.__queue.queue:     # The same text is already waiting to be spoken
+                    return True
+        while True:
+            try:
+                self.__queue.put_nowait((self.__generation, text))
+                return True
+            except queue.Full:
+                if overflowPolicy == 'reject':
+                    return False
+                try:
+                    self.__queue.get_nowait()       # Discard the oldest text
+                except queue.Empty:
+                    pass
+
+    def __discardPending(self):
+        """
+        Cuts off the text that is being spoken and discards the texts and audio that are still waiting
+        """
+        self.__generation += 1
+        for pendingQueue in (self.__queue, self.__audioQueue):
+            try:
+                while True:
+                    pendingQueue.get_nowait()
+            except queue.Empty:
+                pass
+        self.__audioSink.cancel()
+
     def speak(self, text: str):
         """
-        Places the text to be converted to speech in the queue and calls runTextToSpeech
+        Places the text to be converted to speech in the queue and makes sure that the workers are running
 
         Parameters
         ----------
@@ -126,9 +426,10 @@ class TextToSpeech(object):
             Text to be converted to speec
         """
         try:
-            if self.__queue.qsize() <= maxQueueSize:
-                self.__queue.put(text)
-                self.runTextToSpeech
+            if bargeIn:
+                self.__discardPending()
+            if self.__enqueue(text):
+                self.start()
             else:
                 self.__callExcelMacro('pythonError', 'textToSpeechQueueOverflow')
         except:
@@ -137,22 +438,16 @@ class TextToSpeech(object):
 
     def runTextToSpeech(self):
         """
-        Creates the thread in which to run text-to-speech conversion
+        Makes sure that the workers are running. Calling this method periodically is no longer required, because
+        the workers process the queue as soon as text is placed in it
         """
-        try:
-            if not self.__queue.empty():
-                if self.__thread == None:
-                    self.__text = self.__queue.get()
-                    self.__thread = threading.Thread(target=self.__speakGoogle, daemon=True)
-                    self.__thread.start()
-                else:
-                    if not self.__thread.is_alive():  # Restart the thread if it has completed
-                        self.__text = self.__queue.get()
-                        self.__thread = threading.Thread(target=self.__speakGoogle)
-                        self.__thread.start()
-        except:
-            exType, exValue, exTraceback = sys.exc_info()
-            self.__exceptionHook(exType, exValue, exTraceback)
+        self.start()
 
     def __del__(self):
-        pass
+        try:
+            self.__stopEvent.set()
+            self.__audioSink.cancel()
+            if self.__prefetchPool != None:
+                self.__prefetchPool.shutdown(wait=False, cancel_futures=True)
+        except:
+            pass
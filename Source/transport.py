@@ -0,0 +1,462 @@
+#************************************************************************************************************************************************************************************
+# Copyright (c) 2021 Tony L. Jones
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”),
+# to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# The sound files were downloaded from https://www.fesliyanstudios.com
+#********************************************************************************************************************************************************************************
+
+
+import codecs
+import os
+import random
+import select
+import socket
+import stat
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Iterator
+try:
+    import pywintypes
+    import win32event
+    import win32file
+    import win32pipe
+except ImportError:     # Not on Windows. Only the Unix socket, FIFO and stream transports can be used
+    win32file = None
+
+# Settings
+readSize = 10240                # Number of bytes requested per read
+messageSeparator = '\r\n'       # Messages from Excel are separated by '\r\n'
+firstRetryDelay = 0.005         # Seconds to wait before trying to open the link again after the first failure
+maxRetryDelay = 0.1             # The wait is doubled after every failure, up to this number of seconds
+# Windows errors after which opening the pipe is tried again: ERROR_FILE_NOT_FOUND (Excel has not created the pipe
+# yet), ERROR_PIPE_BUSY (all instances are connected) and ERROR_SEM_TIMEOUT (WaitNamedPipe timed out)
+retryableWindowsErrors = [2, 121, 231]
+namedPipePrefix = '\\\\.\\pipe\\'   # Names of Windows named pipes start with this prefix
+
+class MessageFramer(object):
+    """
+    Turns the bytes read from the link into messages. The bytes are decoded as a UTF-16 stream, so that a character,
+    or a surrogate pair, that is split over two reads is decoded once both halves have arrived. A message that is
+    split over two reads is kept until its separator arrives.
+
+    Methods
+    _______
+        feed(data)
+            Returns the messages completed by data
+        pending()
+            Returns the text of the incomplete message
+    """
+
+    def __init__(self, separator: str = messageSeparator, encoding: str = 'utf-16-le'):
+        """
+        Parameters
+        ----------
+        separator : str, optional
+            Text between two messages
+        encoding : str, optional
+            Encoding of the stream. A byte order mark at the start of the stream is skipped
+        """
+        self.__separator = separator
+        self.__decoder = codecs.getincrementaldecoder(encoding)()
+        self.__buffer = ''          # Text of the incomplete message
+        self.__started = False      # Set to true once the first character was decoded
+
+    def feed(self, data: bytes) -> list:
+        """
+        Decodes data and returns the messages it completes. Empty messages are skipped
+
+        Parameters
+        ----------
+        data : bytes
+            Bytes read from the link
+
+        Returns
+        -------
+        list :
+            The complete messages, without separators
+        """
+        text = self.__decoder.decode(data)
+        if not self.__started and text != '':
+            self.__started = True
+            if text[0] == '\ufeff':      # Byte order mark
+                text = text[1:]
+        self.__buffer += text
+        if self.__separator not in self.__buffer:
+            return []
+        messages = self.__buffer.split(self.__separator)
+        self.__buffer = messages.pop()      # The text after the last separator is not complete yet
+        return [message for message in messages if message != '']
+
+    def pending(self) -> str:
+        """
+        Returns the text of the incomplete message
+        """
+        return self.__buffer
+
+def connectWithBackoff(connect: Callable[[], None], isRetryable: Callable[[BaseException], bool], timeOut: float,
+                       waitForLink: Callable[[BaseException, float], bool] = None) -> dict:
+    """
+    Calls connect until it succeeds. After a retryable error, waits for the link with waitForLink if it is given,
+    otherwise, or if waitForLink returns False, sleeps for a jittered, exponentially growing delay. Other errors
+    are raised immediately.
+
+    Parameters
+    ----------
+    connect : callable
+        Opens the link. Raises an exception if it fails
+    isRetryable : callable
+        Returns True if opening can be tried again after an exception
+    timeOut : float
+        The number of seconds to keep trying
+    waitForLink : callable, optional
+        waitForLink(exception, seconds) waits at most seconds for the link to become available. Returns True if it
+        waited, e.g. until a pipe instance became free, and False if it could not wait
+
+    Returns
+    -------
+    dict :
+        attempts, latency (seconds until connected), waitTime (seconds spent waiting) and retryableErrors (count
+        per error)
+
+    Raises
+    ------
+    RuntimeError
+        If connecting timed out
+    """
+    statistics = {'attempts': 0, 'latency': 0.0, 'waitTime': 0.0, 'retryableErrors': {}}
+    startTime = time.monotonic()
+    stopTime = startTime + timeOut
+    delay = firstRetryDelay
+    while True:
+        statistics['attempts'] += 1
+        try:
+            connect()
+            statistics['latency'] = time.monotonic() - startTime
+            return statistics
+        except BaseException as ex:
+            if not isRetryable(ex):
+                raise
+            error = ex
+            name = type(ex).__name__ + ('(' + str(ex.args[0]) + ')' if ex.args else '')
+            statistics['retryableErrors'][name] = statistics['retryableErrors'].get(name, 0) + 1
+        remaining = stopTime - time.monotonic()
+        if remaining <= 0:
+            raise RuntimeError('Timeout error opening pipe')
+        waitStart = time.monotonic()
+        if waitForLink == None or not waitForLink(error, min(maxRetryDelay, remaining)):
+            time.sleep(min(remaining, delay / 2 + random.uniform(0, delay / 2)))
+            delay = min(maxRetryDelay, delay * 2)
+        statistics['waitTime'] += time.monotonic() - waitStart
+
+def encodeMessages(messages: list) -> bytes:
+    """
+    Encodes messages the way Excel writes them to the pipe
+
+    Parameters
+    ----------
+    messages : list
+        The messages
+
+    Returns
+    -------
+    bytes :
+        The messages, each followed by the separator, in UTF-16
+    """
+    return ''.join(message + messageSeparator for message in messages).encode('utf-16-le')
+
+class Transport(ABC):
+    """
+    The link over which Excel sends messages to this app
+
+    Methods
+    _______
+        open()
+            Connects to the link
+        readMessages()
+            Yields the messages until the link is closed
+        close()
+            Closes the link. A readMessages() call that is waiting returns
+        connectStatistics()
+            Returns how long connecting took
+    """
+
+    _connectStatistics = {}     # Set by open()
+
+    @abstractmethod
+    def open(self):
+        """
+        Connects to the link
+
+        Raises
+        ------
+        RuntimeError
+            If connecting timed out
+        """
+
+    @abstractmethod
+    def read(self) -> bytes:
+        """
+        Waits for data. Returns b'' when the link is closed
+        """
+
+    @abstractmethod
+    def close(self):
+        """
+        Closes the link. A read() call that is waiting returns b''
+        """
+
+    def readMessages(self) -> Iterator[str]:
+        """
+        Yields the complete messages until the link is closed
+
+        Yields
+        -------
+        str
+            A message, without separator
+        """
+        framer = MessageFramer()
+        while True:
+            data = self.read()
+            if data == b'':
+                return
+            for message in framer.feed(data):
+                yield message
+
+    def connectStatistics(self) -> dict:
+        """
+        Returns how long connecting took
+
+        Returns
+        -------
+        dict :
+            attempts, latency, waitTime and retryableErrors, see connectWithBackoff. Empty if the link was not opened
+        """
+        return dict(self._connectStatistics)
+
+class NamedPipeTransport(Transport):
+    """
+    The Windows named pipe opened by Excel. It is read with overlapped I/O, so that close() can interrupt a read
+    that is waiting.
+    """
+
+    def __init__(self, pipeName: str, timeOut: float):
+        """
+        Parameters
+        ----------
+        pipeName : str
+            Name of the pipe that was opened by Excel
+        timeOut : float
+            The number of seconds to retry opening the pipe if open fails
+        """
+        self.__pipeName = pipeName
+        self.__timeOut = timeOut
+        self.__pipeHandle = None        # Handle to pipe
+        self.__overlapped = None
+        self.__stopEvent = None
+        self.__buffer = None
+
+    def open(self):
+        self._connectStatistics = connectWithBackoff(self.__createFile, self.__isRetryable, self.__timeOut,
+                                                     self.__waitForPipe)
+        self.__overlapped = pywintypes.OVERLAPPED()
+        self.__overlapped.hEvent = win32event.CreateEvent(None, True, False, None)
+        self.__stopEvent = win32event.CreateEvent(None, True, False, None)
+        self.__buffer = win32file.AllocateReadBuffer(readSize)
+
+    def __createFile(self):
+        # See http://timgolden.me.uk/pywin32-docs/win32file__CreateFile_meth.html
+        self.__pipeHandle = win32file.CreateFile(
+            self.__pipeName,
+            win32file.GENERIC_READ,
+            0,
+            None,
+            win32file.OPEN_EXISTING,
+            win32file.FILE_FLAG_OVERLAPPED,
+            None
+        )
+
+    @staticmethod
+    def __isRetryable(ex: BaseException) -> bool:
+        return isinstance(ex, pywintypes.error) and ex.winerror in retryableWindowsErrors
+
+    def __waitForPipe(self, ex: BaseException, seconds: float) -> bool:
+        """
+        Waits until an instance of the pipe is free, if the pipe exists. WaitNamedPipe returns as soon as Excel
+        creates a new instance, instead of after a fixed delay
+        """
+        if ex.winerror != 231:      # ERROR_PIPE_BUSY. WaitNamedPipe fails at once if the pipe does not exist
+            return False
+        try:
+            win32pipe.WaitNamedPipe(self.__pipeName, max(1, int(seconds * 1000)))
+        except pywintypes.error:
+            pass        # Timed out, or the pipe was removed. The caller tries again
+        return True
+
+    def read(self) -> bytes:
+        try:
+            result, data = win32file.ReadFile(self.__pipeHandle, self.__buffer, self.__overlapped)
+        except pywintypes.error as ex:
+            if ex.winerror == 109:      # ERROR_BROKEN_PIPE: Excel closed the pipe
+                return b''
+            raise
+        if result == 997:               # ERROR_IO_PENDING
+            handles = (self.__overlapped.hEvent, self.__stopEvent)
+            if win32event.WaitForMultipleObjects(handles, False, win32event.INFINITE) != win32event.WAIT_OBJECT_0:
+                win32file.CancelIo(self.__pipeHandle)
+                return b''
+        try:
+            count = win32file.GetOverlappedResult(self.__pipeHandle, self.__overlapped, False)
+        except pywintypes.error as ex:
+            if ex.winerror == 234:      # ERROR_MORE_DATA: the rest of the message follows on the next read
+                count = readSize
+            elif ex.winerror in (109, 995):     # ERROR_BROKEN_PIPE, ERROR_OPERATION_ABORTED
+                return b''
+            else:
+                raise
+        return bytes(self.__buffer[:count])
+
+    def close(self):
+        if self.__stopEvent != None:
+            win32event.SetEvent(self.__stopEvent)
+        try:
+            self.__pipeHandle.close()
+        except:
+            pass
+
+class StreamTransport(Transport):
+    """
+    A socket or a file descriptor that is already open. Reads wait with select(), together with a wake-up pipe, so
+    that close() can interrupt them.
+    """
+
+    def __init__(self, stream: object = None):
+        """
+        Parameters
+        ----------
+        stream : object, optional
+            A connected socket, or a file descriptor opened for reading. Subclasses set it in open()
+        """
+        self._stream = stream
+        self.__wakeUp = os.pipe()       # Written to by close() to interrupt a read
+        self.__closed = False
+
+    def open(self):
+        pass
+
+    def read(self) -> bytes:
+        if self.__closed or self._stream == None:
+            return b''
+        try:
+            readable, writable, failed = select.select([self._stream, self.__wakeUp[0]], [], [])
+            if self.__closed or self.__wakeUp[0] in readable:
+                return b''
+            if isinstance(self._stream, socket.socket):
+                return self._stream.recv(readSize)
+            return os.read(self._stream, readSize)
+        except (OSError, ValueError):   # The stream was closed while waiting
+            return b''
+
+    def close(self):
+        self.__closed = True
+        try:
+            os.write(self.__wakeUp[1], b'x')
+        except OSError:
+            pass
+        try:
+            if isinstance(self._stream, socket.socket):
+                self._stream.close()
+            elif self._stream != None:
+                os.close(self._stream)
+        except OSError:
+            pass
+
+class UnixSocketTransport(StreamTransport):
+    """
+    A Unix domain socket, served by a stand-in for Excel, e.g. on Linux
+    """
+
+    def __init__(self, path: str, timeOut: float):
+        """
+        Parameters
+        ----------
+        path : str
+            Path of the socket
+        timeOut : float
+            The number of seconds to retry connecting if the socket is not being served yet
+        """
+        super().__init__()
+        self.__path = path
+        self.__timeOut = timeOut
+
+    def open(self):
+        self._connectStatistics = connectWithBackoff(self.__connect, self.__isRetryable, self.__timeOut)
+
+    def __connect(self):
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            connection.connect(self.__path)
+        except:
+            connection.close()
+            raise
+        self._stream = connection
+
+    @staticmethod
+    def __isRetryable(ex: BaseException) -> bool:
+        # Not served yet, or the backlog of the server is full
+        return isinstance(ex, (FileNotFoundError, ConnectionRefusedError, BlockingIOError))
+
+class FifoTransport(StreamTransport):
+    """
+    A FIFO (named pipe) on a Unix file system, written by a stand-in for Excel
+    """
+
+    def __init__(self, path: str, timeOut: float):
+        """
+        Parameters
+        ----------
+        path : str
+            Path of the FIFO
+        timeOut : float
+            The number of seconds to retry opening the FIFO if it does not exist yet
+        """
+        super().__init__()
+        self.__path = path
+        self.__timeOut = timeOut
+
+    def open(self):
+        self._connectStatistics = connectWithBackoff(self.__openFifo, lambda ex: isinstance(ex, FileNotFoundError),
+                                                     self.__timeOut)
+
+    def __openFifo(self):
+        # Opening for reading and writing does not wait for the writer, and keeps the FIFO open between writers
+        self._stream = os.open(self.__path, os.O_RDWR)
+
+def createTransport(address: str, timeOut: float) -> Transport:
+    """
+    Creates the transport for an address: a Windows named pipe if the address starts with '\\\\.\\pipe\\', a FIFO
+    if the address is one, otherwise a Unix domain socket
+
+    Parameters
+    ----------
+    address : str
+        Name of the pipe, or path of the FIFO or socket
+    timeOut : float
+        The number of seconds to retry opening the link
+
+    Returns
+    -------
+    Transport :
+        The transport. It is not open yet
+    """
+    if address.lower().startswith(namedPipePrefix):
+        return NamedPipeTransport(address, timeOut)
+    if os.path.exists(address) and stat.S_ISFIFO(os.stat(address).st_mode):
+        return FifoTransport(address, timeOut)
+    return UnixSocketTransport(address, timeOut)
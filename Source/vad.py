@@ -0,0 +1,170 @@
+#************************************************************************************************************************************************************************************
+# Copyright (c) 2021 Tony L. Jones
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”),
+# to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# The sound files were downloaded from https://www.fesliyanstudios.com
+#********************************************************************************************************************************************************************************
+
+
+from collections import deque
+import numpy as np
+
+# Settings
+frameDuration = 0.03            # Seconds of audio per analysis frame
+energyThreshold = 300.0         # Minimum RMS amplitude of a speech frame (16-bit scale)
+noiseFloorRatio = 3.0           # A speech frame must also be this many times louder than the tracked noise floor
+maxZeroCrossingRate = 0.35      # Frames crossing zero more often than this are treated as hiss, unless they are loud
+loudnessOverride = 4.0          # Frames this many times above the threshold are speech regardless of the zero-crossing rate
+hangoverDuration = 0.4          # Seconds of audio forwarded after the last speech frame
+preRollDuration = 0.3           # Seconds of audio forwarded before the first speech frame
+noiseFloorAdaptation = 0.05     # Weight of a new non-speech frame in the noise floor estimate
+
+class VoiceActivityDetector(object):
+    """
+    Energy and zero-crossing voice activity detector for 16-bit mono audio. Chunks of any size are split into
+    frames of frameDuration seconds, and the frame features are computed for all the frames of a chunk at once
+    with NumPy. Only speech segments are forwarded, padded with preRollDuration seconds of audio before the
+    speech and hangoverDuration seconds after it, so that soft word onsets and endings are not clipped.
+
+    Attributes
+    ----------
+    bytesIn : int
+        Number of bytes of audio received
+    bytesForwarded : int
+        Number of bytes of audio forwarded
+
+    Methods
+    _______
+        process(chunk)
+            Returns the part of the chunk that must be forwarded
+        reset()
+            Forgets the speech state, the pre-roll and any partial frame
+        statistics()
+            Returns the counters and the fraction of audio suppressed
+    """
+
+    def __init__(self, sampleRate: int, threshold: float = energyThreshold, hangover: float = hangoverDuration,
+                 preRoll: float = preRollDuration):
+        """
+        Parameters
+        ----------
+        sampleRate : int
+            Audio sample rate
+        threshold : float, optional
+            Minimum RMS amplitude of a speech frame
+        hangover : float, optional
+            Seconds of audio forwarded after the last speech frame
+        preRoll : float, optional
+            Seconds of audio forwarded before the first speech frame
+        """
+        self.__frameSamples = max(1, int(sampleRate * frameDuration))
+        self.__frameBytes = self.__frameSamples * 2
+        self.__threshold = threshold
+        self.__hangoverFrames = int(round(hangover / frameDuration))
+        self.__preRoll = deque(maxlen=int(round(preRoll / frameDuration)))     # Most recent non-speech frames
+        self.__remainder = b''                      # Partial frame carried over to the next chunk
+        self.__framesSinceSpeech = None             # None while no speech segment is open
+        self.__noiseFloor = threshold / noiseFloorRatio
+        self.bytesIn: int = 0
+        self.bytesForwarded: int = 0
+
+    def __classify(self, samples: np.ndarray) -> np.ndarray:
+        """
+        Classifies the frames
+
+        Parameters
+        ----------
+        samples : numpy.ndarray
+            int16 array of shape (frames, frameSamples)
+
+        Returns
+        -------
+        numpy.ndarray :
+            Boolean array that is True for speech frames
+        """
+        floats = samples.astype(np.float32)
+        energy = np.sqrt(np.mean(floats * floats, axis=1))
+        signs = np.signbit(samples)
+        zeroCrossingRate = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (self.__frameSamples - 1 or 1)
+        isSpeech = np.empty(len(energy), dtype=bool)
+        # The noise floor adapts frame by frame, so the threshold is applied in order
+        for index in range(len(energy)):
+            threshold = max(self.__threshold, self.__noiseFloor * noiseFloorRatio)
+            speech = energy[index] >= threshold and (zeroCrossingRate[index] <= maxZeroCrossingRate or
+                                                    energy[index] >= threshold * loudnessOverride)
+            if not speech:
+                self.__noiseFloor += noiseFloorAdaptation * (energy[index] - self.__noiseFloor)
+            isSpeech[index] = speech
+        return isSpeech
+
+    def process(self, chunk: bytes) -> bytes:
+        """
+        Returns the part of the chunk that must be forwarded to the speech recognizer
+
+        Parameters
+        ----------
+        chunk : bytes
+            16-bit mono samples
+
+        Returns
+        -------
+        bytes :
+            The speech segments in the chunk, with their pre-roll and hangover. Empty if the chunk is silent
+        """
+        self.bytesIn += len(chunk)
+        data = self.__remainder + chunk if self.__remainder else chunk
+        frameCount = len(data) // self.__frameBytes
+        self.__remainder = data[frameCount * self.__frameBytes:]
+        if frameCount == 0:
+            return b''
+        samples = np.frombuffer(data, dtype=np.int16, count=frameCount * self.__frameSamples)
+        isSpeech = self.__classify(samples.reshape(frameCount, self.__frameSamples))
+        view = memoryview(data)
+        forwarded = []
+        for index in range(frameCount):
+            frame = view[index * self.__frameBytes:(index + 1) * self.__frameBytes]
+            if isSpeech[index]:
+                if self.__framesSinceSpeech == None:    # Speech onset. Send the pre-roll first
+                    forwarded.extend(self.__preRoll)
+                    self.__preRoll.clear()
+                self.__framesSinceSpeech = 0
+                forwarded.append(frame)
+            elif self.__framesSinceSpeech != None and self.__framesSinceSpeech < self.__hangoverFrames:
+                self.__framesSinceSpeech += 1
+                forwarded.append(frame)
+            else:
+                self.__framesSinceSpeech = None
+                self.__preRoll.append(bytes(frame))
+        output = b''.join(forwarded)
+        self.bytesForwarded += len(output)
+        return output
+
+    def reset(self):
+        """
+        Forgets the speech state, the pre-roll and any partial frame
+        """
+        self.__remainder = b''
+        self.__framesSinceSpeech = None
+        self.__preRoll.clear()
+
+    def statistics(self) -> dict:
+        """
+        Returns the counters and the fraction of audio suppressed
+
+        Returns
+        -------
+        dict :
+            Bytes received, bytes forwarded and the fraction suppressed
+        """
+        return {
+            'bytesIn': self.bytesIn,
+            'bytesForwarded': self.bytesForwarded,
+            'suppressed': 1.0 - self.bytesForwarded / self.bytesIn if self.bytesIn else 0.0
+        }
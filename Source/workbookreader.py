@@ -0,0 +1,196 @@
+#************************************************************************************************************************************************************************************
+# Copyright (c) 2021 Tony L. Jones
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this software and associated documentation files (the “Software”),
+# to deal in the Software without restriction, including without limitation the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the Software is furnished to do so, subject to the following conditions:
+# The above copyright notice and this permission notice shall be included in all copies or substantial portions of the Software.
+# THE SOFTWARE IS PROVIDED “AS IS”, WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+# DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE
+# OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+# The sound files were downloaded from https://www.fesliyanstudios.com
+#********************************************************************************************************************************************************************************
+
+
+import os
+import re
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+
+# Settings
+blockSize = 1000            # Number of rows read from the workbook in a single call
+maxRows = 1048576           # Number of rows in an Excel worksheet
+
+class WorkbookReader(ABC):
+    """
+        Reads blocks of cells from a workbook. Every call to readRange() is a single round trip to the workbook.
+
+        Attributes
+        ----------
+        roundTrips : int
+            Number of times the workbook was accessed
+
+        Methods
+        _______
+            readRange(sheetName, address)
+                Reads a rectangular range of cells
+            readRows(sheetName, firstColumn, lastColumn, firstRow)
+                Reads consecutive rows until a row with an empty cell is found
+            fingerprint()
+                Identifies the saved version of the workbook
+    """
+
+    def __init__(self):
+        self.roundTrips: int = 0
+
+    @abstractmethod
+    def readRange(self, sheetName: str, address: str) -> Tuple[Tuple[Any, ...], ...]:
+        """
+        Reads a rectangular range of cells in a single round trip
+
+        Parameters
+        ----------
+        sheetName : str
+            Name of the worksheet
+        address : str
+            Address of the range, e.g. 'D2:E1001'
+
+        Returns
+        -------
+        tuple :
+            A tuple of rows. Each row is a tuple of cell values. Empty cells are None
+        """
+
+    def fingerprint(self) -> Optional[Tuple[str, str]]:
+        """
+        Identifies the saved version of the workbook, so that settings read from it can be reused until it changes
+
+        Returns
+        -------
+        tuple :
+            The name of the workbook and a stamp that changes whenever the workbook is saved. None if the workbook
+            can not be identified or has unsaved changes
+        """
+        return None
+
+    def readRows(self, sheetName: str, firstColumn: str, lastColumn: str, firstRow: int) -> List[Tuple[Any, ...]]:
+        """
+        Reads the rows from firstRow downwards in blocks of blockSize rows, until a row with an empty cell is found
+
+        Parameters
+        ----------
+        sheetName : str
+            Name of the worksheet
+        firstColumn : str
+            First column of the block, e.g. 'D'
+        lastColumn : str
+            Last column of the block, e.g. 'E'
+        firstRow : int
+            Number of the first row to read
+
+        Returns
+        -------
+        list :
+            The rows read before the first row containing an empty cell
+        """
+        rows = []
+        row = firstRow
+        while row <= maxRows:
+            lastRow = min(row + blockSize - 1, maxRows)
+            block = self.readRange(sheetName, firstColumn + str(row) + ':' + lastColumn + str(lastRow))
+            for values in block:
+                if None in values:
+                    return rows
+                rows.append(tuple(values))
+            row = lastRow + 1
+        return rows
+
+class ExcelWorkbookReader(WorkbookReader):
+    """
+        Reads blocks of cells from an Excel workbook through COM using Range.Value
+    """
+
+    def __init__(self, wb: object):
+        """
+        Parameters
+        ----------
+        wb : object
+            The workbook object
+        """
+        super().__init__()
+        self.__wb = wb
+
+    def readRange(self, sheetName: str, address: str) -> Tuple[Tuple[Any, ...], ...]:
+        self.roundTrips += 1
+        values = self.__wb.Sheets(sheetName).Range(address).Value
+        if not isinstance(values, tuple):      # Range.Value returns a single value for a single cell
+            values = ((values,),)
+        return values
+
+    def fingerprint(self) -> Optional[Tuple[str, str]]:
+        try:
+            self.roundTrips += 1
+            if not self.__wb.Saved:     # The sheets may differ from the file on disk
+                return None
+            fullName = str(self.__wb.FullName)
+            fileStatus = os.stat(fullName)
+            return fullName, str(fileStatus.st_mtime_ns) + ':' + str(fileStatus.st_size)
+        except:
+            return None
+
+class MemoryWorkbookReader(WorkbookReader):
+    """
+        Reads blocks of cells from an in-memory workbook. Used to run GetSettings without Excel
+    """
+
+    def __init__(self, sheets: Dict[str, List[List[Any]]], fingerprint: Optional[Tuple[str, str]] = None):
+        """
+        Parameters
+        ----------
+        sheets : dict
+            Dictionary of worksheets keyed by name. Each worksheet is a list of rows starting at row 1, and each row
+            is a list of cell values starting at column A
+        fingerprint : tuple, optional
+            Value returned by fingerprint()
+        """
+        super().__init__()
+        self.__sheets = sheets
+        self.__fingerprint = fingerprint
+
+    def fingerprint(self) -> Optional[Tuple[str, str]]:
+        return self.__fingerprint
+
+    def readRange(self, sheetName: str, address: str) -> Tuple[Tuple[Any, ...], ...]:
+        self.roundTrips += 1
+        sheet = self.__sheets[sheetName]     # Raises KeyError if the sheet does not exist
+        cells = address.split(':')
+        firstRow, firstColumn = cellToIndices(cells[0])
+        lastRow, lastColumn = cellToIndices(cells[-1])
+        values = []
+        for row in range(firstRow, lastRow + 1):
+            rowValues = sheet[row] if row < len(sheet) else []
+            values.append(tuple(rowValues[column] if column < len(rowValues) else None for column in range(firstColumn, lastColumn + 1)))
+        return tuple(values)
+
+def cellToIndices(cell: str) -> Tuple[int, int]:
+    """
+    Converts a cell address to zero-based row and column indices
+
+    Parameters
+    ----------
+    cell : str
+        Cell address, e.g. 'D2'
+
+    Returns
+    -------
+    tuple :
+        The row and column indices, e.g. (1, 3)
+    """
+    match = re.fullmatch(r'\$?([A-Za-z]+)\$?([0-9]+)', cell.strip())
+    if match == None:
+        raise ValueError('Invalid cell address: ' + cell)
+    column = 0
+    for letter in match.group(1).upper():
+        column = column * 26 + ord(letter) - ord('A') + 1
+    return int(match.group(2)) - 1, column - 1
@@ -0,0 +1,81 @@
+"""
+    First-request latency of the Google clients with a cold and with a pre-warmed ChannelPool.
+
+    By default the clients connect to FakeGrpcServer on localhost without TLS, which shows the cost of setting up
+    the channel itself. With --google they connect to the Google APIs with the application default credentials
+    (GOOGLE_APPLICATION_CREDENTIALS), which adds the DNS lookup, the TLS handshake and the access token, and makes one
+    billed synthesis request per round.
+
+    Usage: python benchmarks/bench_channel_pool.py [--rounds 5] [--google]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Source'))
+import fakeservers
+import channelpool
+from google.cloud import speech, texttospeech
+
+def synthesize(client: object):
+    client.synthesize_speech(input=texttospeech.SynthesisInput(text='seven and a half'),
+                             voice=texttospeech.VoiceSelectionParams(language_code='en-US'),
+                             audio_config=texttospeech.AudioConfig(audio_encoding=texttospeech.AudioEncoding.LINEAR16))
+
+def recognize(client: object):
+    config = speech.StreamingRecognitionConfig(config=speech.RecognitionConfig(
+        encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16, sample_rate_hertz=16000, language_code='en-US'))
+    requests = (speech.StreamingRecognizeRequest(audio_content=bytes(3200)) for index in range(5))
+    for response in client.streaming_recognize(config, requests):
+        pass
+
+def runRound(warm: bool, arguments, server) -> dict:
+    """
+    Creates a pool and its clients, optionally warms it up, and times the first requests
+    """
+    if arguments.google:
+        pool = channelpool.ChannelPool()
+    else:
+        pool = channelpool.ChannelPool(server.endpoint, server.endpoint, secure=False)
+    speechClient = pool.speechClient()
+    textToSpeechClient = pool.textToSpeechClient()
+    warmUpTime = None
+    if warm:
+        startTime = time.perf_counter()
+        pool.warmUp()
+        pool.waitUntilReady()
+        warmUpTime = time.perf_counter() - startTime
+    startTime = time.perf_counter()
+    synthesize(textToSpeechClient)
+    synthesisLatency = time.perf_counter() - startTime
+    if not arguments.google:    # Streaming recognition is billed per 15 seconds
+        recognize(speechClient)
+    states = pool.channelStates()
+    pool.close()
+    return {'warmUpTime': warmUpTime, 'synthesisLatency': synthesisLatency, 'states': states}
+
+def main():
+    parser = argparse.ArgumentParser(description='First-request latency with a cold and a warm channel pool')
+    parser.add_argument('--rounds', type=int, default=5, help='number of pools created per mode')
+    parser.add_argument('--google', action='store_true', help='connect to the Google APIs instead of a local server')
+    arguments = parser.parse_args()
+    server = None
+    if not arguments.google:
+        server = fakeservers.FakeGrpcServer(fakeservers.FakeSpeechServer(16000, 0.0),
+                                            fakeservers.FakeSynthesisClient(0.0))
+        server.start()
+    for warm in (False, True):
+        rounds = [runRound(warm, arguments, server) for index in range(arguments.rounds)]
+        latencies = [round['synthesisLatency'] * 1000 for round in rounds]
+        print(f'{"Warm" if warm else "Cold"} pool: first synthesis request {statistics.mean(latencies):8.2f} ms mean,'
+              f' {max(latencies):8.2f} ms max', end='')
+        if warm:
+            print(f'  (warm-up {statistics.mean(round["warmUpTime"] for round in rounds) * 1000:.2f} ms in the background)', end='')
+        print(f'  states after the requests: {rounds[-1]["states"]}')
+    if server != None:
+        server.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+"""
+    End-to-end latency benchmark of the speech pipeline, without a microphone, speakers, Excel or Google.
+
+    Speech-to-text: WAV fixtures (16-bit mono, 16 kHz) are injected into AudioEngine in place of the microphone, at
+    the speed they were recorded or faster. SpeechToText streams them to FakeSpeechServer, which answers each
+    utterance after a configurable delay, and the phrases reach the fake workbook through MacroDispatcher, paced
+    like GradeBook. Mouth-to-cell latency is the time from the end of an utterance being injected to its macro call.
+
+    Text-to-speech: TextToSpeech synthesizes phrases with FakeSynthesisClient and plays them on a sink that records
+    when playback starts. Text-to-sound latency is the time from speak() to the start of playback, for new phrases
+    and for phrases found in the audio cache. This part needs the google-cloud-texttospeech package and is skipped
+    without it.
+
+    The throughput (phrases per second), the CPU time and the peak RSS of the process are recorded as well, and the
+    results are written as JSON so that releases can be compared.
+
+    Usage: python benchmarks/bench_end_to_end.py [--response-delay 0.2] [--synthesis-delay 0.1] [--speed 1]
+                                                 [--macro-interval 0.5] [--phrases 20] [--output results.json]
+                                                 [fixture.wav ...]
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import wave
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Source'))
+import fakeservers
+import audioengine
+import macrodispatcher
+import speechtotext
+
+sampleRate = 16000
+chunkSize = 1600                # 100 ms chunks, as in GradeBook
+resultsVersion = 1              # Increment when the format of the results changes
+
+def readFixture(path: str) -> bytes:
+    with wave.open(path, 'rb') as waveFile:
+        if waveFile.getnchannels() != 1 or waveFile.getsampwidth() != 2:
+            raise ValueError(path + ' must be 16-bit mono')
+        if waveFile.getframerate() != sampleRate:
+            raise ValueError(path + ' must be sampled at ' + str(sampleRate) + ' Hz')
+        return waveFile.readframes(waveFile.getnframes())
+
+def syntheticFixtures(directory: str) -> list:
+    """
+    Writes recordings of speech bursts between pauses, see bench_vad.py
+    """
+    import bench_vad
+    paths = []
+    for seed in range(2):
+        path = os.path.join(directory, f'synthetic{seed}.wav')
+        bench_vad.makeFixture(path, 60.0, seed)
+        paths.append(path)
+    return paths
+
+def summarize(values: list) -> dict:
+    """
+    Returns the count, mean, maximum and percentiles of latencies in seconds
+    """
+    if not values:
+        return {'count': 0}
+    values = sorted(values)
+
+    def percentile(fraction: float) -> float:
+        return values[min(len(values) - 1, int(fraction * len(values)))]
+
+    return {'count': len(values), 'mean': sum(values) / len(values), 'max': values[-1],
+            'p50': percentile(0.50), 'p95': percentile(0.95), 'p99': percentile(0.99)}
+
+def peakRss() -> int:
+    """
+    Returns the peak resident set size of the process in bytes
+    """
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except ImportError:     # Windows
+        import psutil
+        return psutil.Process().memory_info().peak_wset
+
+def runSpeechToText(fixtures: list, arguments) -> dict:
+    """
+    Injects the fixtures one after the other and measures the mouth-to-cell latency
+    """
+    server = fakeservers.FakeSpeechServer(sampleRate, arguments.response_delay)
+    dispatcher = macrodispatcher.MacroDispatcher(minimumInterval=arguments.macro_interval)
+    cellTimes = []
+
+    def runMacro(macroName: str, argument1: object = None, argument2: object = None) -> bool:
+        if macroName in ('receiveText', macrodispatcher.batchTextMacro):
+            count = len(argument1) if isinstance(argument1, tuple) else 1
+            cellTimes.extend([time.perf_counter()] * count)
+        return True
+
+    def callExcelMacro(macroName: str, argument1: object = None, argument2: object = None):
+        dispatcher.call(macroName, argument1, argument2)
+
+    stopFlushing = threading.Event()
+
+    def flushMacros():
+        while not stopFlushing.wait(0.005):
+            dispatcher.flush(runMacro)
+
+    flusher = threading.Thread(target=flushMacros, daemon=True)
+    flusher.start()
+    engine = audioengine.AudioEngine(sampleRate, chunkSize, openDevice=False)
+    try:
+        import google.cloud.speech
+        client = 'google-api'
+        speech = speechtotext.SpeechToText(engine, 'en-US', [], {}, callExcelMacro, sampleRate, print,
+                                           googleAPIClient=server)
+    except ImportError:
+        client = 'recognizer'
+        speech = speechtotext.SpeechToText(engine, 'en-US', [], {}, callExcelMacro, sampleRate, print,
+                                           recognizer=fakeservers.FakeRecognizer(server))
+    speech.resume()
+    speech.start()
+    chunkBytes = chunkSize * 2
+    utteranceEndTimes = []          # Time at which the end of each utterance was injected
+    audioSeconds = 0.0
+    startTime = time.perf_counter()
+    startCpu = time.process_time()
+    for audio in fixtures:
+        audio += bytes(sampleRate * 2)      # One second of silence, so that the last utterance ends
+        ends = fakeservers.findUtterances(audio, sampleRate, chunkBytes)
+        injectTimes = []
+        fixtureStart = time.perf_counter()
+        for number, start in enumerate(range(0, len(audio), chunkBytes)):
+            delay = fixtureStart + number * chunkSize / sampleRate / arguments.speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            engine.injectFrames(audio[start:start + chunkBytes])
+            injectTimes.append(time.perf_counter())
+        for end in ends:
+            utteranceEndTimes.append(injectTimes[min(len(injectTimes) - 1, int(end * sampleRate * 2 / chunkBytes + 0.5) - 1)])
+        audioSeconds += len(audio) / (sampleRate * 2)
+    # Wait for the last results
+    deadline = time.perf_counter() + arguments.response_delay + arguments.macro_interval + 5.0
+    while len(cellTimes) < len(utteranceEndTimes) and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - startTime
+    cpu = time.process_time() - startCpu
+    speech.stop()
+    stopFlushing.set()
+    flusher.join()
+    latencies = [cell - end for end, cell in zip(utteranceEndTimes, cellTimes)]
+    return {
+        'client': client,
+        'utterances': len(utteranceEndTimes),
+        'phrases': len(cellTimes),
+        'audioSeconds': audioSeconds,
+        'elapsedSeconds': elapsed,
+        'phrasesPerSecond': len(cellTimes) / elapsed,
+        'cpuSeconds': cpu,
+        'cpuPercent': cpu / elapsed * 100,
+        'mouthToCell': summarize(latencies),
+        'macroCalls': dispatcher.statistics(),
+    }
+
+def runTextToSpeech(arguments) -> dict:
+    """
+    Speaks new and cached phrases one at a time and measures the text-to-sound latency
+    """
+    try:
+        import google.cloud.texttospeech
+    except ImportError as exception:
+        return {'skipped': repr(exception)}
+    import texttospeech
+    from audiocache import AudioCache
+    sink = fakeservers.TimingSink()
+    client = fakeservers.FakeSynthesisClient(arguments.synthesis_delay)
+    speaker = texttospeech.TextToSpeech('en-US', 'en-US-Standard-A', 'neutral', 'characters', lambda *arguments: None,
+                                        print, AudioCache(), sink, client)
+    speaker.start()
+    phrases = [f'student {index} seven and a half' for index in range(arguments.phrases)]
+    results = {}
+    startTime = time.perf_counter()
+    startCpu = time.process_time()
+    for name, texts in (('new', phrases), ('cached', phrases)):
+        latencies = []
+        for text in texts:
+            with sink.played:
+                played = len(sink.startTimes)
+                speakTime = time.perf_counter()
+                speaker.speak(text)
+                sink.played.wait_for(lambda: len(sink.startTimes) > played, timeout=10.0)
+                if len(sink.startTimes) > played:
+                    latencies.append(sink.startTimes[played] - speakTime)
+        results[name] = summarize(latencies)
+    elapsed = time.perf_counter() - startTime
+    cpu = time.process_time() - startCpu
+    speaker.stop(0.5)
+    return {
+        'textToSound': results,
+        'phrasesPerSecond': 2 * len(phrases) / elapsed,
+        'synthesisRequests': client.requests,
+        'cpuSeconds': cpu,
+        'cpuPercent': cpu / elapsed * 100,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end latency benchmark of the speech pipeline')
+    parser.add_argument('fixtures', nargs='*', help='16-bit mono 16 kHz WAV files. Synthetic fixtures without them')
+    parser.add_argument('--response-delay', type=float, default=0.2, help='seconds before the speech server answers')
+    parser.add_argument('--synthesis-delay', type=float, default=0.1, help='seconds before the synthesis server answers')
+    parser.add_argument('--speed', type=float, default=1.0, help='injection speed relative to real time')
+    parser.add_argument('--macro-interval', type=float, default=0.5, help='minimum seconds between macro calls, as in GradeBook')
+    parser.add_argument('--phrases', type=int, default=20, help='number of phrases spoken')
+    parser.add_argument('--output', help='JSON file to write the results to')
+    arguments = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        paths = arguments.fixtures or syntheticFixtures(directory)
+        fixtures = [readFixture(path) for path in paths]
+    results = {
+        'version': resultsVersion,
+        'time': time.time(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'configuration': {
+            'fixtures': [os.path.basename(path) for path in paths],
+            'responseDelay': arguments.response_delay,
+            'synthesisDelay': arguments.synthesis_delay,
+            'speed': arguments.speed,
+            'macroInterval': arguments.macro_interval,
+            'phrases': arguments.phrases,
+        },
+        'speechToText': runSpeechToText(fixtures, arguments),
+        'textToSpeech': runTextToSpeech(arguments),
+        'peakRssBytes': peakRss(),
+    }
+    text = json.dumps(results, indent=2)
+    if arguments.output:
+        with open(arguments.output, 'w', encoding='utf-8') as outputFile:
+            outputFile.write(text + '\n')
+    print(text)
+
+if __name__ == '__main__':
+    main()
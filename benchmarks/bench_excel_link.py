@@ -0,0 +1,80 @@
+"""
+    Headless load test of the Excel link: FakeExcel replays a session over a Unix domain socket to PipeClient, and
+    every message is answered with a macro call through MacroDispatcher, as GradeBook does.
+
+    Reports the message throughput, the latency from sending a message to processing it, and the latency from
+    sending a message to the macro call that answers it reaching Excel.
+
+    Usage: python benchmarks/bench_excel_link.py [--session session.jsonl] [--messages 20000] [--speed 0]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Source'))
+import fakeexcel
+import macrodispatcher
+import pipeclient
+import transport
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else float('nan')
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test of the Excel link')
+    parser.add_argument('--session', help='recorded session (JSON lines). A synthetic session is used without it')
+    parser.add_argument('--messages', type=int, default=20000, help='number of messages of the synthetic session')
+    parser.add_argument('--speed', type=float, default=0.0, help='replay speed, 0 to send as fast as possible')
+    arguments = parser.parse_args()
+    session = fakeexcel.loadSession(arguments.session) if arguments.session else \
+        fakeexcel.makeSession(arguments.messages, 0.01)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'excel.sock')
+        excel = fakeexcel.FakeExcel(path, session, arguments.speed)
+        excel.start()
+        dispatcher = macrodispatcher.MacroDispatcher()
+        receiveTimes = []
+
+        def processIncomingMessage(message: str):
+            receiveTimes.append(time.perf_counter())
+            dispatcher.call('receiveText', message, 0)
+            dispatcher.flush(excel.runMacro)
+
+        client = pipeclient.PipeClient(path, processIncomingMessage, 5, print,
+                                       transport=transport.UnixSocketTransport(path, 5))
+        client.openPipe()
+        startTime = time.perf_counter()
+        expected = sum(1 for event in session if 'message' in event)
+        while len(receiveTimes) < expected and time.perf_counter() - startTime < 600:
+            client.readFromExcel(0.01)
+            dispatcher.flush(excel.runMacro)
+        while dispatcher.pending() > 0:
+            time.sleep(macrodispatcher.coalesceWindow)
+            dispatcher.flush(excel.runMacro)
+        elapsed = time.perf_counter() - startTime
+        client.close()
+        excel.close()
+    deliveryLatencies = [received - sent for sent, received in zip(excel.sendTimes, receiveTimes)]
+    # A macro call answers every message received since the previous one, so the latency of a message is the time
+    # until the first macro call made after it was received
+    macroLatencies = []
+    callIndex = 0
+    for sent, received in zip(excel.sendTimes, receiveTimes):
+        while callIndex < len(excel.macroCalls) and excel.macroCalls[callIndex][0] < received:
+            callIndex += 1
+        if callIndex < len(excel.macroCalls):
+            macroLatencies.append(excel.macroCalls[callIndex][0] - sent)
+    print(f'Messages: {len(receiveTimes)} of {expected} in {elapsed:.2f} s ({len(receiveTimes) / elapsed:,.0f} messages/s)')
+    for name, latencies in (('Message delivery', deliveryLatencies), ('Message to macro', macroLatencies)):
+        print(f'{name + " latency:":26s} p50 {percentile(latencies, 0.5) * 1000:7.2f} ms'
+              f'  p95 {percentile(latencies, 0.95) * 1000:7.2f} ms  p99 {percentile(latencies, 0.99) * 1000:7.2f} ms'
+              f'  mean {statistics.mean(latencies or [float("nan")]) * 1000:7.2f} ms')
+    counters = dispatcher.statistics()
+    print(f'Macro calls: {counters["calls"]} queued, {counters["macrosRun"]} run, {counters["coalesced"]} coalesced')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+    Throughput benchmark of the GradeGrammar used by SpeechToText to normalize dictated grades.
+
+    Parses a mixture of dictated grades, commands and other phrases (names, comments) and reports the number of
+    phrases parsed per second, and the number of characters sent to Excel with and without normalization.
+
+    Usage: python benchmarks/bench_gradegrammar.py [numberOfPhrases] [languageCode]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Source'))
+from gradegrammar import GradeGrammar
+
+numberOfPhrases = 100000
+
+phraseTemplates = {
+    'en': {
+        'grades': ['seven and a half', '7 point 5', 'seven five', 'eight', 'six point two five', 'nine and three quarters',
+                   'twenty five', 'ninety nine point five', 'one hundred', '7.5', '8,5 next', 'five next', 'ten'],
+        'commands': ['next', 'back', 'skip', 'previous'],
+        'other': ['well done', 'Emma Johnson', 'late submission', 'see me after class', 'absent'],
+    },
+    'nl': {
+        'grades': ['zeven en een half', 'zeven komma vijf', 'zeven vijf', 'acht', 'zes komma twee vijf',
+                   'negen en driekwart', 'vijfentwintig', 'honderd', '7,5', 'acht volgende', 'tien'],
+        'commands': ['volgende', 'terug', 'overslaan', 'vorige'],
+        'other': ['goed gedaan', 'Emma de Vries', 'te laat ingeleverd', 'afwezig'],
+    },
+}
+
+def makePhrases(languageCode: str, count: int) -> list:
+    """
+    Builds a list of phrases: mostly grades, some commands and some other text
+    """
+    templates = phraseTemplates[languageCode.split('-')[0]]
+    random.seed(11)
+    phrases = []
+    for _ in range(count):
+        draw = random.random()
+        kind = 'grades' if draw < 0.7 else 'commands' if draw < 0.9 else 'other'
+        phrases.append(random.choice(templates[kind]))
+    return phrases
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else numberOfPhrases
+    languageCode = sys.argv[2] if len(sys.argv) > 2 else 'en-US'
+    phrases = makePhrases(languageCode, count)
+    startTime = time.perf_counter()
+    grammar = GradeGrammar(languageCode, {})
+    buildTime = time.perf_counter() - startTime
+    startTime = time.perf_counter()
+    grades = [grammar.parse(phrase) for phrase in phrases]
+    parseTime = time.perf_counter() - startTime
+    normalized = sum(1 for grade in grades if grade != None)
+    textCharacters = sum(len(phrase) for phrase in phrases)
+    sentCharacters = sum(len(phrase) if grade == None else len(grade.toMessage()) for phrase, grade in zip(phrases, grades))
+    print(f'Phrases: {count}, language: {languageCode}, normalized: {normalized / count * 100:.1f} %')
+    print(f'Build time:       {buildTime * 1000:9.2f} ms')
+    print(f'Parse time:       {parseTime * 1000:9.2f} ms ({parseTime / count * 1e6:6.2f} us/phrase, {count / parseTime:,.0f} phrases/s)')
+    print(f'Characters sent:  {sentCharacters:,} instead of {textCharacters:,} ({sentCharacters / textCharacters * 100:.0f} %)')
+
+if __name__ == '__main__':
+    main()
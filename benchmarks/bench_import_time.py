@@ -0,0 +1,72 @@
+"""
+    Import-time regression check of the modules that GradeBook imports before the startup steps begin.
+
+    Runs a fresh interpreter with -X importtime, reports the cumulative import time of each module, and fails (exit
+    code 1) if one of the heavy libraries that the startup steps import in the background is imported eagerly, or if
+    the total import time exceeds the budget. GradeBook.pyw itself needs Windows, so the modules it imports are
+    checked instead; the Windows-only ones are skipped on other platforms.
+
+    Usage: python benchmarks/bench_import_time.py [--budget 0.25] [--repeat 3]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+sourceDirectory = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Source')
+# Modules imported at the top of GradeBook.pyw, apart from the standard library and the Windows extensions
+startupModules = ['getsettings', 'audiocache', 'macrodispatcher', 'metrics', 'speechtotext', 'recognizer',
+                  'pipeclient', 'startup', 'texttospeech']
+# Libraries that only the startup steps may import
+deferredModules = ['grpc', 'google.cloud.speech', 'google.cloud.texttospeech', 'google.protobuf', 'numpy', 'pyaudio',
+                   'audioengine', 'channelpool']
+
+def measure() -> dict:
+    """
+    Imports the startup modules in a new interpreter
+
+    Returns
+    -------
+    dict :
+        Cumulative import time in seconds of each module that was imported, by module name
+    """
+    # The interpreter also reports imports that failed, e.g. of optional libraries, so the modules that were loaded
+    # are listed on stdout
+    code = 'import ' + ', '.join(startupModules) + '; import sys; print("\\n".join(sys.modules))'
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=sourceDirectory,
+                             capture_output=True, text=True)
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr)
+    loaded = set(process.stdout.split())
+    times = {}
+    for line in process.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        fields = line[len('import time:'):].split('|')
+        name = fields[2].strip()
+        if name in loaded:
+            times[name] = int(fields[1]) / 1e6
+    return times
+
+def main():
+    parser = argparse.ArgumentParser(description='Import-time regression check of the startup modules')
+    parser.add_argument('--budget', type=float, default=0.25, help='maximum total import time in seconds')
+    parser.add_argument('--repeat', type=int, default=3, help='number of measurements; the fastest one counts')
+    arguments = parser.parse_args()
+    runs = [measure() for index in range(arguments.repeat)]
+    times = min(runs, key=lambda run: sum(run.get(module, 0.0) for module in startupModules))
+    total = 0.0
+    for module in startupModules:
+        total += times.get(module, 0.0)     # A module imported by an earlier one costs nothing more
+        print(f'{module:20s} {times.get(module, 0.0) * 1000:8.1f} ms')
+    print(f'{"Total":20s} {total * 1000:8.1f} ms (budget {arguments.budget * 1000:.0f} ms)')
+    failures = [f'{module} is imported at startup' for module in deferredModules if module in times]
+    if total > arguments.budget:
+        failures.append(f'the startup modules take {total * 1000:.1f} ms to import')
+    for failure in failures:
+        print('FAIL: ' + failure)
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
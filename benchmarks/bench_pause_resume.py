@@ -0,0 +1,142 @@
+"""
+    Pause/resume benchmark of AudioEngine and SpeechToText, without a microphone or Google.
+
+    A simulated microphone injects audio in real time, in the 100 ms chunks of GradeBook. The speaker starts a
+    one-second utterance shortly before resume() is called, as when the resume request is sent while the teacher
+    already speaks. Two modes are compared: 'gate' (softwarePause, the microphone keeps running and the pre-roll is
+    replayed) and 'device' (the microphone is stopped while paused and takes --restart-delay seconds to restart,
+    like PortAudio's start_stream()).
+
+    Reports, per mode, the milliseconds of the utterance that never reached the recognizer, the time from the
+    resume request to the first audio reaching the recognizer, and the audio uploaded while paused.
+
+    Usage: python benchmarks/bench_pause_resume.py [--trials 5] [--lead 0.2] [--restart-delay 0.15] [--pause 1.0]
+"""
+import argparse
+import array
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Source'))
+import audioengine
+import speechtotext
+from recognizer import Recognizer
+
+sampleRate = 16000
+chunkSize = 1600                # 100 ms chunks, as in GradeBook
+speechLevel = 3000              # Sample value of the utterance. The rest is silence
+utteranceDuration = 1.0
+
+class Microphone(object):
+    """
+    Injects silence, or the utterance once it has started, into the engine in real time
+    """
+
+    def __init__(self, engine: audioengine.AudioEngine):
+        self.__engine = engine
+        self.position = 0               # Samples captured so far
+        self.speechStart = None         # Sample at which the utterance starts
+        self.stopped = False            # Stopped device: time passes but nothing is captured
+        self.__stop = threading.Event()
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def __run(self):
+        startTime = time.perf_counter()
+        while not self.__stop.is_set():
+            delay = startTime + (self.position + chunkSize) / sampleRate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            samples = array.array('h', bytes(chunkSize * 2))
+            if self.speechStart != None:
+                for index in range(chunkSize):
+                    if 0 <= self.position + index - self.speechStart < utteranceDuration * sampleRate:
+                        samples[index] = speechLevel
+            self.position += chunkSize
+            if not self.stopped:
+                self.__engine.injectFrames(samples.tobytes())
+
+    def close(self):
+        self.__stop.set()
+        self.__thread.join()
+
+class RecordingRecognizer(Recognizer):
+    """
+    Records when each chunk of audio would have been uploaded. Returns no results
+    """
+
+    def __init__(self):
+        self.chunks = []                # (time, chunk)
+
+    def streamingRecognize(self, audioChunks):
+        for chunk in audioChunks:
+            self.chunks.append((time.perf_counter(), chunk))
+        return iter(())
+
+    def cancel(self):
+        pass
+
+def speechSamples(chunk: bytes) -> int:
+    return sum(1 for sample in array.array('h', chunk) if sample == speechLevel)
+
+def runTrial(mode: str, arguments) -> dict:
+    """
+    Speaks one utterance across a resume and returns what reached the recognizer
+    """
+    audioengine.softwarePause = mode == 'gate'
+    engine = audioengine.AudioEngine(sampleRate, chunkSize, openDevice=False)
+    recognizer = RecordingRecognizer()
+    speech = speechtotext.SpeechToText(engine, 'en-US', [], {}, lambda *arguments: None, sampleRate, print,
+                                       recognizer=recognizer)
+    microphone = Microphone(engine)
+    engine.resume()
+    speech.resume()
+    speech.start()
+    time.sleep(0.5)
+    engine.pause()
+    speech.pause()
+    microphone.stopped = mode == 'device'
+    pauseTime = time.perf_counter()
+    time.sleep(arguments.pause)
+    microphone.speechStart = microphone.position        # The teacher starts speaking
+    time.sleep(arguments.lead)
+    resumeTime = time.perf_counter()                    # The resume request arrives
+    if mode == 'device':
+        time.sleep(arguments.restart_delay)             # start_stream() blocks while the device restarts
+    engine.resume()
+    microphone.stopped = False
+    speech.resume()
+    time.sleep(utteranceDuration + 0.5)
+    speech.stop()
+    microphone.close()
+    # Let the stream of the first resume drain before the pause
+    uploadedWhilePaused = sum(len(chunk) for sent, chunk in recognizer.chunks if pauseTime + 0.1 < sent < resumeTime)
+    afterResume = [(sent, chunk) for sent, chunk in recognizer.chunks if sent >= resumeTime]
+    received = sum(speechSamples(chunk) for _, chunk in afterResume)
+    return {
+        'clipped': (utteranceDuration * sampleRate - received) / sampleRate,
+        'firstAudio': afterResume[0][0] - resumeTime if afterResume else float('nan'),
+        'uploadedWhilePaused': uploadedWhilePaused,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Pause/resume benchmark of the audio engine')
+    parser.add_argument('--trials', type=int, default=5, help='number of resumes per mode')
+    parser.add_argument('--lead', type=float, default=0.2, help='seconds of speech before the resume request arrives')
+    parser.add_argument('--restart-delay', type=float, default=0.15, help='seconds taken by the device to restart')
+    parser.add_argument('--pause', type=float, default=1.0, help='seconds paused before each resume')
+    arguments = parser.parse_args()
+    print(f'Speech starts {arguments.lead * 1000:.0f} ms before the resume request, '
+          f'device restart {arguments.restart_delay * 1000:.0f} ms, '
+          f'pre-roll {audioengine.resumePreRollDuration * 1000:.0f} ms')
+    for mode in ('device', 'gate'):
+        trials = [runTrial(mode, arguments) for _ in range(arguments.trials)]
+        print(f'{mode:7s} clipped {statistics.mean(trial["clipped"] for trial in trials) * 1000:6.1f} ms'
+              f'  resume to first audio {statistics.mean(trial["firstAudio"] for trial in trials) * 1000:6.1f} ms'
+              f'  uploaded while paused {sum(trial["uploadedWhilePaused"] for trial in trials):,} bytes')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+    Benchmark of the speech recognizers that SpeechToText can use.
+
+    The same WAV fixtures (16-bit mono, 16 kHz) are streamed to each engine in 100 ms chunks, in real time or as
+    fast as the engine accepts them. For each engine, the latency of the final results (time from sending the last
+    chunk before the result to receiving it), the real-time factor and the CPU time of this process are reported,
+    with the transcripts, so that accuracy can be compared by eye. Engines that cannot be created, e.g. because
+    there are no Google credentials or Vosk is not installed, are skipped.
+
+    Usage: python benchmarks/bench_recognizers.py [--engines google,local] [--model path] [--language en-US]
+                                                  [--phrases phrases.txt] [--realtime] fixture.wav [...]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import wave
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Source'))
+import recognizer
+
+sampleRate = 16000
+chunkDuration = 0.1         # Same as the chunks captured by GradeBook
+
+def readFixture(path: str) -> bytes:
+    with wave.open(path, 'rb') as waveFile:
+        if waveFile.getnchannels() != 1 or waveFile.getsampwidth() != 2:
+            raise ValueError(path + ' must be 16-bit mono')
+        if waveFile.getframerate() != sampleRate:
+            raise ValueError(path + ' must be sampled at ' + str(sampleRate) + ' Hz')
+        return waveFile.readframes(waveFile.getnframes())
+
+def run(engine: recognizer.Recognizer, audio: bytes, realTime: bool) -> dict:
+    chunkBytes = int(sampleRate * chunkDuration) * 2
+    sendTimes = []
+
+    def chunks():
+        startTime = time.perf_counter()
+        for number, start in enumerate(range(0, len(audio), chunkBytes)):
+            if realTime:
+                delay = startTime + number * chunkDuration - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            sendTimes.append(time.perf_counter())
+            yield audio[start:start + chunkBytes]
+
+    latencies = []
+    transcripts = []
+    startTime = time.perf_counter()
+    startCpu = time.process_time()
+    for result in engine.streamingRecognize(chunks()):
+        if result.isFinal:
+            latencies.append(time.perf_counter() - sendTimes[-1])
+            transcripts.append(result.transcript)
+    return {
+        'elapsed': time.perf_counter() - startTime,
+        'cpu': time.process_time() - startCpu,
+        'latencies': latencies,
+        'transcripts': transcripts,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the latency and CPU use of the speech recognizers')
+    parser.add_argument('fixtures', nargs='+', help='16-bit mono 16 kHz WAV files')
+    parser.add_argument('--engines', default='google,local', help='comma separated list of engines')
+    parser.add_argument('--model', default='', help='directory of the local speech model')
+    parser.add_argument('--language', default='en-US', help='language code for Google')
+    parser.add_argument('--phrases', help='text file with one common phrase per line')
+    parser.add_argument('--realtime', action='store_true', help='stream the audio at the speed it was recorded')
+    arguments = parser.parse_args()
+    commonPhrases = []
+    if arguments.phrases:
+        with open(arguments.phrases, encoding='utf-8') as phrasesFile:
+            commonPhrases = [line.strip() for line in phrasesFile if line.strip() != '']
+    fixtures = [(path, readFixture(path)) for path in arguments.fixtures]
+    for engineName in arguments.engines.split(','):
+        try:
+            engine = recognizer.createRecognizer(engineName, arguments.language, commonPhrases, sampleRate,
+                                                 localModelPath=arguments.model)
+        except Exception as exception:
+            print(f'{engineName:8s} skipped: {exception!r}')
+            continue
+        for path, audio in fixtures:
+            seconds = len(audio) / 2 / sampleRate
+            measurement = run(engine, audio, arguments.realtime)
+            latencies = measurement['latencies'] or [float('nan')]
+            print(f'{engineName:8s} {os.path.basename(path):20s} {seconds:6.1f} s'
+                  f'  latency median {statistics.median(latencies) * 1000:6.0f} ms  max {max(latencies) * 1000:6.0f} ms'
+                  f'  {seconds / measurement["elapsed"]:6.1f}x real time'
+                  f'  CPU {measurement["cpu"] / seconds * 100:5.1f} % of audio duration')
+            for transcript in measurement['transcripts']:
+                print(f'{"":10s}{transcript}')
+
+if __name__ == '__main__':
+    main()
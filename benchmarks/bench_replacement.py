@@ -0,0 +1,81 @@
+"""
+    Micro-benchmark comparing the compiled TextReplacer with the original loop of str.replace calls used by
+    SpeechToText.__replaceText.
+
+    Usage: python benchmarks/bench_replacement.py [numberOfTranscripts] [numberOfReplacements]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Source'))
+from textreplacer import TextReplacer
+
+numberOfTranscripts = 10000
+numberOfReplacements = 300
+
+def makeReplacementDictionary(size: int) -> dict:
+    """
+    Builds a replacement dictionary similar to a large "Settings" sheet: student names and spoken numbers
+    """
+    numbers = ['zero', 'one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine', 'ten']
+    replacements = {}
+    for index, number in enumerate(numbers):
+        replacements[number] = str(index)
+        replacements['point ' + number] = '.' + str(index)
+    random.seed(42)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    while len(replacements) < size:
+        name = ''.join(random.choice(letters) for _ in range(random.randint(4, 9)))
+        replacements[name] = name.capitalize()
+    return replacements
+
+def makeTranscripts(replacements: dict, count: int) -> list:
+    """
+    Builds a list of transcripts containing a mixture of keys and other words
+    """
+    random.seed(7)
+    keys = list(replacements)
+    fillers = ['next', 'back', 'mark', 'for', 'student', 'and', 'a', 'half']
+    transcripts = []
+    for _ in range(count):
+        words = [random.choice(keys) if random.random() < 0.5 else random.choice(fillers) for _ in range(random.randint(2, 8))]
+        transcripts.append(' '.join(words))
+    return transcripts
+
+def loopReplace(replacements: dict, text: str) -> str:
+    """
+    The original implementation: one str.replace call per key
+    """
+    for key in replacements:
+        text = text.replace(key, replacements[key])
+    return text
+
+def timeIt(function, transcripts: list) -> float:
+    """
+    Returns the time in seconds needed to run function over all the transcripts
+    """
+    startTime = time.perf_counter()
+    for transcript in transcripts:
+        function(transcript)
+    return time.perf_counter() - startTime
+
+def main():
+    transcripts = int(sys.argv[1]) if len(sys.argv) > 1 else numberOfTranscripts
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else numberOfReplacements
+    replacements = makeReplacementDictionary(size)
+    texts = makeTranscripts(replacements, transcripts)
+    startTime = time.perf_counter()
+    replacer = TextReplacer(replacements)
+    compileTime = time.perf_counter() - startTime
+    loopTime = timeIt(lambda text: loopReplace(replacements, text), texts)
+    compiledTime = timeIt(replacer.replace, texts)
+    print(f'Transcripts: {transcripts}, replacements: {len(replacements)}')
+    print(f'Loop of str.replace:   {loopTime * 1000:9.2f} ms ({loopTime / transcripts * 1e6:7.2f} us/transcript)')
+    print(f'Compiled TextReplacer: {compiledTime * 1000:9.2f} ms ({compiledTime / transcripts * 1e6:7.2f} us/transcript)')
+    print(f'Compile time:          {compileTime * 1000:9.2f} ms')
+    print(f'Speed-up:              {loopTime / compiledTime:9.2f}x')
+
+if __name__ == '__main__':
+    main()
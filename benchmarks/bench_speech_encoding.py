@@ -0,0 +1,109 @@
+"""
+    Compares the encodings of the audio uploaded to Google: LINEAR16 (raw PCM), FLAC and OGG_OPUS.
+
+    A fixture (16-bit mono 16 kHz WAV, or a synthetic recording of speech bursts) is encoded in 100 ms chunks as
+    GoogleRecognizer does. For every encoding the benchmark reports the bytes on the wire, the CPU time of the
+    encoder per second of audio, and the mouth-to-server latency of the audio over an uplink of a given bandwidth:
+    the chunks are captured in real time, encoded, and queued on the link, and the latency of a sample is the time
+    from its capture to the arrival of the bytes that hold it at the server. This is the part of the end-to-end
+    latency that depends on the encoding; recognition and the Excel calls take the same time. The latency includes
+    the wait for the end of the 100 ms chunk, the audio that the encoder holds back, and the queue on the link,
+    which keeps growing when the uplink is slower than the encoded stream.
+
+    Encodings whose library is not installed (pyflac, opuslib) are skipped.
+
+    Usage: python benchmarks/bench_speech_encoding.py [--uplink 2000 256 128] [fixture.wav]
+"""
+import argparse
+import bisect
+import os
+import sys
+import tempfile
+import time
+import wave
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Source'))
+import audioencoder
+
+sampleRate = 16000
+chunkSize = 1600                # 100 ms chunks, as in GradeBook
+encodings = ['LINEAR16', 'FLAC', 'OGG_OPUS']
+
+def encodeChunks(audio: bytes, encoding: str) -> list:
+    """
+    Encodes the audio in chunks
+
+    Returns
+    -------
+    list :
+        (capture time, encode time, bytes output, samples covered so far) per chunk, times in seconds
+    """
+    encoder = audioencoder.createEncoder(encoding, sampleRate)
+    chunkBytes = chunkSize * 2
+    emissions = []
+    for start in range(0, len(audio), chunkBytes):
+        startTime = time.process_time()
+        data = encoder.encode(audio[start:start + chunkBytes])
+        encodeTime = time.process_time() - startTime
+        captureTime = (start + chunkBytes) / (sampleRate * 2)      # The chunk is complete when its last sample is captured
+        emissions.append((captureTime, encodeTime, len(data), encoder.samplesOut))
+    data = encoder.flush()
+    emissions.append((len(audio) / (sampleRate * 2), 0.0, len(data), encoder.samplesOut))
+    return emissions
+
+def uploadLatencies(emissions: list, numberOfSamples: int, uplink: float, step: int = 16) -> list:
+    """
+    Queues the encoded chunks on a link of uplink bits per second, and returns the latency of every step-th sample
+    """
+    samplesCovered = []     # Samples covered by the encoded audio that reached the server ...
+    arrivalTimes = []       # ... at these times
+    linkFree = 0.0
+    for captureTime, encodeTime, size, samplesOut in emissions:
+        linkFree = max(captureTime + encodeTime, linkFree) + size * 8 / uplink
+        samplesCovered.append(samplesOut)
+        arrivalTimes.append(linkFree)
+    latencies = []
+    for sample in range(0, numberOfSamples, step):
+        index = min(bisect.bisect_right(samplesCovered, sample), len(arrivalTimes) - 1)
+        latencies.append(arrivalTimes[index] - (sample + 1) / sampleRate)
+    return latencies
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else float('nan')
+
+def main():
+    parser = argparse.ArgumentParser(description='Compares the encodings of the uploaded audio')
+    parser.add_argument('fixture', nargs='?', help='16-bit mono 16 kHz WAV file. A synthetic recording without it')
+    parser.add_argument('--uplink', type=float, nargs='+', default=[2000, 256, 128], help='uplink bandwidths in kbit/s')
+    arguments = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        path = arguments.fixture
+        if path == None:
+            import bench_vad
+            path = os.path.join(directory, 'synthetic.wav')
+            bench_vad.makeFixture(path, 60.0, 0)
+        with wave.open(path, 'rb') as waveFile:
+            audio = waveFile.readframes(waveFile.getnframes())
+    seconds = len(audio) / (sampleRate * 2)
+    print(f'{seconds:.0f} s of audio')
+    print(f'{"Encoding":10s} {"kbit/s":>8s} {"ratio":>6s} {"CPU ms/s":>9s}'
+          + ''.join(f' {"p50/p95 ms @" + format(uplink, ".0f") + " kbit/s":>26s}' for uplink in arguments.uplink))
+    for encoding in encodings:
+        try:
+            emissions = encodeChunks(audio, encoding)
+        except ImportError as exception:
+            print(f'{encoding:10s} skipped: {exception}')
+            continue
+        totalBytes = sum(size for captureTime, encodeTime, size, samplesOut in emissions)
+        cpu = sum(encodeTime for captureTime, encodeTime, size, samplesOut in emissions)
+        line = (f'{encoding:10s} {totalBytes * 8 / seconds / 1000:8.1f} {totalBytes / len(audio):6.3f}'
+                f' {cpu / seconds * 1000:9.2f}')
+        for uplink in arguments.uplink:
+            latencies = uploadLatencies(emissions, len(audio) // 2, uplink * 1000)
+            line += f' {percentile(latencies, 0.5) * 1000:12.1f} /{percentile(latencies, 0.95) * 1000:11.1f}'
+        print(line)
+    print('Mouth-to-server latency of the audio. Waiting for the end of the 100 ms chunk accounts for 50 ms at p50')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""
+    Checks the rotation of the streaming requests of SpeechToText against FakeGrpcServer on localhost.
+
+    streamingLimit is shortened so that the stream is rotated every few seconds while utterances are injected in
+    real time. Every 10 ms block of the injected audio carries its number, so that the audio each call received can
+    be traced. The check fails if a block never reached the server, if audio other than the unfinalized audio of
+    the previous call was sent again at the start of a call, or if an utterance was not recognized exactly once.
+
+    Usage: python benchmarks/bench_stream_rotation.py [--seconds 12] [--limit 2.5] [--response-delay 0.5]
+"""
+import argparse
+import array
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Source'))
+import fakeservers
+import audioengine
+import speechtotext
+
+sampleRate = 16000
+chunkSize = 1600                # 100 ms chunks, as in GradeBook
+blockSize = 160                 # Samples per numbered block
+speechLevel = 3000              # Amplitude of the utterances
+
+class RecordingSpeechServer(fakeservers.FakeSpeechServer):
+    """
+    Keeps the audio received on every call
+    """
+
+    def __init__(self, *arguments, **keywordArguments):
+        super().__init__(*arguments, **keywordArguments)
+        self.audio = []             # bytearray per call
+
+    def streaming_recognize(self, config, requests):
+        received = bytearray()
+        self.audio.append(received)
+
+        def recordedRequests():
+            for request in requests:
+                received.extend(request.audio_content)
+                yield request
+
+        return super().streaming_recognize(config, recordedRequests())
+
+def makeAudio(seconds: float) -> bytes:
+    """
+    Returns utterances of 0.6 s separated by 0.7 s of silence, followed by one second of silence that ends the last
+    utterance. The first two samples of every block hold its number
+    """
+    samples = array.array('h')
+    for block in range(int((seconds + 1.0) * sampleRate / blockSize)):
+        position = block * blockSize / sampleRate
+        inUtterance = position < seconds and position % 1.3 < 0.6
+        values = [speechLevel if index % 2 == 0 else -speechLevel for index in range(blockSize)] if inUtterance \
+            else [0] * blockSize
+        values[0] = block
+        values[1] = -block - 1
+        samples.extend(values)
+    return samples.tobytes()
+
+def blockNumbers(audio: bytes) -> list:
+    """
+    Returns the numbers of the blocks in audio received by the server
+    """
+    samples = array.array('h', audio[:len(audio) - len(audio) % (blockSize * 2)])
+    numbers = []
+    for start in range(0, len(samples), blockSize):
+        if samples[start + 1] != -samples[start] - 1:
+            raise ValueError('Audio is not aligned on the numbered blocks')
+        numbers.append(samples[start])
+    return numbers
+
+def main():
+    parser = argparse.ArgumentParser(description='Checks that stream rotation neither loses nor duplicates audio')
+    parser.add_argument('--seconds', type=float, default=12.0, help='seconds of audio injected in real time')
+    parser.add_argument('--limit', type=float, default=2.5, help='streamingLimit in seconds')
+    parser.add_argument('--response-delay', type=float, default=0.5, help='seconds before the server answers')
+    arguments = parser.parse_args()
+    import channelpool
+    speechServer = RecordingSpeechServer(sampleRate, arguments.response_delay)
+    server = fakeservers.FakeGrpcServer(speechServer, fakeservers.FakeSynthesisClient(0.0))
+    server.start()
+    pool = channelpool.ChannelPool(server.endpoint, server.endpoint, secure=False)
+    speechtotext.streamingLimit = arguments.limit
+    phrases = []
+    phrasesLock = threading.Lock()
+
+    def callExcelMacro(macroName: str, argument1: object = None, argument2: object = None):
+        if macroName == 'receiveText':
+            with phrasesLock:
+                phrases.append(argument1)
+
+    engine = audioengine.AudioEngine(sampleRate, chunkSize, openDevice=False)
+    speech = speechtotext.SpeechToText(engine, 'en-US', [], {}, callExcelMacro, sampleRate, print,
+                                       googleAPIClient=pool.speechClient())
+    speech.resume()
+    speech.start()
+    audio = makeAudio(arguments.seconds)
+    utterances = len(fakeservers.findUtterances(audio, sampleRate, chunkSize * 2))
+    startTime = time.perf_counter()
+    for number, start in enumerate(range(0, len(audio), chunkSize * 2)):
+        delay = startTime + number * chunkSize / sampleRate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        engine.injectFrames(audio[start:start + chunkSize * 2])
+    deadline = time.perf_counter() + arguments.response_delay + 5.0
+    while len(phrases) < utterances and time.perf_counter() < deadline:
+        time.sleep(0.05)
+    time.sleep(arguments.response_delay)     # Phrases recognized twice would arrive now
+    speech.stop()
+    pool.close()
+    server.stop()
+    # Trace the blocks received by every call
+    totalBlocks = len(audio) // (blockSize * 2)
+    seen = set()
+    errors = []
+    for call, received in enumerate(speechServer.audio):
+        numbers = blockNumbers(bytes(received))
+        replayed = 0
+        while replayed < len(numbers) and numbers[replayed] in seen:
+            replayed += 1
+        resent = [number for number in numbers[replayed:] if number in seen]
+        if resent:
+            errors.append(f'call {call}: {len(resent)} blocks sent again after the replayed audio')
+        if numbers[replayed:] and seen and numbers[replayed] != max(seen) + 1:
+            errors.append(f'call {call}: new audio starts at block {numbers[replayed]} instead of {max(seen) + 1}')
+        print(f'Call {call}: {len(numbers) / 100:5.2f} s received, {replayed / 100:5.2f} s replayed')
+        seen.update(numbers)
+    lost = totalBlocks - len(seen & set(range(totalBlocks)))
+    if lost:
+        errors.append(f'{lost} blocks never reached the server')
+    if len(phrases) != utterances:
+        errors.append(f'{len(phrases)} phrases recognized for {utterances} utterances')
+    print(f'Rotations: {speech.rotations}, calls: {len(speechServer.audio)}, utterances: {utterances}, '
+          f'phrases: {len(phrases)}, blocks lost: {lost}')
+    if speech.rotations == 0:
+        errors.append('the stream was never rotated')
+    for error in errors:
+        print('FAILED: ' + error)
+    if errors:
+        sys.exit(1)
+    print('OK: no audio lost or duplicated across the handoffs')
+
+if __name__ == '__main__':
+    main()
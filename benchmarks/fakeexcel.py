@@ -0,0 +1,139 @@
+"""
+    A stand-in for Excel, used to run the Excel link headlessly, e.g. on Linux.
+
+    FakeExcel serves a Unix domain socket to which PipeClient connects, replays the messages of a session on it
+    with their recorded timing, and records the macro calls that the app makes through runMacro(). A session is a
+    list of events, stored as JSON lines:
+
+        {"t": 0.50, "message": "resume"}
+        {"t": 0.52, "macro": "receiveText", "arguments": ["7.5", "1"]}
+
+    "t" is the time in seconds since the start of the session. Message events are sent to the app; macro events are
+    the calls Excel received when the session was recorded, which can be compared with the calls received during
+    the replay.
+"""
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Source'))
+from transport import encodeMessages
+
+def loadSession(path: str) -> list:
+    """
+    Reads a session from a JSON lines file
+    """
+    with open(path, encoding='utf-8') as sessionFile:
+        return [json.loads(line) for line in sessionFile if line.strip() != '']
+
+def saveSession(path: str, events: list):
+    """
+    Writes a session to a JSON lines file
+    """
+    with open(path, 'w', encoding='utf-8') as sessionFile:
+        for event in events:
+            sessionFile.write(json.dumps(event, ensure_ascii=False) + '\n')
+
+def makeSession(numberOfMessages: int, interval: float) -> list:
+    """
+    Builds a synthetic session: the messages Excel sends while a teacher reads out grades
+    """
+    events = [{'t': 0.0, 'message': 'resume'}]
+    for index in range(numberOfMessages):
+        events.append({'t': (index + 1) * interval, 'message': 'speak#Student ' + str(index) + ' seven and a half'})
+    events.append({'t': (numberOfMessages + 1) * interval, 'message': 'pause'})
+    return events
+
+class FakeExcel(object):
+    """
+        Serves a session on a Unix domain socket and records the macro calls made by the app
+
+        Attributes
+        ----------
+        sendTimes : list
+            Time (time.perf_counter) at which each message was sent
+        macroCalls : list
+            (time, macroName, argument1, argument2) of each macro call received
+
+        Methods
+        _______
+            start()
+                Starts serving the session
+            runMacro(macroName, argument1, argument2)
+                Records a macro call. Can be passed to MacroDispatcher.flush
+            wait(timeout)
+                Waits until all the messages were sent
+            close()
+                Stops serving
+    """
+
+    def __init__(self, path: str, session: list, speed: float = 1.0):
+        """
+        Parameters
+        ----------
+        path : str
+            Path of the socket
+        session : list
+            Events to replay
+        speed : float, optional
+            Replay speed. The messages are sent as fast as possible if it is 0
+        """
+        self.__path = path
+        self.__messages = [event for event in session if 'message' in event]
+        self.__speed = speed
+        self.__server = None
+        self.__connection = None
+        self.__thread = None
+        self.__done = threading.Event()
+        self.__lock = threading.Lock()
+        self.sendTimes = []
+        self.macroCalls = []
+
+    def start(self):
+        """
+        Starts listening. The session is replayed as soon as the app connects
+        """
+        if os.path.exists(self.__path):
+            os.remove(self.__path)
+        self.__server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.__server.bind(self.__path)
+        self.__server.listen(1)
+        self.__thread = threading.Thread(target=self.__replay, daemon=True)
+        self.__thread.start()
+
+    def __replay(self):
+        try:
+            self.__connection, address = self.__server.accept()
+            startTime = time.perf_counter()
+            for event in self.__messages:
+                if self.__speed > 0:
+                    delay = startTime + event['t'] / self.__speed - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                self.sendTimes.append(time.perf_counter())
+                self.__connection.sendall(encodeMessages([event['message']]))
+        except OSError:
+            pass
+        finally:
+            self.__done.set()
+
+    def runMacro(self, macroName: str, argument1: object = None, argument2: object = None) -> bool:
+        with self.__lock:
+            self.macroCalls.append((time.perf_counter(), macroName, argument1, argument2))
+        return True
+
+    def wait(self, timeout: float = None) -> bool:
+        return self.__done.wait(timeout)
+
+    def close(self):
+        for stream in (self.__connection, self.__server):
+            try:
+                if stream != None:
+                    stream.close()
+            except OSError:
+                pass
+        if os.path.exists(self.__path):
+            os.remove(self.__path)
@@ -0,0 +1,301 @@
+"""
+    Local stand-ins for the Google speech-to-text and text-to-speech services, used by the benchmarks.
+
+    FakeSpeechServer answers streaming recognition requests: it finds the utterances in the audio with a simple
+    energy detector and returns a final result for each one after a configurable response delay. It can be passed
+    to SpeechToText as googleAPIClient, or wrapped in FakeRecognizer when the Google client library is not
+    installed. FakeSynthesisClient answers synthesis requests with silence after a configurable delay. FakeGrpcServer
+    serves both over gRPC on localhost, so that the real clients and channels can be used.
+"""
+import array
+import datetime
+import math
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+from six.moves import queue
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Source'))
+from audiosink import makeWave, NullSink
+from recognizer import Recognizer, RecognitionResult
+
+speechThreshold = 500           # RMS level above which a chunk contains speech
+silenceToEnd = 0.3              # Seconds of silence after which an utterance ends
+
+class UtteranceDetector(object):
+    """
+    Finds the end of the utterances in a stream of 16-bit mono chunks. Used by FakeSpeechServer, and by the
+    benchmarks to know when each utterance ended in the fixture
+    """
+
+    def __init__(self, sampleRate: int, threshold: float = speechThreshold, silence: float = silenceToEnd):
+        self.__bytesPerSecond = sampleRate * 2
+        self.__threshold = threshold
+        self.__silence = silence
+        self.__position = 0             # Bytes processed
+        self.__speechEnd = None         # Position of the end of the last chunk with speech in the current utterance
+
+    def feed(self, chunk: bytes) -> list:
+        """
+        Returns the end positions, in seconds since the start of the stream, of the utterances that ended
+        """
+        samples = array.array('h', chunk[:len(chunk) - len(chunk) % 2])
+        rms = math.sqrt(sum(sample * sample for sample in samples) / len(samples)) if samples else 0.0
+        self.__position += len(chunk)
+        ended = []
+        if rms >= self.__threshold:
+            self.__speechEnd = self.__position
+        elif self.__speechEnd != None and self.__position - self.__speechEnd >= self.__silence * self.__bytesPerSecond:
+            ended.append(self.__speechEnd / self.__bytesPerSecond)
+            self.__speechEnd = None
+        return ended
+
+    def flush(self) -> list:
+        """
+        Ends the utterance in progress at the end of the stream
+        """
+        if self.__speechEnd == None:
+            return []
+        ended = [self.__speechEnd / self.__bytesPerSecond]
+        self.__speechEnd = None
+        return ended
+
+def findUtterances(audio: bytes, sampleRate: int, chunkBytes: int) -> list:
+    """
+    Returns the end positions, in seconds, of the utterances in a recording, as the server finds them when the
+    recording is streamed in chunks of chunkBytes
+    """
+    detector = UtteranceDetector(sampleRate)
+    ends = []
+    for start in range(0, len(audio), chunkBytes):
+        ends += detector.feed(audio[start:start + chunkBytes])
+    return ends + detector.flush()
+
+class FakeCall(object):
+    """
+    A streaming recognition call in progress. Iterating yields the responses; cancel() ends the call
+    """
+
+    def __init__(self, server: 'FakeSpeechServer', audioChunks):
+        self.__server = server
+        self.__responses = queue.Queue()
+        self.__cancelled = threading.Event()
+        self.__timers = []
+        threading.Thread(target=self.__consume, args=(audioChunks,), daemon=True).start()
+
+    def __consume(self, audioChunks):
+        detector = UtteranceDetector(self.__server.sampleRate, silence=self.__server.silence)
+        startTime = time.monotonic()
+        try:
+            for chunk in audioChunks:
+                if self.__cancelled.is_set():
+                    break
+                for endTime in detector.feed(chunk):
+                    self.__respond(endTime, startTime)
+            if not self.__cancelled.is_set():
+                for endTime in detector.flush():
+                    self.__respond(endTime, startTime)
+        except Exception:
+            pass    # The client went away, e.g. a gRPC call was cancelled
+        finally:
+            for timer in self.__timers:
+                timer.join()
+            self.__responses.put(None)
+
+    def __respond(self, endTime: float, startTime: float):
+        result = SimpleNamespace(
+            alternatives=[SimpleNamespace(transcript=self.__server.nextTranscript())],
+            is_final=True,
+            stability=0.0,
+            result_end_time=datetime.timedelta(seconds=endTime),
+        )
+        billed = datetime.timedelta(seconds=math.ceil(time.monotonic() - startTime))
+        response = SimpleNamespace(results=[result], total_billed_time=billed)
+        timer = threading.Timer(self.__server.responseDelay, self.__responses.put, args=(response,))
+        timer.daemon = True
+        timer.start()
+        self.__timers.append(timer)
+
+    def __iter__(self):
+        while True:
+            response = self.__responses.get()
+            if response == None or self.__cancelled.is_set():
+                return
+            yield response
+
+    def cancel(self):
+        self.__cancelled.set()
+        self.__responses.put(None)
+
+class FakeSpeechServer(object):
+    """
+    Stand-in for speech.SpeechClient. The transcripts are returned in turn, one per utterance
+    """
+
+    def __init__(self, sampleRate: int, responseDelay: float = 0.2, transcripts: list = None,
+                 silence: float = silenceToEnd):
+        """
+        Parameters
+        ----------
+        sampleRate : int
+            Audio sample rate
+        responseDelay : float, optional
+            Seconds between the end of an utterance being detected and its result being returned
+        transcripts : list, optional
+            Transcripts returned in turn
+        silence : float, optional
+            Seconds of silence after which an utterance ends
+        """
+        self.sampleRate = sampleRate
+        self.responseDelay = responseDelay
+        self.silence = silence
+        self.__transcripts = transcripts or ['seven and a half']
+        self.__next = 0
+        self.__lock = threading.Lock()
+        self.calls = 0
+
+    def nextTranscript(self) -> str:
+        with self.__lock:
+            transcript = self.__transcripts[self.__next % len(self.__transcripts)]
+            self.__next += 1
+            return transcript
+
+    def streaming_recognize(self, config, requests) -> FakeCall:
+        self.calls += 1
+        return FakeCall(self, (request.audio_content for request in requests))
+
+    def stream(self, audioChunks) -> FakeCall:
+        """
+        Starts a call with raw audio chunks instead of requests
+        """
+        self.calls += 1
+        return FakeCall(self, audioChunks)
+
+class FakeRecognizer(Recognizer):
+    """
+    Connects SpeechToText to a FakeSpeechServer without the Google client library
+    """
+
+    def __init__(self, server: FakeSpeechServer):
+        self.__server = server
+        self.__call = None
+
+    def streamingRecognize(self, audioChunks):
+        self.__call = self.__server.stream(audioChunks)
+        for response in self.__call:
+            result = response.results[0]
+            yield RecognitionResult(result.alternatives[0].transcript, result.is_final, result.stability,
+                                    result.result_end_time.total_seconds(),
+                                    int(response.total_billed_time.total_seconds()))
+
+    def cancel(self):
+        if self.__call != None:
+            self.__call.cancel()
+
+class FakeSynthesisClient(object):
+    """
+    Stand-in for texttospeech.TextToSpeechClient. Returns silence, as long as the text would take to speak
+    """
+
+    def __init__(self, delay: float = 0.1, delayPerCharacter: float = 0.0, sampleRate: int = 24000,
+                 secondsPerCharacter: float = 0.06):
+        """
+        Parameters
+        ----------
+        delay : float, optional
+            Seconds before a request is answered
+        delayPerCharacter : float, optional
+            Additional seconds per character of the request
+        sampleRate : int, optional
+            Sample rate of the returned audio
+        secondsPerCharacter : float, optional
+            Duration of the returned audio per character
+        """
+        self.__delay = delay
+        self.__delayPerCharacter = delayPerCharacter
+        self.__sampleRate = sampleRate
+        self.__secondsPerCharacter = secondsPerCharacter
+        self.requests = 0
+
+    def synthesize_speech(self, input=None, voice=None, audio_config=None, timeout=None):
+        text = getattr(input, 'ssml', '') or getattr(input, 'text', '')
+        self.requests += 1
+        time.sleep(self.__delay + self.__delayPerCharacter * len(text))
+        samples = int(len(text) * self.__secondsPerCharacter * self.__sampleRate)
+        return SimpleNamespace(audio_content=makeWave(bytes(samples * 2), self.__sampleRate))
+
+class TimingSink(NullSink):
+    """
+    Discards the audio and records when each clip started playing
+    """
+
+    def __init__(self, realTime: bool = False):
+        super().__init__(realTime)
+        self.startTimes = []
+        self.played = threading.Condition()
+
+    def playChunks(self, chunks, sampleRate: int, channels: int = 1):
+        with self.played:
+            self.startTimes.append(time.perf_counter())
+            self.played.notify_all()
+        super().playChunks(chunks, sampleRate, channels)
+
+class FakeGrpcServer(object):
+    """
+    Serves a FakeSpeechServer and a FakeSynthesisClient on localhost with the gRPC methods of the Google speech-to-text
+    and text-to-speech APIs. Needs grpcio and the Google client libraries
+    """
+
+    def __init__(self, speechServer: FakeSpeechServer, synthesisClient: FakeSynthesisClient, port: int = 0):
+        """
+        Parameters
+        ----------
+        speechServer : FakeSpeechServer
+            Answers the streaming recognition requests
+        synthesisClient : FakeSynthesisClient
+            Answers the synthesis requests
+        port : int, optional
+            Port to listen on. A free port is picked if it is 0
+        """
+        import grpc
+        from concurrent import futures
+        from google.cloud import speech, texttospeech
+
+        def streamingRecognize(requests, context):
+            context.send_initial_metadata(())
+            call = speechServer.streaming_recognize(None, requests)
+            context.add_callback(call.cancel)
+            for response in call:
+                result = response.results[0]
+                yield speech.StreamingRecognizeResponse(
+                    results=[speech.StreamingRecognitionResult(
+                        alternatives=[speech.SpeechRecognitionAlternative(transcript=result.alternatives[0].transcript)],
+                        is_final=result.is_final, stability=result.stability, result_end_time=result.result_end_time)],
+                    total_billed_time=response.total_billed_time)
+
+        def synthesizeSpeech(request, context):
+            response = synthesisClient.synthesize_speech(input=request.input, voice=request.voice,
+                                                         audio_config=request.audio_config)
+            return texttospeech.SynthesizeSpeechResponse(audio_content=response.audio_content)
+
+        self.__server = grpc.server(futures.ThreadPoolExecutor(max_workers=8))
+        self.__server.add_generic_rpc_handlers([
+            grpc.method_handlers_generic_handler('google.cloud.speech.v1.Speech', {
+                'StreamingRecognize': grpc.stream_stream_rpc_method_handler(
+                    streamingRecognize, request_deserializer=speech.StreamingRecognizeRequest.deserialize,
+                    response_serializer=speech.StreamingRecognizeResponse.serialize)}),
+            grpc.method_handlers_generic_handler('google.cloud.texttospeech.v1.TextToSpeech', {
+                'SynthesizeSpeech': grpc.unary_unary_rpc_method_handler(
+                    synthesizeSpeech, request_deserializer=texttospeech.SynthesizeSpeechRequest.deserialize,
+                    response_serializer=texttospeech.SynthesizeSpeechResponse.serialize)}),
+        ])
+        self.port = self.__server.add_insecure_port(f'localhost:{port}')
+        self.endpoint = f'localhost:{self.port}'
+
+    def start(self):
+        self.__server.start()
+
+    def stop(self, grace: float = None):
+        self.__server.stop(grace).wait()